@@ -0,0 +1,214 @@
+"""
+Generador de árboles de ficheros sintéticos
+-------------------------------------------
+
+Crea un árbol de carpetas y ficheros reproducible (misma semilla y parámetros, mismo
+árbol y mismos hashes) para medir el rendimiento del escaneo, los hashes, la
+sincronización y la verificación.
+
+Funciones principales:
+    - generar_arbol(destino, opciones=None): Crea el árbol y devuelve un resumen.
+    - parsear_tamano(texto): Convierte "64K", "16M" o "2G" a bytes.
+    - parsear_distribucion(texto): Convierte "4K-64K:70,1M-16M:30" a [(minimo, maximo, peso)].
+    - parsear_extensiones(texto): Convierte "jpg:40,mov:10" a [(extension, peso)].
+
+Uso:
+    python benchmarks/arbol_sintetico.py /tmp/arbol --ficheros 5000 --profundidad 4 \\
+        --tamanos "4K-64K:80,1M-16M:20" --extensiones "jpg:50,png:30,txt:20" --dispersos 1
+
+Notas:
+    - Los ficheros dispersos se crean con `truncate` y solo unos pocos bloques escritos:
+      ocupan casi nada en disco, pero su hash lee todo el tamaño lógico.
+    - Los tamaños de cada rango se eligen con distribución log-uniforme.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+
+UNIDADES = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+OPCIONES_POR_DEFECTO = {
+    "ficheros": 2000,
+    "profundidad": 3,
+    "ramas": 4,
+    "tamanos": "1K-64K:70,64K-1M:20,1M-16M:9,16M-64M:1",
+    "extensiones": "jpg:40,png:20,mov:5,pdf:10,txt:25",
+    "dispersos": 1,
+    "tamano_disperso": "2G",
+    "semilla": 1234,
+}
+
+_BLOQUE = 1024 * 1024
+
+
+def parsear_tamano(texto):
+    """
+    Convierte un tamaño con unidad opcional ("512", "64K", "16M", "2G") a bytes.
+
+    Raises:
+        ValueError: Si el texto no es un tamaño válido.
+    """
+    texto = str(texto).strip().upper().removesuffix("IB").removesuffix("B")
+    unidad = texto[-1:] if texto[-1:] in UNIDADES else ""
+    numero = texto[:len(texto) - len(unidad)]
+    try:
+        return int(float(numero) * UNIDADES[unidad])
+    except ValueError:
+        raise ValueError(f"Tamaño no válido: {texto}") from None
+
+
+def parsear_distribucion(texto):
+    """
+    Convierte "4K-64K:70,1M-16M:30" en [(4096, 65536, 70.0), (1048576, 16777216, 30.0)].
+    """
+    rangos = []
+    for parte in texto.split(","):
+        rango, _, peso = parte.partition(":")
+        minimo, _, maximo = rango.partition("-")
+        rangos.append((parsear_tamano(minimo), parsear_tamano(maximo or minimo), float(peso or 1)))
+    return rangos
+
+
+def parsear_extensiones(texto):
+    """
+    Convierte "jpg:40,mov:10" en [(".jpg", 40.0), (".mov", 10.0)].
+    """
+    extensiones = []
+    for parte in texto.split(","):
+        extension, _, peso = parte.partition(":")
+        extensiones.append(("." + extension.strip().lstrip("."), float(peso or 1)))
+    return extensiones
+
+
+def _carpetas(destino, profundidad, ramas):
+    """
+    Devuelve las carpetas de un árbol con `ramas` subcarpetas por nivel hasta `profundidad`.
+    """
+    carpetas = [destino]
+    nivel = [destino]
+    for n in range(profundidad):
+        nivel = [os.path.join(padre, f"n{n}_{i:02d}") for padre in nivel for i in range(ramas)]
+        carpetas.extend(nivel)
+    return carpetas
+
+
+def _escribir(ruta, tamano, indice, patron):
+    """
+    Escribe `tamano` bytes: una cabecera única por fichero y después el patrón aleatorio
+    desplazado según el índice, para que cada fichero tenga un hash distinto.
+    """
+    cabecera = f"fichero-sintetico-{indice}\n".encode()
+    desplazamiento = (indice * 7919) % len(patron)
+    with open(ruta, "wb") as f:
+        pendiente = tamano
+        pendiente -= f.write(cabecera[:pendiente])
+        while pendiente > 0:
+            trozo = patron[desplazamiento:desplazamiento + min(pendiente, _BLOQUE)]
+            pendiente -= f.write(trozo)
+            desplazamiento = 0
+
+
+def _escribir_disperso(ruta, tamano, indice):
+    """
+    Crea un fichero disperso de `tamano` bytes con marcas al inicio, en la mitad y al final.
+    """
+    marca = f"disperso-{indice}".encode()
+    with open(ruta, "wb") as f:
+        f.truncate(tamano)
+        for posicion in (0, tamano // 2, max(0, tamano - len(marca))):
+            f.seek(posicion)
+            f.write(marca)
+
+
+def generar_arbol(destino, opciones=None):
+    """
+    Genera un árbol sintético de ficheros en `destino`.
+
+    Args:
+        destino (str): Carpeta donde crear el árbol. Se crea si no existe.
+        opciones (dict, opcional): Parámetros (ver `OPCIONES_POR_DEFECTO`):
+            - ficheros (int): Número de ficheros normales.
+            - profundidad (int): Niveles de subcarpetas.
+            - ramas (int): Subcarpetas por carpeta.
+            - tamanos (str): Distribución de tamaños "min-max:peso,..." (ver `parsear_distribucion`).
+            - extensiones (str): Mezcla de extensiones "ext:peso,...".
+            - dispersos (int): Número de ficheros dispersos adicionales.
+            - tamano_disperso (str): Tamaño lógico de cada fichero disperso ("2G").
+            - semilla (int): Semilla del generador aleatorio.
+
+    Returns:
+        dict: Resumen con las opciones usadas, el número de ficheros y carpetas, los
+        bytes lógicos y el recuento por extensión.
+
+    Ejemplo:
+        resumen = generar_arbol("/tmp/arbol", {"ficheros": 10000, "dispersos": 0})
+    """
+    opciones = {**OPCIONES_POR_DEFECTO, **(opciones or {})}
+    aleatorio = random.Random(opciones["semilla"])
+    rangos = parsear_distribucion(opciones["tamanos"])
+    extensiones = parsear_extensiones(opciones["extensiones"])
+    patron = aleatorio.randbytes(2 * _BLOQUE)
+
+    carpetas = _carpetas(destino, opciones["profundidad"], opciones["ramas"])
+    for carpeta in carpetas:
+        os.makedirs(carpeta, exist_ok=True)
+
+    total_bytes = 0
+    por_extension = {}
+    for indice in range(opciones["ficheros"]):
+        minimo, maximo, _ = aleatorio.choices(rangos, weights=[r[2] for r in rangos])[0]
+        tamano = int(math.exp(aleatorio.uniform(math.log(max(minimo, 1)), math.log(max(maximo, 1)))))
+        extension = aleatorio.choices(extensiones, weights=[e[1] for e in extensiones])[0][0]
+        carpeta = aleatorio.choice(carpetas)
+        _escribir(os.path.join(carpeta, f"f{indice:07d}{extension}"), tamano, indice, patron)
+        total_bytes += tamano
+        por_extension[extension] = por_extension.get(extension, 0) + 1
+
+    tamano_disperso = parsear_tamano(opciones["tamano_disperso"])
+    for indice in range(opciones["dispersos"]):
+        carpeta = aleatorio.choice(carpetas)
+        _escribir_disperso(os.path.join(carpeta, f"disperso{indice:03d}.mov"), tamano_disperso, indice)
+        total_bytes += tamano_disperso
+        por_extension[".mov"] = por_extension.get(".mov", 0) + 1
+
+    return {
+        "opciones": opciones,
+        "ficheros": opciones["ficheros"] + opciones["dispersos"],
+        "carpetas": len(carpetas),
+        "bytes": total_bytes,
+        "por_extension": dict(sorted(por_extension.items())),
+    }
+
+
+def agregar_argumentos(parser):
+    """
+    Añade a `parser` los argumentos del generador (compartidos con `suite.py`).
+    """
+    d = OPCIONES_POR_DEFECTO
+    parser.add_argument("--ficheros", type=int, default=d["ficheros"], help="Número de ficheros normales")
+    parser.add_argument("--profundidad", type=int, default=d["profundidad"], help="Niveles de subcarpetas")
+    parser.add_argument("--ramas", type=int, default=d["ramas"], help="Subcarpetas por carpeta")
+    parser.add_argument("--tamanos", default=d["tamanos"], help="Distribución de tamaños 'min-max:peso,...'")
+    parser.add_argument("--extensiones", default=d["extensiones"], help="Mezcla de extensiones 'ext:peso,...'")
+    parser.add_argument("--dispersos", type=int, default=d["dispersos"], help="Ficheros dispersos de varios GB")
+    parser.add_argument("--tamano-disperso", dest="tamano_disperso", default=d["tamano_disperso"],
+                        help="Tamaño lógico de cada fichero disperso")
+    parser.add_argument("--semilla", type=int, default=d["semilla"], help="Semilla del generador")
+
+
+def opciones_de_argumentos(args):
+    """
+    Extrae de los argumentos parseados las opciones de `generar_arbol`.
+    """
+    return {clave: getattr(args, clave) for clave in OPCIONES_POR_DEFECTO}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un árbol de ficheros sintético")
+    parser.add_argument("destino", help="Carpeta donde crear el árbol")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    print(json.dumps(generar_arbol(args.destino, opciones_de_argumentos(args)), indent=2, ensure_ascii=False))
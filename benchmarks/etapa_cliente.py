@@ -0,0 +1,52 @@
+"""
+Etapa del cliente de la suite de benchmarks
+-------------------------------------------
+
+Mide `verificar.comparar_carpetas` del cliente (`sincronizar_archivos_cliente`). Se
+ejecuta en un proceso aparte porque los módulos del cliente y del servidor comparten
+el nombre de paquete `modules`.
+
+Uso (lo lanza `suite.py`):
+    python benchmarks/etapa_cliente.py inventario.json /tmp/arbol --cache /tmp/cache.sqlite
+
+Escribe en la salida estándar un JSON con los segundos de cada pasada y el número de
+ficheros por categoría.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+CLIENTE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sincronizar_archivos_cliente")
+sys.path.insert(0, CLIENTE)
+
+from modules import inventario, verificar  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide verificar.comparar_carpetas del cliente")
+    parser.add_argument("inventario", help="Inventario exportado por el servidor")
+    parser.add_argument("carpeta", help="Carpeta local a comparar")
+    parser.add_argument("--cache", required=True, help="Fichero de la caché de hashes (se crea en la primera pasada)")
+    parser.add_argument("--workers", default="1", help="Hilos de hash (número o 'auto')")
+    parser.add_argument("--raiz-servidor", dest="raiz_servidor", default=None,
+                        help="Carpeta sincronizada en el servidor (por defecto, la de la cabecera del inventario)")
+    args = parser.parse_args()
+    workers = args.workers if args.workers == "auto" else int(args.workers)
+
+    cabecera, json_servidor = inventario.leer_inventario(args.inventario)
+    raiz_servidor = verificar.raiz_inventario(json_servidor, cabecera, args.raiz_servidor)
+    resultado = {"registros": len(json_servidor)}
+    for etapa in ("comparar_carpetas", "comparar_carpetas_con_cache"):
+        inicio = time.perf_counter()
+        diferencias = verificar.comparar_carpetas(json_servidor, args.carpeta, raiz_servidor,
+                                                  ruta_cache=args.cache, workers=workers)
+        resultado[etapa] = time.perf_counter() - inicio
+    resultado["categorias"] = {categoria: len(lista) for categoria, lista in diferencias.items()}
+    json.dump(resultado, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
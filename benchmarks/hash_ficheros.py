@@ -0,0 +1,119 @@
+"""
+Micro-benchmark del cálculo de hashes
+-------------------------------------
+
+Compara la lectura clásica (`f.read(65536)`, un objeto `bytes` nuevo por bloque) con
+la de `files.hash_fichero`: `readinto` sobre un búfer reutilizado con bloques
+adaptativos y `mmap` para los ficheros grandes.
+
+Genera tres juegos de ficheros en una carpeta temporal (pequeños, medianos y uno de
+varios GB) y muestra, para cada método, el mejor tiempo de varias repeticiones y los MB/s.
+
+Uso:
+    python benchmarks/hash_ficheros.py
+    python benchmarks/hash_ficheros.py --grande-mb 4096 --algoritmo blake3 --directorio /datos/tmp
+
+Notas:
+    - Las medidas son con la caché de páginas caliente (cada juego se lee una vez antes
+      de medir), así que miden el coste de CPU y de copias, no el del disco.
+    - El fichero grande ocupa `--grande-mb` MB en `--directorio`; se borra al terminar.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import files  # noqa: E402
+
+
+def hash_clasico(fichero, algoritmo):
+    """
+    Implementación anterior: `read` de 64 KiB que crea un `bytes` por bloque.
+    """
+    hasher = files.ALGORITMOS_HASH[files.resolver_algoritmo(algoritmo)][0]()
+    with open(fichero, "rb") as f:
+        while chunk := f.read(65536):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+METODOS = {
+    "clasico": hash_clasico,
+    "readinto": lambda fichero, algoritmo: files.hash_fichero(fichero, algoritmo, usar_mmap=False),
+    "readinto+mmap": lambda fichero, algoritmo: files.hash_fichero(fichero, algoritmo),
+}
+
+
+def crear_ficheros(carpeta, nombre, cantidad, tamano):
+    """
+    Crea `cantidad` ficheros de `tamano` bytes con contenido aleatorio y devuelve sus rutas.
+    """
+    os.makedirs(os.path.join(carpeta, nombre), exist_ok=True)
+    bloque = os.urandom(min(tamano, files.BLOQUE_MAXIMO))
+    rutas = []
+    for i in range(cantidad):
+        ruta = os.path.join(carpeta, nombre, f"{i:05d}.bin")
+        with open(ruta, "wb") as f:
+            pendiente = tamano
+            while pendiente > 0:
+                pendiente -= f.write(bloque[:pendiente])
+        rutas.append(ruta)
+    return rutas
+
+
+def medir(rutas, metodo, algoritmo, repeticiones):
+    """
+    Devuelve el mejor tiempo (segundos) de hashear todas las rutas con `metodo`.
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for ruta in rutas:
+            metodo(ruta, algoritmo)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de hash_fichero")
+    parser.add_argument("--algoritmo", default="md5", help="Algoritmo de hash (ver files.ALGORITMOS_HASH)")
+    parser.add_argument("--directorio", default=None, help="Carpeta donde crear los ficheros de prueba")
+    parser.add_argument("--pequenos", type=int, default=2000, help="Número de ficheros de 4 KiB")
+    parser.add_argument("--medianos", type=int, default=32, help="Número de ficheros de 8 MiB")
+    parser.add_argument("--grande-mb", type=int, default=2048, help="Tamaño en MB del fichero grande (0 = sin él)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_hash_", dir=args.directorio)
+    try:
+        juegos = [
+            ("pequeños", crear_ficheros(carpeta, "pequenos", args.pequenos, 4 * 1024)),
+            ("medianos", crear_ficheros(carpeta, "medianos", args.medianos, 8 * 1024 * 1024)),
+        ]
+        if args.grande_mb:
+            juegos.append(("grande", crear_ficheros(carpeta, "grande", 1, args.grande_mb * 1024 * 1024)))
+
+        print(f"Algoritmo: {files.resolver_algoritmo(args.algoritmo)}  "
+              f"(sistema de ficheros: {files.sistema_ficheros(os.stat(carpeta)) or 'desconocido'})")
+        print(f"{'juego':<10} {'método':<14} {'segundos':>9} {'MB/s':>9} {'mejora':>7}")
+        for nombre, rutas in juegos:
+            total = sum(os.path.getsize(r) for r in rutas)
+            medir(rutas, hash_clasico, args.algoritmo, 1)  # calentar la caché de páginas
+            base = None
+            for metodo, funcion in METODOS.items():
+                segundos = medir(rutas, funcion, args.algoritmo, args.repeticiones)
+                base = base or segundos
+                print(f"{nombre:<10} {metodo:<14} {segundos:>9.3f} {total / segundos / 1e6:>9.1f} "
+                      f"{base / segundos:>6.2f}x")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Suite de benchmarks
+-------------------
+
+Genera un árbol sintético (ver `arbol_sintetico.py`) y mide por separado cada etapa
+del proceso:
+
+    1. files.escanear_directorio
+    2. files.calcular_md5 (todos los ficheros, en un hilo)
+    3. sync.sincronizar (carga inicial y segunda pasada sin cambios)
+    4. export.exportar_tabla_a_json
+    5. verificar.comparar_carpetas del cliente (sin caché y con caché)
+
+El resultado se guarda en un JSON con claves ordenadas y valores redondeados, pensado
+para compararse entre versiones antes de actualizar producción:
+
+    python benchmarks/suite.py --salida antes.json
+    ... actualizar ...
+    python benchmarks/suite.py --salida despues.json --comparar antes.json
+
+Con `--comparar`, las etapas más lentas que la referencia en más de `--tolerancia`
+se marcan como regresión y el script termina con código 1.
+
+Notas:
+    - Las etapas 3 y 4 usan por defecto una base de datos SQLite temporal, creada con
+      `sql/create_archivos.sql` o, si no existe, con `sql/create_archivos.ejemplo.sql`.
+      Con `--bd config` usan la de `config/credenciales.json` y necesitan
+      `sql/create_archivos.sql`. En los dos casos la tabla es propia (`--tabla`, debe
+      empezar por "bench_") y se borra y se vuelve a crear. Si fallan, la suite termina
+      con el error; con `--sin-bd` se omiten y la etapa 5 usa un inventario generado con
+      los hashes de la etapa 2.
+    - La etapa 5 se ejecuta en otro proceso (`etapa_cliente.py`) y necesita Jinja2.
+    - Con la caché de páginas caliente, las etapas de hash miden sobre todo CPU. Para
+      medir el disco, vaciar la caché antes (`echo 3 > /proc/sys/vm/drop_caches`).
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, RAIZ)
+
+import arbol_sintetico  # noqa: E402
+from modules import files  # noqa: E402
+
+logger = logging.getLogger("benchmarks")
+
+
+def _etapa(segundos, ficheros=None, total_bytes=None):
+    """
+    Construye el resultado de una etapa con valores redondeados para que el JSON se
+    pueda comparar con `diff` sin ruido de decimales.
+    """
+    resultado = {"segundos": round(segundos, 4)}
+    if ficheros is not None:
+        resultado["ficheros"] = ficheros
+        resultado["ficheros_s"] = round(ficheros / segundos, 1) if segundos else None
+    if total_bytes is not None:
+        resultado["bytes"] = total_bytes
+        resultado["mb_s"] = round(total_bytes / segundos / 1e6, 1) if segundos else None
+    return resultado
+
+
+def _medir(funcion, repeticiones=1):
+    """
+    Ejecuta `funcion` `repeticiones` veces y devuelve (mejor tiempo, último resultado).
+    """
+    mejor, resultado = None, None
+    for _ in range(max(1, repeticiones)):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor, resultado
+
+
+def _version():
+    """
+    Devuelve el commit actual del repositorio, o None si no se puede averiguar.
+    """
+    try:
+        salida = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=RAIZ,
+                                capture_output=True, text=True, check=True)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def preparar_bd_temporal(directorio_trabajo):
+    """
+    Prepara una base de datos SQLite temporal para las etapas 3 y 4.
+
+    Los módulos leen `config/credenciales.json` y `sql/create_archivos.sql` con rutas
+    relativas, así que se crea en `directorio_trabajo` un proyecto mínimo con los dos
+    ficheros. El DDL se copia de `sql/create_archivos.sql` o, si no existe, de
+    `sql/create_archivos.ejemplo.sql` con el nombre de tabla genérico "archivos".
+
+    Returns:
+        str: Carpeta del proyecto temporal, desde la que hay que ejecutar las etapas.
+    """
+    proyecto = os.path.join(directorio_trabajo, "proyecto")
+    os.makedirs(os.path.join(proyecto, "config"))
+    os.makedirs(os.path.join(proyecto, "sql"))
+    with open(os.path.join(proyecto, "config", "credenciales.json"), "w", encoding="utf-8") as f:
+        json.dump({"BBDD": {"motor": "sqlite", "ruta": os.path.join(directorio_trabajo, "bench.sqlite")}}, f)
+
+    ddl = os.path.join(RAIZ, "sql", "create_archivos.sql")
+    if os.path.isfile(ddl):
+        with open(ddl, encoding="utf-8") as f:
+            sql = f.read()
+    else:
+        with open(os.path.join(RAIZ, "sql", "create_archivos.ejemplo.sql"), encoding="utf-8") as f:
+            sql = re.sub(r"CREATE TABLE IF NOT EXISTS \w+", "CREATE TABLE IF NOT EXISTS archivos", f.read(), count=1)
+    with open(os.path.join(proyecto, "sql", "create_archivos.sql"), "w", encoding="utf-8") as f:
+        f.write(sql)
+    return proyecto
+
+
+def etapas_bd(arbol, tabla, opciones_sync, opciones_exportacion, directorio_trabajo):
+    """
+    Mide `sync.sincronizar` y `export.exportar_tabla_a_json` sobre una tabla de pruebas.
+
+    Returns:
+        tuple: (etapas, ruta del inventario exportado).
+    """
+    from modules import db, export, sync
+
+    db.ejecutar_modificacion(f"DROP TABLE IF EXISTS {tabla}")
+    db.ejecutar_modificacion(f"DROP TABLE IF EXISTS {tabla}_eliminados")
+    db.inicializar_tabla(tabla)
+
+    etapas = {}
+    segundos, _ = _medir(lambda: sync.sincronizar(arbol["ruta"], tabla, opciones_sync))
+    etapas["sincronizar_inicial"] = _etapa(segundos, arbol["ficheros"], arbol["bytes"])
+    segundos, _ = _medir(lambda: sync.sincronizar(arbol["ruta"], tabla, opciones_sync))
+    etapas["sincronizar_sin_cambios"] = _etapa(segundos, arbol["ficheros"])
+
+    destino = os.path.join(directorio_trabajo, "inventario.json")
+    segundos, fichero = _medir(lambda: export.exportar_tabla_a_json(tabla, destino, opciones_exportacion))
+    etapas["exportar_tabla_a_json"] = _etapa(segundos, arbol["ficheros"])
+    etapas["exportar_tabla_a_json"]["bytes_fichero"] = os.path.getsize(fichero)
+    return etapas, fichero
+
+
+def etapa_cliente(inventario, carpeta, directorio_trabajo, workers):
+    """
+    Mide `verificar.comparar_carpetas` del cliente en otro proceso (ver `etapa_cliente.py`).
+    """
+    orden = [sys.executable, os.path.join(BENCHMARKS, "etapa_cliente.py"), inventario, carpeta,
+             "--cache", os.path.join(directorio_trabajo, "cache_hashes.sqlite"), "--workers", str(workers),
+             "--raiz-servidor", carpeta]
+    salida = subprocess.run(orden, capture_output=True, text=True,
+                            cwd=os.path.join(RAIZ, "sincronizar_archivos_cliente"))
+    if salida.returncode != 0:
+        motivo = (salida.stderr.strip().splitlines() or ["error desconocido"])[-1]
+        return {"comparar_carpetas": {"omitida": motivo}}
+    datos = json.loads(salida.stdout)
+    return {
+        "comparar_carpetas": {**_etapa(datos["comparar_carpetas"], datos["registros"]),
+                              "categorias": datos["categorias"]},
+        "comparar_carpetas_con_cache": _etapa(datos["comparar_carpetas_con_cache"], datos["registros"]),
+    }
+
+
+def comparar(actual, referencia, tolerancia, minimo=0.05):
+    """
+    Muestra la variación de cada etapa respecto a la referencia.
+
+    Returns:
+        list[str]: Etapas más lentas que la referencia en más de `tolerancia` (relativo)
+        y en más de `minimo` segundos, para no marcar el ruido de las etapas muy cortas.
+    """
+    regresiones = []
+    print(f"{'etapa':<30} {'antes':>10} {'ahora':>10} {'cambio':>8}")
+    for nombre, etapa in actual["etapas"].items():
+        previa = referencia.get("etapas", {}).get(nombre, {})
+        if "segundos" not in etapa or "segundos" not in previa:
+            print(f"{nombre:<30} {'-':>10} {'-':>10} {'':>8}")
+            continue
+        cambio = etapa["segundos"] / previa["segundos"] - 1 if previa["segundos"] else 0.0
+        marca = ""
+        if cambio > tolerancia and etapa["segundos"] - previa["segundos"] > minimo:
+            regresiones.append(nombre)
+            marca = "  << regresión"
+        print(f"{nombre:<30} {previa['segundos']:>10.3f} {etapa['segundos']:>10.3f} {cambio:>+7.1%}{marca}")
+    if actual.get("arbol", {}).get("opciones") != referencia.get("arbol", {}).get("opciones"):
+        print("Aviso: los árboles de las dos ejecuciones se generaron con opciones distintas")
+    if actual.get("bd") != referencia.get("bd"):
+        print("Aviso: las dos ejecuciones usaron bases de datos distintas")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks por etapas")
+    arbol_sintetico.agregar_argumentos(parser)
+    parser.add_argument("--arbol", help="Usar un árbol ya generado en lugar de crear uno")
+    parser.add_argument("--directorio", help="Carpeta donde crear el árbol y los ficheros temporales")
+    parser.add_argument("--conservar", action="store_true", help="No borrar el árbol al terminar")
+    parser.add_argument("--repeticiones", type=int, default=1,
+                        help="Repeticiones del escaneo y de los hashes (se guarda la mejor)")
+    parser.add_argument("--workers", default="1", help="hash_workers de sync y del cliente")
+    parser.add_argument("--modo", default="filas", choices=("filas", "conjuntos"), help="Modo de sync")
+    parser.add_argument("--algoritmo", default="md5", help="algoritmo_hash de sync")
+    parser.add_argument("--tabla", default="bench_archivos", help="Tabla de pruebas (se borra)")
+    parser.add_argument("--bd", default="sqlite", choices=("sqlite", "config"),
+                        help="Base de datos de sync y exportación: SQLite temporal o la de config/credenciales.json")
+    parser.add_argument("--sin-bd", action="store_true", help="Omitir sync y exportación")
+    parser.add_argument("--salida", default="resultados_benchmark.json", help="Fichero JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="Empeoramiento relativo a partir del cual una etapa es regresión")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar el log de los módulos")
+    args = parser.parse_args()
+
+    if not args.tabla.startswith("bench_"):
+        parser.error("--tabla debe empezar por 'bench_' (la tabla se borra)")
+    if args.bd == "config" and not args.sin_bd and not os.path.isfile(os.path.join(RAIZ, "sql", "create_archivos.sql")):
+        parser.error("--bd config necesita sql/create_archivos.sql (créalo a partir de sql/create_archivos.ejemplo.sql)")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    workers = args.workers if args.workers == "auto" else int(args.workers)
+    salida = os.path.abspath(args.salida)
+    referencia = os.path.abspath(args.comparar) if args.comparar else None
+    ruta_arbol = os.path.abspath(args.arbol) if args.arbol else None
+
+    directorio_trabajo = tempfile.mkdtemp(prefix="bench_", dir=args.directorio)
+    # Los módulos leen config/credenciales.json y sql/create_archivos.sql con rutas
+    # relativas a la raíz del proyecto (la temporal con la base de datos SQLite)
+    os.chdir(RAIZ if args.bd == "config" or args.sin_bd else preparar_bd_temporal(directorio_trabajo))
+    resultados = {
+        "version": _version(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "bd": None if args.sin_bd else args.bd,
+        "etapas": {},
+    }
+    etapas = resultados["etapas"]
+    try:
+        # 0. Árbol sintético
+        if ruta_arbol:
+            rutas = files.escanear_directorio(ruta_arbol)
+            arbol = {"opciones": None, "ficheros": len(rutas), "bytes": sum(os.path.getsize(r) for r in rutas)}
+        else:
+            ruta_arbol = os.path.join(directorio_trabajo, "arbol")
+            segundos, arbol = _medir(lambda: arbol_sintetico.generar_arbol(
+                ruta_arbol, arbol_sintetico.opciones_de_argumentos(args)))
+            etapas["generar_arbol"] = _etapa(segundos, arbol["ficheros"], arbol["bytes"])
+        resultados["arbol"] = arbol
+        arbol = {**arbol, "ruta": ruta_arbol}
+        print(f"Árbol: {arbol['ficheros']} ficheros, {arbol['bytes'] / 1e6:.1f} MB en {ruta_arbol}")
+
+        # 1. Escaneo
+        segundos, rutas = _medir(lambda: files.escanear_directorio(ruta_arbol), args.repeticiones)
+        etapas["escanear_directorio"] = _etapa(segundos, len(rutas))
+
+        # 2. Hashes
+        segundos, hashes = _medir(lambda: [files.calcular_md5(ruta) for ruta in rutas], args.repeticiones)
+        etapas["calcular_md5"] = _etapa(segundos, len(rutas), arbol["bytes"])
+
+        # 3-4. Base de datos
+        inventario = None
+        if args.sin_bd:
+            etapas["sincronizar_inicial"] = {"omitida": "--sin-bd"}
+        else:
+            opciones_sync = {"hash_workers": workers, "modo": args.modo, "algoritmo_hash": args.algoritmo}
+            opciones_exportacion = {"algoritmo_hash": files.resolver_algoritmo(args.algoritmo),
+                                    "directorio": ruta_arbol}
+            etapas_bd_medidas, inventario = etapas_bd(arbol, args.tabla, opciones_sync,
+                                                      opciones_exportacion, directorio_trabajo)
+            etapas.update(etapas_bd_medidas)
+
+        # 5. Verificación del cliente (sin base de datos, con un inventario de la etapa 2)
+        if inventario is None:
+            inventario = os.path.join(directorio_trabajo, "inventario.json")
+            with open(inventario, "w", encoding="utf-8") as f:
+                json.dump([{"nombre": os.path.basename(ruta), "ruta": ruta, "hash_md5": hash_md5,
+                            "tamano": os.path.getsize(ruta)} for ruta, hash_md5 in zip(rutas, hashes)], f)
+        etapas.update(etapa_cliente(inventario, ruta_arbol, directorio_trabajo, workers))
+    finally:
+        if args.conservar:
+            print(f"Ficheros conservados en {directorio_trabajo}")
+        else:
+            shutil.rmtree(directorio_trabajo, ignore_errors=True)
+
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+    for nombre, etapa in etapas.items():
+        detalle = etapa.get("omitida") or f"{etapa['segundos']:.3f} s" + (
+            f", {etapa['mb_s']} MB/s" if etapa.get("mb_s") else "")
+        print(f"{nombre:<30} {detalle}")
+    print(f"Resultados en {salida}")
+
+    if referencia:
+        with open(referencia, encoding="utf-8") as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"Regresiones: {', '.join(regresiones)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,18 +7,26 @@ Este programa realiza las siguientes operaciones:
 2. Configura el sistema de logging con rotación de ficheros.
 3. Asegura que la tabla de metadatos exista en la base de datos, creando la tabla si es necesario.
 4. Escanea la carpeta local configurada y sincroniza los metadatos de los archivos en la base de datos.
-5. Exporta el contenido de la tabla a un fichero JSON local.
+5. Exporta el contenido de la tabla a un fichero JSON local (o, en modo incremental,
+   una base o un delta numerados y su manifiesto).
 6. Sube el fichero JSON a una o varias rutas remotas mediante SFTP.
 7. Registra en el log todas las acciones y errores ocurridos durante el proceso.
+8. Escribe las métricas de cada fase (duración, ficheros, bytes, filas, subidas) en un
+   fichero de texto de Prometheus para node_exporter, si está configurado.
 
 Variables de configuración utilizadas:
 - directorio_base: ruta de la carpeta local a sincronizar
 - tabla: nombre de la tabla de la base de datos
 - fichero_a_exportar: nombre del fichero JSON de salida
 - rutas_remotas_a_exportar: lista de rutas remotas SFTP donde subir el JSON
+- sincronizacion (opcional): parámetros de la sincronización (hash_workers, ...)
+- exportacion (opcional): parámetros del fichero exportado (compacto, ...)
+- vigilancia (opcional): parámetros del modo vigilancia (espera, reconciliar_cada, ...)
+- metricas (opcional): fichero de métricas de Prometheus (ruta, prefijo)
 
 Uso:
-    $ python main.py
+    $ python main.py             # una sincronización completa y publicación
+    $ python main.py --vigilar   # modo vigilancia con inotify (ver modules/vigilancia.py)
 
 Requisitos:
 - Python 3.10+ (u otra versión compatible)
@@ -26,35 +34,104 @@ Requisitos:
 - Ficheros de configuración: config/config.json y config/credenciales.json
 """
 
-from modules import utils, db, sync, export, logging_config
+import argparse
+
+from modules import utils, db, sync, export, files, logging_config, vigilancia, metricas
+
+
+def publicar(tabla, fichero_exportar, rutas_remotas, opciones_exportacion):
+    """
+    Exporta la tabla y sube el resultado a las rutas remotas (pasos 3 y 4).
+    """
+    if opciones_exportacion.get("incremental", False):
+        # 3. Exportar base o delta numerados y su manifiesto
+        with metricas.fase("exportacion"):
+            resultado = export.exportar_incremental(tabla, fichero_exportar, opciones_exportacion)
+
+        # 4. Subir los ficheros nuevos (el manifiesto el último) y borrar los obsoletos
+        with metricas.fase("subida"):
+            for fichero in resultado["subir"]:
+                export.subir_json_por_sftp(fichero, rutas_remotas)
+            export.borrar_por_sftp(resultado["obsoletos"], rutas_remotas)
+    else:
+        # 3. Exportar tabla a JSON
+        with metricas.fase("exportacion"):
+            exportar = export.exportar_tabla_a_json(tabla, fichero_exportar, opciones_exportacion)
+            export.olvidar_estado_incremental(opciones_exportacion)
+
+        # 4. Subir el JSON a rutas remotas vía SFTP
+        with metricas.fase("subida"):
+            export.subir_json_por_sftp(exportar, rutas_remotas)
+
+
+def escribir_metricas(opciones_metricas):
+    """
+    Escribe las métricas acumuladas si `metricas.ruta` está configurada (paso 8).
+
+    Un fallo al escribirlas se registra, pero no interrumpe la sincronización.
+    """
+    if not opciones_metricas.get("ruta"):
+        return
+    try:
+        metricas.escribir_textfile(opciones_metricas["ruta"], opciones_metricas.get("prefijo", "inventario"))
+    except OSError as e:
+        logger.warning(f"No se pudieron escribir las métricas en {opciones_metricas['ruta']}: {e}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza un directorio con la base de datos y publica el inventario.")
+    parser.add_argument("--vigilar", action="store_true",
+                        help="Queda en ejecución aplicando los cambios notificados por inotify (solo Linux)")
+    argumentos = parser.parse_args()
+
     config = utils.cargar_config()
     logger = logging_config.configurar_logger(config)
 
     logger.info("=== Inicio de sincronización de archivos ===")    
+    opciones_metricas = config.get("metricas", {})
     try:
     
         directorio = config["directorio_base"]
         tabla = config["tabla"]
         fichero_exportar = config["fichero_a_exportar"]
         rutas_remotas = config["rutas_remotas_a_exportar"]
+        # El algoritmo y el nivel de los hashes de la tabla y la carpeta sincronizada se
+        # anotan en el inventario exportado
+        opciones_sync = config.get("sincronizacion", {})
+        opciones_exportacion = {
+            **config.get("exportacion", {}),
+            "algoritmo_hash": files.resolver_algoritmo(opciones_sync.get("algoritmo_hash", "md5")),
+            "huella_rapida": opciones_sync.get("huella_rapida", False),
+            "directorio": directorio
+        }
 
         # 1. Asegurar tabla
-        db.inicializar_tabla(tabla)
+        with metricas.fase("inicializacion"):
+            # El registro de borrados solo lo usa (y lo purga) la exportación incremental
+            db.inicializar_tabla(tabla, registrar_borrados=opciones_exportacion.get("incremental", False))
 
-        # 2. Sincronizar metadatos locales
-        sync.sincronizar(directorio, tabla)
+        if argumentos.vigilar:
+            # 2-4. Mantener la tabla al día con inotify y publicar periódicamente;
+            # las métricas se reescriben después de cada publicación
+            def publicar_y_medir():
+                publicar(tabla, fichero_exportar, rutas_remotas, opciones_exportacion)
+                escribir_metricas(opciones_metricas)
 
-        # 3. Exportar tabla a JSON
-        exportar = export.exportar_tabla_a_json(tabla, fichero_exportar)
+            vigilancia.vigilar(directorio, tabla, config.get("vigilancia", {}), opciones_sync, publicar_y_medir)
+        else:
+            # 2. Sincronizar metadatos locales
+            with metricas.fase("sincronizacion"):
+                sync.sincronizar(directorio, tabla, opciones_sync)
 
-        # 4. Subir el JSON a rutas remotas vía SFTP
-        export.subir_json_por_sftp(exportar, rutas_remotas)
+            publicar(tabla, fichero_exportar, rutas_remotas, opciones_exportacion)
 
+        logger.info(f"Pool de conexiones BD: {db.estadisticas_pool()}")
         logger.info("✅ Sincronización y exportación completadas correctamente.")
-        
+        metricas.fijar("ejecucion_exito", 1)
+
     except Exception as e:
         logger.exception(f"❌ Error durante la ejecución: {e}")
+        metricas.fijar("ejecucion_exito", 0)
     finally:
-        logger.info("=== Fin del proceso ===\n")
\ No newline at end of file
+        escribir_metricas(opciones_metricas)
+        logger.info("=== Fin del proceso ===\n")
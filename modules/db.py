@@ -2,71 +2,465 @@
 Módulo `db`
 ------------
 
-Proporciona funciones para conectar y manipular una base de datos MariaDB/MySQL
+Proporciona funciones para conectar y manipular una base de datos MariaDB/MySQL o SQLite
 utilizando credenciales definidas en un fichero JSON de configuración.
 
+El motor se elige con la clave "motor" de la sección "BBDD" ("mariadb" por defecto o
+"sqlite"). Con SQLite la base de datos es un fichero local en modo WAL y las mismas
+funciones de este módulo sirven para los dos motores.
+
 Funciones principales:
-    - conectar(): Conecta a la base de datos usando credenciales del JSON.
-    - inicializar_tabla(tabla): Crea la tabla especificada usando SQL de creación.
+    - motor(): Devuelve el motor configurado ("mariadb" o "sqlite").
+    - conectar(): Toma una conexión del pool del proceso (las credenciales se leen una vez).
+    - conexion(): Gestor de contexto que toma una conexión del pool y la devuelve al salir.
+    - estadisticas_pool(): Devuelve checkouts, esperas y edad de las conexiones del pool.
+    - inicializar_tabla(tabla, registrar_borrados=False): Crea la tabla especificada
+      usando SQL de creación, añade las columnas que falten en tablas creadas con
+      versiones anteriores y, si se pide, crea el registro de borrados usado por las
+      exportaciones incrementales.
     - ejecutar_select(query, params=None): Ejecuta un SELECT y devuelve resultados.
+    - select_en_streaming(query, params=None, tamano_bloque=10000): Gestor de contexto que
+      ejecuta un SELECT con un cursor sin buffer y devuelve (columnas, filas).
+    - iterar_select(query, params=None, tamano_bloque=10000): Ejecuta un SELECT y devuelve
+      las filas una a una con un cursor sin buffer, sin cargarlas todas en memoria.
     - ejecutar_modificacion(query, params=None): Ejecuta INSERT/UPDATE/DELETE y confirma cambios.
+    - ahora(): Devuelve la fecha y hora actuales de la base de datos.
+    - EscritorLotes(tamano_lote=1000): Agrupa modificaciones y las ejecuta por lotes con
+      `executemany` sobre una única conexión.
 
 Dependencias:
-    - mariadb: cliente de MariaDB/MySQL.
+    - mariadb: cliente de MariaDB/MySQL (solo con el motor "mariadb").
+    - sqlite3: para el motor "sqlite".
     - utils: para cargar credenciales desde config/credenciales.json.
+    - threading, time, functools, contextlib: para el pool de conexiones y sus estadísticas.
+    - re, os, datetime: para traducir el DDL a SQLite y sus fechas.
 """
 
-import mariadb
+import datetime
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import mariadb
+except ImportError:  # pragma: no cover - solo hace falta con el motor "mariadb"
+    mariadb = None
 from . import utils
 
-def conectar():
+MOTORES = ("mariadb", "sqlite")
+
+# Columnas añadidas después de la primera versión de `sql/create_archivos.sql`.
+# `inicializar_tabla` las crea en tablas existentes si todavía no las tienen.
+COLUMNAS_ADICIONALES = [
+    ("dispositivo", "BIGINT UNSIGNED NULL COMMENT 'Dispositivo del fichero (st_dev)'"),
+    ("inodo", "BIGINT UNSIGNED NULL COMMENT 'Inodo del fichero (st_ino)'"),
+    ("mtime_ns", "BIGINT NULL COMMENT 'Fecha de modificación en nanosegundos (st_mtime_ns)'"),
+    ("algoritmo_hash", "VARCHAR(16) NOT NULL DEFAULT 'md5' COMMENT 'Algoritmo con el que se calculó hash_md5'"),
+    ("nivel_huella", "VARCHAR(8) NOT NULL DEFAULT 'completo' COMMENT 'completo: hash de todo el fichero; rapido: tamaño y muestras'"),
+]
+
+# Longitud mínima de `hash_md5` para guardar hashes de 256 bits en hexadecimal.
+LONGITUD_HASH = 64
+
+_pool = None
+_pool_lock = threading.Lock()
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+_AHORA_SQLITE = "(datetime('now', 'localtime'))"
+_estadisticas = {"checkouts": 0, "esperas": 0, "segundos_espera": 0.0}
+_nacimiento_conexiones = {}
+
+@functools.lru_cache(maxsize=1)
+def _credenciales_bd():
+    """
+    Devuelve la sección "BBDD" de `config/credenciales.json`, leída una sola vez por proceso.
     """
-    Establece una conexión a la base de datos MariaDB usando credenciales.
+    return utils.cargar_credenciales()["BBDD"]
 
-    Carga las credenciales desde `config/credenciales.json` bajo la clave "BBDD".
+def motor():
+    """
+    Devuelve el motor de base de datos configurado en la clave "motor" de la sección "BBDD".
 
     Returns:
-        mariadb.connection: Conexión activa a la base de datos.
+        str: "mariadb" (por defecto) o "sqlite".
+
+    Raises:
+        ValueError: Si el motor no está soportado.
+    """
+    nombre = _credenciales_bd().get("motor", "mariadb")
+    if nombre not in MOTORES:
+        raise ValueError(f"Motor de base de datos no soportado: {nombre} (use {', '.join(MOTORES)})")
+    return nombre
+
+class ErrorPool(Exception):
+    """
+    No queda ninguna conexión libre en el pool de SQLite.
+    """
+
+class _ConexionSQLite:
+    """
+    Conexión SQLite prestada por `_PoolSQLite`, con la parte de la interfaz de las
+    conexiones de mariadb que usa este módulo. `close()` la devuelve al pool.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def cursor(self, buffered=True):
+        # Los cursores de sqlite3 ya leen las filas según se piden
+        return self._conn.cursor()
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def executescript(self, sql):
+        self._conn.executescript(sql)
+
+    def close(self):
+        self._conn.rollback()
+        self._pool.devolver(self)
+
+class _PoolSQLite:
+    """
+    Pool mínimo de conexiones a un fichero SQLite en modo WAL (varios lectores y un
+    escritor a la vez). Cada conexión se usa en un solo hilo mientras está prestada.
+    """
+
+    def __init__(self, ruta, tamano):
+        self.ruta = ruta
+        self.tamano = tamano
+        self._libres = []
+        self._creadas = 0
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def get_connection(self):
+        with self._lock:
+            if self._libres:
+                return self._libres.pop()
+            if self._creadas >= self.tamano:
+                raise ErrorPool(f"No quedan conexiones libres en el pool de SQLite ({self.tamano})")
+            self._creadas += 1
+        conn = sqlite3.connect(self.ruta, timeout=60, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _ConexionSQLite(self, conn)
+
+    def devolver(self, conexion):
+        with self._lock:
+            self._libres.append(conexion)
+
+# Las fechas se guardan en SQLite como texto 'YYYY-MM-DD HH:MM:SS' (hora local, igual
+# que DATETIME/TIMESTAMP en MariaDB) y se leen como datetime en esas columnas
+sqlite3.register_adapter(datetime.datetime, lambda fecha: fecha.strftime(_FORMATO_FECHA))
+for _tipo in ("DATETIME", "TIMESTAMP"):
+    sqlite3.register_converter(_tipo, lambda valor: datetime.datetime.fromisoformat(valor.decode()))
+
+def _obtener_pool():
+    """
+    Crea (la primera vez) y devuelve el pool de conexiones del proceso.
+
+    El tamaño se toma de la clave opcional "pool_size" de la sección "BBDD". Default: 8.
+    Con MariaDB, la clave opcional "local_infile" habilita `LOAD DATA LOCAL INFILE`
+    (default: False). Con SQLite, "ruta" indica el fichero de la base de datos
+    (default: "archivos.sqlite").
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            db_creds = _credenciales_bd()
+            if motor() == "sqlite":
+                _pool = _PoolSQLite(db_creds.get("ruta", "archivos.sqlite"), db_creds.get("pool_size", 8))
+                return _pool
+            if mariadb is None:
+                raise ImportError("El motor 'mariadb' necesita el paquete mariadb (pip install mariadb)")
+            _pool = mariadb.ConnectionPool(
+                pool_name="sincronizar_archivos",
+                pool_size=db_creds.get("pool_size", 8),
+                user=db_creds["user"],
+                password=db_creds["password"],
+                host=db_creds["host"],
+                # Si no se especifica puerto, usar 3306 por defecto
+                port=db_creds.get("port", 3306),
+                database=db_creds["database"],
+                local_infile=db_creds.get("local_infile", False)
+            )
+        return _pool
+
+def conectar(espera_maxima=60):
+    """
+    Toma prestada una conexión del pool del proceso (MariaDB o SQLite, ver `motor`).
+
+    Las credenciales se cargan una única vez desde `config/credenciales.json` bajo la
+    clave "BBDD" y el pool se crea en la primera llamada. Al cerrar la conexión con
+    `close()` se devuelve al pool en lugar de desconectarse. Si no hay conexiones
+    libres se espera a que se devuelva alguna.
+
+    Args:
+        espera_maxima (int, opcional): Segundos máximos esperando una conexión libre. Default: 60.
+
+    Returns:
+        mariadb.connection: Conexión activa a la base de datos (con SQLite, un envoltorio
+        con la misma interfaz: cursor, commit, rollback y close).
+
+    Raises:
+        mariadb.PoolError | ErrorPool: Si no queda ninguna conexión libre tras
+            `espera_maxima` segundos.
 
     Ejemplo:
         conn = conectar()
         cur = conn.cursor()
         cur.execute("SELECT * FROM archivos")
+        conn.close()  # la devuelve al pool
+    """
+    pool = _obtener_pool()
+    errores_pool = (ErrorPool, mariadb.PoolError) if mariadb else (ErrorPool,)
+    inicio = time.monotonic()
+    espero = False
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except errores_pool:
+            if time.monotonic() - inicio > espera_maxima:
+                raise
+            espero = True
+            time.sleep(0.05)
+
+    with _pool_lock:
+        _estadisticas["checkouts"] += 1
+        if espero:
+            _estadisticas["esperas"] += 1
+            _estadisticas["segundos_espera"] += time.monotonic() - inicio
+        _nacimiento_conexiones.setdefault(id(conn), time.monotonic())
+    return conn
+
+@contextmanager
+def conexion():
+    """
+    Gestor de contexto que toma una conexión del pool y la devuelve al salir,
+    también si se produce una excepción.
+
+    Ejemplo:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM archivos")
+    """
+    conn = conectar()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def estadisticas_pool():
+    """
+    Devuelve las estadísticas de uso del pool de conexiones.
+
+    Returns:
+        dict: Diccionario con:
+            - checkouts (int): Conexiones prestadas.
+            - esperas (int): Préstamos que tuvieron que esperar a una conexión libre.
+            - segundos_espera (float): Tiempo total esperando conexiones libres.
+            - conexiones (int): Conexiones distintas usadas.
+            - edad_max_segundos (float): Edad de la conexión más antigua.
+            - edad_media_segundos (float): Edad media de las conexiones usadas.
+
+    Ejemplo:
+        logger.info(f"Pool de BD: {estadisticas_pool()}")
+    """
+    with _pool_lock:
+        ahora = time.monotonic()
+        edades = [ahora - nacimiento for nacimiento in _nacimiento_conexiones.values()]
+        return {
+            **_estadisticas,
+            "segundos_espera": round(_estadisticas["segundos_espera"], 3),
+            "conexiones": len(edades),
+            "edad_max_segundos": round(max(edades, default=0.0), 1),
+            "edad_media_segundos": round(sum(edades) / len(edades), 1) if edades else 0.0
+        }
+
+def _partes_nivel_superior(texto):
     """
-    creds = utils.cargar_credenciales()
-    db_creds = creds["BBDD"]
+    Divide `texto` por las comas que no están dentro de paréntesis ni de comillas.
+    """
+    partes, actual, profundidad, comilla = [], [], 0, None
+    for caracter in texto:
+        if comilla:
+            comilla = None if caracter == comilla else comilla
+        elif caracter in "'\"`":
+            comilla = caracter
+        elif caracter == "(":
+            profundidad += 1
+        elif caracter == ")":
+            profundidad -= 1
+        elif caracter == "," and profundidad == 0:
+            partes.append("".join(actual).strip())
+            actual = []
+            continue
+        actual.append(caracter)
+    if "".join(actual).strip():
+        partes.append("".join(actual).strip())
+    return partes
+
+def _columna_sqlite(definicion):
+    """
+    Traduce la definición de una columna de MariaDB a SQLite.
+    """
+    definicion = re.sub(r"\s+COMMENT\s+'(?:[^']|'')*'", "", definicion, flags=re.I)
+    definicion = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP", "", definicion, flags=re.I)
+    definicion = re.sub(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", f"DEFAULT {_AHORA_SQLITE}", definicion, flags=re.I)
+    definicion = re.sub(r"\b\w*INT(?:\(\d+\))?\s+(?:UNSIGNED\s+)?(?:NOT\s+NULL\s+)?AUTO_INCREMENT\s+PRIMARY\s+KEY",
+                        "INTEGER PRIMARY KEY AUTOINCREMENT", definicion, flags=re.I)
+    return re.sub(r"\s+UNSIGNED\b", "", definicion, flags=re.I)
 
-    # Si no se especifica puerto, usar 3306 por defecto
-    port = db_creds.get("port", 3306)
+def _ddl_sqlite(sql):
+    """
+    Traduce un CREATE TABLE de MariaDB (como `sql/create_archivos.sql`) a SQLite.
+
+    Quita los comentarios, `UNSIGNED` y las opciones de tabla, convierte
+    `AUTO_INCREMENT` en `INTEGER PRIMARY KEY AUTOINCREMENT`, los `UNIQUE KEY` en
+    restricciones `UNIQUE` (sin longitud de prefijo) y los `KEY`/`INDEX` en sentencias
+    `CREATE INDEX`. Las columnas con `ON UPDATE CURRENT_TIMESTAMP` se mantienen al día
+    con un trigger.
 
-    return mariadb.connect(
-        user=db_creds["user"],
-        password=db_creds["password"],
-        host=db_creds["host"],
-        port=port,
-        database=db_creds["database"]
-    )
+    Args:
+        sql (str): Sentencia CREATE TABLE de MariaDB.
 
-def inicializar_tabla(tabla):
+    Returns:
+        list[str]: Sentencias SQLite: el CREATE TABLE, sus índices y sus triggers.
+    """
+    cabecera = re.match(r"\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\(", sql, flags=re.I)
+    if not cabecera:
+        raise ValueError("No se reconoce la sentencia CREATE TABLE")
+    tabla = cabecera.group(1)
+    cuerpo = sql[cabecera.end():sql.rindex(")")]
+
+    columnas, indices, triggers = [], [], []
+    for parte in _partes_nivel_superior(cuerpo):
+        indice = re.match(r"(UNIQUE\s+)?(?:KEY|INDEX)\s*`?\w*`?\s*\((.*)\)\s*$", parte, flags=re.I | re.S)
+        if indice:
+            campos = ", ".join(re.sub(r"\(\d+\)", "", c).strip(" `") for c in indice.group(2).split(","))
+            if indice.group(1):
+                columnas.append(f"UNIQUE ({campos})")
+            else:
+                nombre = "_".join(c.strip() for c in campos.split(","))
+                indices.append(f"CREATE INDEX IF NOT EXISTS {tabla}_{nombre} ON {tabla} ({campos})")
+            continue
+        if re.search(r"ON\s+UPDATE\s+CURRENT_TIMESTAMP", parte, flags=re.I):
+            columna = parte.split()[0].strip("`")
+            triggers.append(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabla}_actualizar_{columna}
+                AFTER UPDATE ON {tabla} FOR EACH ROW WHEN NEW.{columna} IS OLD.{columna}
+                BEGIN
+                    UPDATE {tabla} SET {columna} = {_AHORA_SQLITE} WHERE rowid = NEW.rowid;
+                END""")
+        columnas.append(_columna_sqlite(parte))
+
+    crear = f"CREATE TABLE IF NOT EXISTS {tabla} (\n    " + ",\n    ".join(columnas) + "\n)"
+    return [crear] + indices + triggers
+
+def inicializar_tabla(tabla, registrar_borrados=False):
     """
     Crea la tabla en la base de datos ejecutando el SQL definido en `sql/create_archivos.sql`.
 
     Reemplaza el nombre de la tabla genérica "archivos" por el nombre proporcionado.
+    Después añade las columnas de `COLUMNAS_ADICIONALES` que no existan y amplía
+    `hash_md5` a `LONGITUD_HASH` caracteres si es más corta, de modo que las tablas
+    creadas con versiones anteriores del script se actualizan solas.
+
+    Con `registrar_borrados` crea además el registro de borrados `<tabla>_eliminados` y
+    el trigger que anota en él cada fila eliminada de la tabla, necesarios para las
+    exportaciones incrementales (que son las que lo purgan). Sin él, los borra si existen
+    para que el registro no crezca sin límite.
+
+    Con el motor "sqlite", el SQL (escrito para MariaDB) se traduce con `_ddl_sqlite`.
 
     Args:
         tabla (str): Nombre de la tabla a crear.
+        registrar_borrados (bool, opcional): Mantener el registro de borrados. Default: False.
 
     Ejemplo:
         inicializar_tabla("mis_archivos")
     """
     with open("sql/create_archivos.sql", "r", encoding="utf-8") as f:
         sql = f.read().replace("archivos", tabla)
-    conn = conectar()
-    cur = conn.cursor()
-    cur.execute(sql)
-    conn.commit()
-    cur.close()
-    conn.close()
+    sql_eliminados = f"""
+        CREATE TABLE IF NOT EXISTS {tabla}_eliminados (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            ruta TEXT NOT NULL COMMENT 'Ruta del registro eliminado',
+            eliminado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha de eliminación en la BD',
+            KEY (eliminado_en)
+        ) COMMENT='Registro de borrados de {tabla} para exportaciones incrementales'
+    """
+    if motor() == "sqlite":
+        _inicializar_tabla_sqlite(tabla, sql, sql_eliminados if registrar_borrados else None)
+        return
+
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(sql)
+        for columna, definicion in COLUMNAS_ADICIONALES:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {columna} {definicion}")
+        cur.execute("""
+            SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND COLUMN_NAME = 'hash_md5'
+        """, (tabla,))
+        fila = cur.fetchone()
+        if fila and fila[0] is not None and fila[0] < LONGITUD_HASH:
+            cur.execute(f"ALTER TABLE {tabla} MODIFY COLUMN hash_md5 VARCHAR({LONGITUD_HASH}) NOT NULL "
+                        f"COMMENT 'Hash del contenido (MD5 u otro, ver algoritmo_hash)'")
+        if registrar_borrados:
+            cur.execute(sql_eliminados)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabla}_registrar_borrado
+                AFTER DELETE ON {tabla} FOR EACH ROW
+                INSERT INTO {tabla}_eliminados (ruta) VALUES (OLD.ruta)
+            """)
+        else:
+            cur.execute(f"DROP TRIGGER IF EXISTS {tabla}_registrar_borrado")
+            cur.execute(f"DROP TABLE IF EXISTS {tabla}_eliminados")
+        conn.commit()
+        cur.close()
+
+def _inicializar_tabla_sqlite(tabla, sql, sql_eliminados):
+    """
+    Parte de `inicializar_tabla` para SQLite: traduce el DDL y añade las columnas que
+    falten (SQLite no admite `ADD COLUMN IF NOT EXISTS` ni necesita ampliar `hash_md5`,
+    porque no limita la longitud de los VARCHAR). Sin `sql_eliminados`, borra el
+    registro de borrados y su trigger.
+    """
+    with conexion() as conn:
+        sentencias = _ddl_sqlite(sql) + (_ddl_sqlite(sql_eliminados) if sql_eliminados else [])
+        conn.executescript(";\n".join(sentencias) + ";")
+        cur = conn.cursor()
+        cur.execute(f"PRAGMA table_info({tabla})")
+        existentes = {fila[1] for fila in cur.fetchall()}
+        for columna, definicion in COLUMNAS_ADICIONALES:
+            if columna not in existentes:
+                cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {_columna_sqlite(definicion)}")
+        if sql_eliminados:
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabla}_registrar_borrado
+                AFTER DELETE ON {tabla} FOR EACH ROW
+                BEGIN
+                    INSERT INTO {tabla}_eliminados (ruta) VALUES (OLD.ruta);
+                END
+            """)
+        else:
+            cur.execute(f"DROP TRIGGER IF EXISTS {tabla}_registrar_borrado")
+            cur.execute(f"DROP TABLE IF EXISTS {tabla}_eliminados")
+        conn.commit()
+        cur.close()
 
 # === Funciones utilitarias de ejecución ===
 
@@ -84,14 +478,71 @@ def ejecutar_select(query, params=None):
     Ejemplo:
         resultados = ejecutar_select("SELECT * FROM archivos WHERE nombre=?", ("file.txt",))
     """
-    conn = conectar()
-    cur = conn.cursor()
-    cur.execute(query, params or ())
-    resultados = cur.fetchall()
-    cur.close()
-    conn.close()
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params or ())
+        resultados = cur.fetchall()
+        cur.close()
     return resultados
 
+@contextmanager
+def select_en_streaming(query, params=None, tamano_bloque=10000):
+    """
+    Ejecuta un SELECT con un cursor sin buffer (del lado del servidor) y devuelve los
+    nombres de columna y un iterador sobre las filas.
+
+    Las filas se leen del servidor en bloques de `tamano_bloque`, de modo que la
+    memoria usada no depende del tamaño del resultado. La conexión permanece
+    prestada hasta salir del bloque `with`.
+
+    Args:
+        query (str): Consulta SQL a ejecutar.
+        params (tuple, opcional): Parámetros de la consulta SQL.
+        tamano_bloque (int, opcional): Filas leídas en cada `fetchmany`. Default: 10000.
+
+    Yields:
+        tuple: (columnas, filas) con la lista de nombres de columna, tomada del mismo
+        cursor, y un iterador de tuplas.
+
+    Ejemplo:
+        with select_en_streaming("SELECT * FROM archivos") as (columnas, filas):
+            for fila in filas:
+                print(dict(zip(columnas, fila)))
+    """
+    def leer(cur):
+        while filas := cur.fetchmany(tamano_bloque):
+            yield from filas
+
+    with conexion() as conn:
+        cur = conn.cursor(buffered=False)
+        try:
+            cur.execute(query, params or ())
+            columnas = [desc[0] for desc in cur.description]
+            yield columnas, leer(cur)
+        finally:
+            cur.close()
+
+def iterar_select(query, params=None, tamano_bloque=10000):
+    """
+    Ejecuta un SELECT con un cursor sin buffer y devuelve las filas una a una.
+
+    Es un atajo de `select_en_streaming` para cuando no se necesitan los nombres de columna.
+
+    Args:
+        query (str): Consulta SQL a ejecutar.
+        params (tuple, opcional): Parámetros de la consulta SQL.
+        tamano_bloque (int, opcional): Filas leídas en cada `fetchmany`. Default: 10000.
+
+    Yields:
+        tuple: Cada fila del resultado.
+
+    Ejemplo:
+        for ruta, hash_md5 in iterar_select("SELECT ruta, hash_md5 FROM archivos"):
+            print(ruta, hash_md5)
+    """
+    with select_en_streaming(query, params, tamano_bloque) as (_, filas):
+        yield from filas
+
 def ejecutar_modificacion(query, params=None):
     """
     Ejecuta una modificación en la base de datos (INSERT, UPDATE, DELETE)
@@ -104,9 +555,114 @@ def ejecutar_modificacion(query, params=None):
     Ejemplo:
         ejecutar_modificacion("DELETE FROM archivos WHERE id=?", (123,))
     """
-    conn = conectar()
-    cur = conn.cursor()
-    cur.execute(query, params or ())
-    conn.commit()
-    cur.close()
-    conn.close()
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params or ())
+        conn.commit()
+        cur.close()
+
+def ahora():
+    """
+    Devuelve la fecha y hora actuales según la base de datos (`NOW()` en MariaDB; en
+    SQLite, que es un fichero local, la hora local del equipo), sin microsegundos.
+
+    Returns:
+        datetime.datetime: Fecha y hora actuales.
+    """
+    if motor() == "sqlite":
+        return datetime.datetime.now().replace(microsecond=0)
+    return ejecutar_select("SELECT NOW()")[0][0]
+
+class EscritorLotes:
+    """
+    Acumula modificaciones y las ejecuta por lotes sobre una única conexión.
+
+    Las sentencias con la misma consulta se agrupan y se envían con `executemany`.
+    Cada vez que se acumulan `tamano_lote` filas se ejecutan todas las pendientes
+    y se hace un único commit. Usado como gestor de contexto, confirma lo pendiente
+    al salir o hace rollback del lote en curso si se produce una excepción.
+
+    Args:
+        tamano_lote (int, opcional): Filas por lote y por commit. Default: 1000.
+
+    Ejemplo:
+        with EscritorLotes(500) as escritor:
+            escritor.agregar("INSERT INTO archivos (nombre, ruta) VALUES (?, ?)", ("a.png", "/tmp/a.png"))
+            escritor.eliminar_en("archivos", "ruta", ["/tmp/b.png", "/tmp/c.png"])
+    """
+
+    def __init__(self, tamano_lote=1000):
+        self.tamano_lote = max(1, int(tamano_lote))
+        self.conn = conectar()
+        self.cur = self.conn.cursor()
+        self._pendientes = {}
+        self._num_pendientes = 0
+
+    def agregar(self, query, params):
+        """
+        Añade una modificación al lote en curso.
+
+        Args:
+            query (str): Consulta SQL parametrizada (INSERT/UPDATE/DELETE).
+            params (tuple): Parámetros de la consulta.
+        """
+        self._pendientes.setdefault(query, []).append(params)
+        self._num_pendientes += 1
+        if self._num_pendientes >= self.tamano_lote:
+            self.confirmar()
+
+    def eliminar_en(self, tabla, columna, valores):
+        """
+        Elimina las filas cuya `columna` esté en `valores`, en bloques de `tamano_lote`
+        con `DELETE ... WHERE columna IN (...)` y un commit por bloque.
+
+        Args:
+            tabla (str): Nombre de la tabla.
+            columna (str): Columna por la que filtrar.
+            valores (iterable): Valores a eliminar.
+
+        Returns:
+            int: Número de filas eliminadas.
+        """
+        self.confirmar()
+        valores = list(valores)
+        eliminadas = 0
+        for i in range(0, len(valores), self.tamano_lote):
+            bloque = valores[i:i + self.tamano_lote]
+            marcadores = ", ".join("?" * len(bloque))
+            self.cur.execute(f"DELETE FROM {tabla} WHERE {columna} IN ({marcadores})", tuple(bloque))
+            eliminadas += self.cur.rowcount
+            self.conn.commit()
+        return eliminadas
+
+    def confirmar(self):
+        """
+        Ejecuta todas las modificaciones pendientes y confirma con un único commit.
+        """
+        if not self._num_pendientes:
+            return
+        for query, filas in self._pendientes.items():
+            self.cur.executemany(query, filas)
+        self.conn.commit()
+        self._pendientes = {}
+        self._num_pendientes = 0
+
+    def cerrar(self):
+        """
+        Cierra el cursor y la conexión sin confirmar lo pendiente.
+        """
+        self.cur.close()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if tipo is None:
+                self.confirmar()
+            else:
+                self.conn.rollback()
+        finally:
+            self.cerrar()
+        return False
@@ -6,38 +6,73 @@ Proporciona funciones para exportar el contenido de la base de datos a archivos
 y subirlos a servidores remotos mediante SFTP.
 
 Funciones principales:
-    - exportar_tabla_a_json(tabla, fichero_salida):
-        Exporta los registros de una tabla de la base de datos a un fichero JSON.
-    - subir_json_por_sftp(fichero_local, rutas_remotas):
+    - exportar_tabla_a_json(tabla, fichero_salida, opciones=None):
+        Exporta los registros de una tabla de la base de datos a un fichero de inventario
+        (JSON, NDJSON, CSV o MessagePack, con compresión opcional) en streaming.
+    - exportar_incremental(tabla, fichero_salida, opciones=None):
+        Publica una base numerada y deltas con los cambios desde la versión anterior,
+        junto con un manifiesto que los enumera.
+    - olvidar_estado_incremental(opciones=None):
+        Borra el estado de la exportación incremental cuando se exporta sin ella.
+    - subir_json_por_sftp(fichero_local, rutas_remotas, max_canales=4):
         Sube un fichero JSON a una o varias rutas en un servidor SFTP usando credenciales
-        configuradas en `config/credenciales.json`.
+        configuradas en `config/credenciales.json`, con una sola conexión y canales en
+        paralelo, y devuelve un resumen por destino.
+    - borrar_por_sftp(nombres, rutas_remotas):
+        Borra de las rutas remotas los ficheros publicados que ya no se usan.
 
 Dependencias:
     - modules.db: para ejecutar consultas en la base de datos MariaDB.
     - modules.utils: para cargar credenciales.
     - modules.ssh: para subir ficheros por SFTP.
+    - modules.inventario: para escribir el inventario en el formato configurado.
+    - modules.metricas: para las métricas del inventario exportado y de las subidas.
     - json, os, logging, datetime
 """
 
 import json
 import os
 import logging
+from datetime import datetime
 
-from modules import db, utils, ssh
-from datetime import datetime, date
+from modules import db, utils, ssh, inventario, metricas
 
 logger = logging.getLogger(__name__)
 
-def exportar_tabla_a_json(tabla, fichero_salida):
+def exportar_tabla_a_json(tabla, fichero_salida, opciones=None):
     """
-    Exporta todos los registros de una tabla de la base de datos a un fichero JSON.
+    Exporta todos los registros de una tabla de la base de datos a un fichero de inventario.
+
+    Por defecto genera el JSON original (array de objetos). El formato, la compresión
+    y las columnas exportadas se pueden cambiar con `opciones` (ver `modules.inventario`).
+    Las filas se leen con un cursor sin buffer y se escriben según llegan, de modo que
+    la memoria usada no depende del tamaño de la tabla. Los nombres de columna se toman
+    del mismo cursor. El fichero se escribe con un nombre temporal y se renombra al
+    terminar, así nunca queda un inventario a medias.
 
     Args:
         tabla (str): Nombre de la tabla de la base de datos a exportar.
-        fichero_salida (str): Ruta local donde se guardará el fichero JSON.
+        fichero_salida (str): Ruta local donde se guardará el fichero. Su extensión se
+            ajusta al formato y la compresión elegidos.
+        opciones (dict, opcional): Sección "exportacion" de `config/config.json`:
+            - formato (str): "json", "ndjson", "csv" o "msgpack". Default: "json".
+            - compresion (str): "ninguna", "gzip" o "zstd". Default: "ninguna".
+            - columnas (list[str]): Columnas a exportar. Default: todas.
+            - compacto (bool): Solo para "json": un registro por línea sin sangría.
+              Default: False (sangría de 4 espacios).
+            - algoritmo_hash (str): Algoritmo de los hashes de la tabla (el de la sección
+              "sincronizacion"). Se anota en la cabecera del inventario y, si no es "md5",
+              se añade la columna `algoritmo_hash` a las exportadas. Default: "md5".
+            - huella_rapida (bool): Si la sincronización usa huellas rápidas; en ese caso
+              se añade la columna `nivel_huella` a las exportadas. Default: False.
+            - directorio (str): Carpeta sincronizada (`directorio_base`). Se anota en la
+              cabecera del inventario para que el cliente calcule las rutas relativas
+              sin adivinarla. Solo la llevan los formatos con cabecera ("ndjson" y
+              "msgpack") y el manifiesto del modo incremental; con "json" y "csv" el
+              cliente necesita `raiz_servidor` en su configuración. Default: None.
 
     Returns:
-        str: Ruta del fichero JSON generado.
+        str: Ruta del fichero generado.
 
     Notas:
         - Convierte automáticamente objetos `datetime` y `date` a formato ISO 8601.
@@ -45,60 +80,270 @@ def exportar_tabla_a_json(tabla, fichero_salida):
     
     Ejemplo:
         archivo = exportar_tabla_a_json("archivos", "inventario.json")
+        archivo = exportar_tabla_a_json("archivos", "inventario.json",
+                                        {"formato": "ndjson", "compresion": "gzip"})
     """
-    query = f"SELECT * FROM {tabla}"
-    registros = db.ejecutar_select(query)
+    opciones = opciones or {}
+    formato = opciones.get("formato", "json")
+    compresion = opciones.get("compresion", "ninguna")
+    columnas = _columnas_configuradas(opciones)
+    if formato != "json" or compresion != "ninguna":
+        fichero_salida = inventario.nombre_fichero(fichero_salida, formato, compresion)
 
-    # Obtener nombres de columnas
-    conn = db.conectar()
-    cur = conn.cursor()
-    cur.execute(f"SELECT * FROM {tabla} LIMIT 0")
-    columnas = [desc[0] for desc in cur.description]
-    cur.close()
-    conn.close()
+    query = f"SELECT {', '.join(columnas) if columnas else '*'} FROM {tabla}"
+    num_registros = _exportar_consulta(query, (), fichero_salida, opciones)
 
-    # Convertir registros a lista de diccionarios
-    datos = [dict(zip(columnas, fila)) for fila in registros]
+    logger.info(f"✅ Fichero de inventario exportado: {fichero_salida} "
+                f"({num_registros} registros, {formato}, compresión {compresion})")
+    return fichero_salida
 
-    # Función para convertir tipos especiales
-    def convertir(o):
-        if isinstance(o, (datetime, date)):
-            return o.isoformat()
-        return str(o)
 
-    with open(fichero_salida, "w", encoding="utf-8") as f:
-        json.dump(datos, f, ensure_ascii=False, indent=4, default=convertir)
+def _columnas_configuradas(opciones):
+    """
+    Devuelve las columnas configuradas en `opciones` (o None si se exportan todas),
+    añadiendo `algoritmo_hash` si los hashes no son MD5 y `nivel_huella` si hay huellas
+    rápidas, para que el cliente sepa cómo compararlos aunque el formato no tenga cabecera.
+    """
+    columnas = list(opciones.get("columnas") or [])
+    if not columnas:
+        return None
+    if opciones.get("algoritmo_hash", "md5") != "md5" and "algoritmo_hash" not in columnas:
+        columnas.append("algoritmo_hash")
+    if opciones.get("huella_rapida", False) and "nivel_huella" not in columnas:
+        columnas.append("nivel_huella")
+    return columnas
 
-    logger.info(f"✅ Fichero JSON exportado: {fichero_salida}")
-    return fichero_salida
+
+def _cabecera(opciones):
+    """
+    Datos del inventario que se anotan en su cabecera y en el manifiesto.
+    """
+    cabecera = {"algoritmo_hash": opciones.get("algoritmo_hash", "md5")}
+    if opciones.get("directorio"):
+        cabecera["directorio"] = opciones["directorio"]
+    return cabecera
+
+
+def _exportar_consulta(query, params, fichero_salida, opciones):
+    """
+    Escribe el resultado de `query` en `fichero_salida` con el formato de `opciones`.
+
+    El fichero se escribe con un nombre temporal y se renombra al terminar.
+
+    Returns:
+        int: Número de registros escritos.
+    """
+    fichero_temporal = fichero_salida + ".tmp"
+    with db.select_en_streaming(query, params) as (columnas_cursor, filas):
+        with inventario.EscritorInventario(fichero_temporal, columnas_cursor,
+                                           opciones.get("formato", "json"),
+                                           opciones.get("compresion", "ninguna"),
+                                           compacto=opciones.get("compacto", False),
+                                           cabecera=_cabecera(opciones)) as escritor:
+            for fila in filas:
+                escritor.escribir(fila)
+    os.replace(fichero_temporal, fichero_salida)
+    metricas.fijar("exportacion_registros", escritor.num_registros)
+    metricas.fijar("exportacion_bytes", os.path.getsize(fichero_salida))
+    return escritor.num_registros
 
 
-def subir_json_por_sftp(fichero_local, rutas_remotas):
+def exportar_incremental(tabla, fichero_salida, opciones=None):
+    """
+    Publica el inventario como una base numerada más deltas con los cambios desde la
+    versión anterior, y un manifiesto que los enumera (ver `modules.inventario`).
+
+    En cada ejecución:
+        - Si no hay estado previo, o ya se han publicado `compactar_cada` deltas desde
+          la última base, exporta una base nueva con la tabla completa y purga del
+          registro de borrados lo que la base ya recoge.
+        - En otro caso exporta un delta con las filas cuya `ultima_actualizacion` es
+          posterior a la marca anterior y las bajas de `<tabla>_eliminados` (con
+          `eliminado` = 1). Si no hay cambios no se publica nada.
+
+    Las marcas de tiempo se toman del reloj de la base de datos y se comparan con `>=`,
+    de modo que un cambio en el mismo segundo que la marca aparece (de más) en el
+    siguiente delta en lugar de perderse; aplicar un registro dos veces no tiene efecto.
+
+    Args:
+        tabla (str): Nombre de la tabla de la base de datos a exportar.
+        fichero_salida (str): Nombre base del inventario (por ejemplo "inventario.json").
+        opciones (dict, opcional): Sección "exportacion" de `config/config.json`. Además de
+            las de `exportar_tabla_a_json`:
+            - compactar_cada (int): Deltas publicados antes de generar una base nueva. Default: 24.
+            - ruta_estado (str): Fichero JSON local con la versión y la marca de la última
+              exportación. Default: "estado_exportacion.json".
+
+    Returns:
+        dict: Diccionario con:
+            - subir (list[str]): Ficheros locales a publicar, con el manifiesto el último.
+            - obsoletos (list[str]): Nombres de ficheros publicados que ya no se usan.
+
+    Ejemplo:
+        resultado = exportar_incremental("archivos", "inventario.json", {"compactar_cada": 12})
+    """
+    opciones = opciones or {}
+    formato = opciones.get("formato", "json")
+    compresion = opciones.get("compresion", "ninguna")
+    compactar_cada = opciones.get("compactar_cada", 24)
+    ruta_estado = opciones.get("ruta_estado", "estado_exportacion.json")
+    directorio = os.path.dirname(fichero_salida)
+    nombre = os.path.basename(fichero_salida)
+
+    estado = utils.cargar_json(ruta_estado) if os.path.isfile(ruta_estado) else None
+    marca_nueva = db.ahora()
+
+    # Columnas exportadas: las configuradas (siempre con `ruta`) o todas las de la tabla
+    columnas = _columnas_configuradas(opciones)
+    if not columnas:
+        with db.select_en_streaming(f"SELECT * FROM {tabla} LIMIT 0") as (columnas, _):
+            pass
+    elif "ruta" not in columnas:
+        columnas.append("ruta")
+    lista_columnas = ", ".join(columnas)
+
+    nueva_base = estado is None or len(estado["deltas"]) >= compactar_cada
+    version = (estado["version"] + 1) if estado else 1
+    tipo = "base" if nueva_base else "delta"
+    fichero_version = os.path.join(directorio, inventario.nombre_version(nombre, tipo, version, formato, compresion))
+
+    if nueva_base:
+        num_registros = _exportar_consulta(f"SELECT {lista_columnas} FROM {tabla}", (),
+                                           fichero_version, opciones)
+        obsoletos = ([estado["base"]["fichero"]] + [d["fichero"] for d in estado["deltas"]]) if estado else []
+        estado = {"base": {"version": version, "fichero": os.path.basename(fichero_version)}, "deltas": []}
+        db.ejecutar_modificacion(f"DELETE FROM {tabla}_eliminados WHERE eliminado_en < ?", (marca_nueva,))
+    else:
+        marca_anterior = datetime.fromisoformat(estado["marca"])
+        bajas = ", ".join("ruta" if c == "ruta" else f"NULL AS {c}" for c in columnas)
+        query = f"""
+            SELECT {bajas}, 1 AS eliminado FROM {tabla}_eliminados WHERE eliminado_en >= ?
+            UNION ALL
+            SELECT {lista_columnas}, 0 AS eliminado FROM {tabla} WHERE ultima_actualizacion >= ?
+            ORDER BY eliminado DESC
+        """
+        # Las bajas van primero: si una ruta se borró y se volvió a crear, gana el alta.
+        num_registros = _exportar_consulta(query, (marca_anterior, marca_anterior), fichero_version, opciones)
+        if num_registros == 0:
+            os.remove(fichero_version)
+            logger.info(f"Sin cambios desde la versión {estado['version']}: no se publica ningún delta")
+            return {"subir": [], "obsoletos": []}
+        obsoletos = []
+        estado["deltas"].append({"version": version, "fichero": os.path.basename(fichero_version)})
+
+    estado["version"] = version
+    estado["marca"] = marca_nueva.isoformat()
+
+    fichero_manifiesto = os.path.join(directorio, inventario.nombre_manifiesto(nombre))
+    manifiesto = {
+        "version": version,
+        "formato": formato,
+        "compresion": compresion,
+        **_cabecera(opciones),
+        "base": estado["base"],
+        "deltas": estado["deltas"]
+    }
+    with open(fichero_manifiesto + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=4)
+    os.replace(fichero_manifiesto + ".tmp", fichero_manifiesto)
+    with open(ruta_estado + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=4)
+    os.replace(ruta_estado + ".tmp", ruta_estado)
+
+    logger.info(f"✅ Exportada {tipo} versión {version}: {fichero_version} ({num_registros} registros)")
+    return {"subir": [fichero_version, fichero_manifiesto], "obsoletos": obsoletos}
+
+
+def olvidar_estado_incremental(opciones=None):
+    """
+    Borra el fichero de estado de `exportar_incremental`, si existe.
+
+    Mientras se exporta sin el modo incremental no se mantiene el registro de borrados
+    (ver `db.inicializar_tabla`), así que un delta calculado desde ese estado perdería
+    las bajas de ese periodo. Sin estado, al volver al modo incremental se publica
+    primero una base nueva.
+
+    Args:
+        opciones (dict, opcional): Sección "exportacion" de `config/config.json`
+            (se usa `ruta_estado`).
+    """
+    ruta_estado = (opciones or {}).get("ruta_estado", "estado_exportacion.json")
+    if os.path.isfile(ruta_estado):
+        os.remove(ruta_estado)
+        logger.info(f"Exportación no incremental: se descarta el estado incremental {ruta_estado}")
+
+
+def subir_json_por_sftp(fichero_local, rutas_remotas, max_canales=4):
     """
     Sube un fichero JSON a una o varias rutas en un servidor SFTP.
 
+    Todas las rutas se sirven desde una única conexión SFTP con varios canales en
+    paralelo, y cada canal envía el fichero local por bloques, sin cargarlo entero en
+    memoria (ver `ssh.SubirFicheroSFTPMultiple`).
+
     Args:
         fichero_local (str): Ruta local del fichero JSON a subir.
         rutas_remotas (list[str]): Lista de rutas remotas donde se debe subir el archivo.
+        max_canales (int, opcional): Subidas simultáneas. Default: 4.
 
     Returns:
-        None
+        dict: Resumen por ruta remota con las claves `ok`, `omitido`, `error`, `bytes` y `segundos`.
 
     Notas:
         - Utiliza las credenciales SFTP definidas en `config/credenciales.json`.
-        - Registra en el logger el progreso de la subida y posibles errores.
+        - Registra en el logger el resultado de cada destino.
+        - La subida es atómica y se omite en los destinos donde el fichero ya es idéntico.
     
     Ejemplo:
-        subir_json_por_sftp("inventario.json", ["/remote/path1", "/remote/path2"])
+        resumen = subir_json_por_sftp("inventario.json", ["/remote/path1", "/remote/path2"])
+        fallidas = [ruta for ruta, estado in resumen.items() if not estado["ok"]]
     """
     creds = utils.cargar_credenciales()
     credenciales_sftp = creds["SFTP"]
 
-    for ruta in rutas_remotas:
-        nombre_fichero = os.path.basename(fichero_local)
-        logger.info(f"📤 Subiendo {nombre_fichero} a {ruta}...")
-        ok = ssh.SubirFicheroSFTP(credenciales_sftp, ruta, fichero_local, nombre_fichero)
-        if ok:
-            logger.info(f"✅ Subida completada en {ruta}")
+    nombre_fichero = os.path.basename(fichero_local)
+    logger.info(f"📤 Subiendo {nombre_fichero} a {len(rutas_remotas)} rutas...")
+    resumen = ssh.SubirFicheroSFTPMultiple(credenciales_sftp, rutas_remotas, fichero_local,
+                                           nombre_fichero, max_canales)
+    for ruta, estado in resumen.items():
+        if estado["omitido"]:
+            logger.info(f"⏭️ {nombre_fichero} sin cambios en {ruta}, no se sube")
+            metricas.sumar("subida_ficheros", 1, destino=ruta, resultado="omitido")
+        elif estado["ok"]:
+            logger.info(f"✅ Subida completada en {ruta} ({estado['bytes']} bytes, {estado['segundos']} s)")
+            metricas.sumar("subida_ficheros", 1, destino=ruta, resultado="ok")
+            metricas.sumar("subida_bytes", estado["bytes"], destino=ruta)
+            metricas.sumar("subida_segundos", estado["segundos"], destino=ruta)
+            segundos = metricas.valor("subida_segundos", destino=ruta)
+            if segundos > 0:
+                metricas.fijar("subida_bytes_por_segundo",
+                               round(metricas.valor("subida_bytes", destino=ruta) / segundos), destino=ruta)
         else:
-            logger.error(f"❌ Error al subir a {ruta}")
+            logger.error(f"❌ Error al subir a {ruta}: {estado['error']}")
+            metricas.sumar("subida_ficheros", 1, destino=ruta, resultado="error")
+    return resumen
+
+
+def borrar_por_sftp(nombres, rutas_remotas):
+    """
+    Borra ficheros publicados que ya no se usan de una o varias rutas del servidor SFTP.
+
+    Args:
+        nombres (list[str]): Nombres de los ficheros a borrar.
+        rutas_remotas (list[str]): Rutas remotas donde se publicaron.
+
+    Ejemplo:
+        borrar_por_sftp(["inventario.delta.6.json"], ["/remote/path1"])
+    """
+    if not nombres:
+        return
+    credenciales_sftp = utils.cargar_credenciales()["SFTP"]
+    try:
+        with ssh.SesionSFTP(credenciales_sftp) as sesion:
+            for ruta in rutas_remotas:
+                for nombre in nombres:
+                    if sesion.borrar(ruta, nombre):
+                        logger.info(f"🗑️ Borrado {nombre} obsoleto de {ruta}")
+    except Exception as e:
+        logger.error(f"No consigo borrar ficheros obsoletos en el servidor {credenciales_sftp[0]}")
+        logger.error(e)
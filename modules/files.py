@@ -2,37 +2,329 @@
 Módulo `files`
 ---------------
 
-Proporciona funciones para el manejo de archivos locales, cálculo de hashes MD5,
-obtención de metadatos y escaneo recursivo de directorios.
+Proporciona funciones para el manejo de archivos locales, cálculo de hashes (MD5 u
+otro algoritmo configurable), obtención de metadatos y escaneo recursivo de directorios.
 
 Funciones principales:
-    - calcular_md5(fichero, bloque=65536):
+    - hash_fichero(fichero, algoritmo="md5", bloque=None, usar_mmap=True):
+        Calcula el hash de un fichero con cualquiera de los `ALGORITMOS_HASH`, leyendo
+        con `readinto` sobre un búfer reutilizado o con `mmap` los ficheros grandes.
+    - tamano_bloque(tamano, sistema=None):
+        Elige el tamaño de bloque de lectura según el tamaño del fichero y el sistema de ficheros.
+    - sistema_ficheros(stat):
+        Devuelve el tipo de sistema de ficheros (ext4, nfs...) en el que está un fichero.
+    - resolver_algoritmo(algoritmo):
+        Devuelve el algoritmo que se usará realmente (con el de respaldo de la
+        biblioteca estándar si falta la dependencia opcional).
+    - huella_rapida(fichero, algoritmo="md5", stat=None):
+        Calcula una huella rápida a partir del tamaño y de tres muestras (inicio,
+        mitad y final) del fichero, sin leerlo entero.
+    - calcular_md5(fichero, bloque=None):
         Calcula el hash MD5 de un fichero.
-    - obtener_metadatos(ruta):
+    - huella_stat(stat):
+        Devuelve la huella (dispositivo, inodo, tamaño, mtime_ns) de un resultado de `os.stat`.
+    - obtener_metadatos(ruta, previo=None, calcular_hash=True, stat=None, algoritmo="md5",
+                        usar_mmap=True, rapido=False):
         Obtiene metadatos de un archivo como nombre, ruta, tamaño, hash, fecha de creación,
-        extensión y tipo MIME.
-    - escanear_directorio(base):
+        extensión y tipo MIME. Reutiliza el hash de `previo` si la huella no ha cambiado.
+    - obtener_metadatos_en_paralelo(rutas, workers=1, buscar_previo=None, maximo_workers=None,
+                                    algoritmo="md5", usar_mmap=True, rapido=False):
+        Obtiene los metadatos de muchos ficheros con un pool de hilos y los devuelve
+        según van terminando.
+    - recorrer_directorio(base, opciones=None):
+        Generador basado en `os.scandir` que devuelve (ruta, stat) de cada fichero,
+        con reglas de inclusión/exclusión, profundidad máxima y política de enlaces.
+    - admite_ruta(ruta, base, opciones=None):
+        Indica si una ruta concreta pasa las reglas de `recorrer_directorio`.
+    - admite_carpeta(ruta, base, opciones=None):
+        Indica si `recorrer_directorio` entraría en una carpeta concreta.
+    - escanear_directorio(base, opciones=None):
         Escanea un directorio de manera recursiva y devuelve la lista de ficheros encontrados.
 
 Dependencias:
     - os: para manejo de archivos y rutas.
-    - hashlib: para cálculo de hashes MD5.
+    - fnmatch: para los patrones de inclusión y exclusión del escaneo.
+    - hashlib: para cálculo de hashes MD5, SHA-256 y BLAKE2b.
+    - blake3, xxhash (opcionales): para los algoritmos "blake3" y "xxh3_64"/"xxh3_128"/"xxh64".
+    - mmap, threading: para la lectura sin copias y los búferes por hilo.
     - mimetypes: para obtener tipo MIME de archivos.
     - datetime: para manejo de fechas.
+    - concurrent.futures, time: para el cálculo de hashes en paralelo.
+    - metricas: para contar los ficheros y bytes leídos al calcular hashes.
 """
 
 import os
+import fnmatch
 import hashlib
 import mimetypes
 import datetime
+import mmap
+import threading
+import time
 
-def calcular_md5(fichero, bloque=65536):
+from . import metricas
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import blake3
+except ImportError:  # pragma: no cover - dependencia opcional
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - dependencia opcional
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+# Algoritmos de hash disponibles: nombre -> (constructor, algoritmo de respaldo si falta la dependencia)
+ALGORITMOS_HASH = {
+    "md5": (hashlib.md5, None),
+    "sha256": (hashlib.sha256, None),
+    "blake2b": (lambda: hashlib.blake2b(digest_size=32), None),
+    "blake3": (blake3.blake3 if blake3 else None, "blake2b"),
+    "xxh3_64": (xxhash.xxh3_64 if xxhash else None, "blake2b"),
+    "xxh3_128": (xxhash.xxh3_128 if xxhash else None, "blake2b"),
+    "xxh64": (xxhash.xxh64 if xxhash else None, "blake2b"),
+}
+
+_avisos_respaldo = set()
+
+# Lectura de ficheros para el hash
+BLOQUE_MINIMO = 64 * 1024
+BLOQUE_MAXIMO = 1024 * 1024
+UMBRAL_MMAP = 64 * 1024 * 1024
+# Huella rápida: tamaño + tres muestras de MUESTRA_HUELLA bytes. Cliente y servidor deben
+# usar los mismos valores para que las huellas sean comparables.
+NIVELES_HUELLA = ("completo", "rapido")
+MUESTRA_HUELLA = 1024 * 1024
+UMBRAL_HUELLA_RAPIDA = 16 * 1024 * 1024
+
+SISTEMAS_RED = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs",
+                "fuse.sshfs", "fuse.rclone", "davfs", "afs"}
+
+_buferes = threading.local()
+_sistemas = {}
+_bloqueo_sistemas = threading.Lock()
+
+
+def resolver_algoritmo(algoritmo):
+    """
+    Devuelve el nombre del algoritmo de hash que se usará realmente.
+
+    Si el algoritmo necesita una biblioteca opcional que no está instalada (`blake3`
+    o `xxhash`), se usa en su lugar el de respaldo de la biblioteca estándar y se
+    avisa una vez en el log. El nombre devuelto es el que debe guardarse junto al hash.
+
+    Args:
+        algoritmo (str): Uno de `ALGORITMOS_HASH`.
+
+    Returns:
+        str: Algoritmo efectivo.
+
+    Raises:
+        ValueError: Si el algoritmo no existe.
+    """
+    if algoritmo not in ALGORITMOS_HASH:
+        raise ValueError(f"Algoritmo de hash no soportado: {algoritmo} (use {', '.join(ALGORITMOS_HASH)})")
+    constructor, respaldo = ALGORITMOS_HASH[algoritmo]
+    if constructor is not None:
+        return algoritmo
+    if algoritmo not in _avisos_respaldo:
+        _avisos_respaldo.add(algoritmo)
+        logger.warning(f"El algoritmo {algoritmo} necesita una biblioteca que no está instalada; se usa {respaldo}")
+    return respaldo
+
+
+def _cargar_montajes():
+    """
+    Lee /proc/self/mounts y anota el tipo de sistema de ficheros de cada dispositivo.
+    """
+    try:
+        with open("/proc/self/mounts", encoding="utf-8", errors="replace") as f:
+            lineas = f.readlines()
+    except OSError:
+        return
+    for linea in lineas:
+        campos = linea.split()
+        if len(campos) < 3:
+            continue
+        # Espacios, tabuladores, saltos de línea y barras vienen como secuencias octales
+        punto = campos[1]
+        for secuencia, caracter in (("\\040", " "), ("\\011", "\t"), ("\\012", "\n"), ("\\134", "\\")):
+            punto = punto.replace(secuencia, caracter)
+        try:
+            _sistemas[os.stat(punto).st_dev] = campos[2]
+        except OSError:
+            continue
+
+
+def sistema_ficheros(stat):
+    """
+    Devuelve el tipo de sistema de ficheros (ext4, xfs, nfs...) del dispositivo de un fichero.
+
+    Los puntos de montaje se leen de /proc/self/mounts la primera vez que aparece cada
+    dispositivo, así que solo funciona en Linux.
+
+    Args:
+        stat (os.stat_result): Resultado de `os.stat` del fichero.
+
+    Returns:
+        str | None: Tipo del sistema de ficheros, o None si no se puede averiguar.
+    """
+    with _bloqueo_sistemas:
+        if stat.st_dev not in _sistemas:
+            _cargar_montajes()
+            _sistemas.setdefault(stat.st_dev, None)
+        return _sistemas[stat.st_dev]
+
+
+def tamano_bloque(tamano, sistema=None):
+    """
+    Elige el tamaño de bloque de lectura para calcular el hash de un fichero.
+
+    Los ficheros pequeños se leen de una vez, los medianos en bloques de 256 KiB y los
+    grandes, o los de sistemas de ficheros de red, en bloques de 1 MiB para reducir el
+    número de llamadas al sistema (y de peticiones al servidor en NFS/SMB).
+
+    Args:
+        tamano (int): Tamaño del fichero en bytes.
+        sistema (str, opcional): Tipo de sistema de ficheros (ver `sistema_ficheros`).
+
+    Returns:
+        int: Tamaño de bloque en bytes, entre `BLOQUE_MINIMO` y `BLOQUE_MAXIMO`.
+    """
+    if sistema in SISTEMAS_RED or tamano >= UMBRAL_MMAP:
+        return BLOQUE_MAXIMO
+    if tamano <= BLOQUE_MINIMO:
+        return BLOQUE_MINIMO
+    if tamano <= 256 * 1024:
+        # Cabe entero en una potencia de dos: una sola lectura
+        return 1 << (tamano - 1).bit_length()
+    return 256 * 1024
+
+
+def _bufer_hilo():
+    """
+    Devuelve el búfer de lectura del hilo actual, que se reutiliza en cada fichero.
+    """
+    bufer = getattr(_buferes, "bufer", None)
+    if bufer is None:
+        bufer = _buferes.bufer = memoryview(bytearray(BLOQUE_MAXIMO))
+    return bufer
+
+
+def hash_fichero(fichero, algoritmo="md5", bloque=None, usar_mmap=True):
+    """
+    Calcula el hash de un fichero con el algoritmo indicado.
+
+    La lectura no crea un objeto `bytes` por bloque: se hace con `readinto` sobre un
+    búfer preasignado por hilo y se pasa al hash una `memoryview` de la parte leída.
+    Los ficheros de más de `UMBRAL_MMAP` en discos locales se proyectan en memoria con
+    `mmap` y se entregan al hash directamente desde la caché de páginas.
+
+    Args:
+        fichero (str): Ruta al archivo.
+        algoritmo (str, opcional): Uno de `ALGORITMOS_HASH`. Default: "md5".
+        bloque (int, opcional): Tamaño de bloque en bytes (como máximo `BLOQUE_MAXIMO`).
+            Default: None, se elige con `tamano_bloque`.
+        usar_mmap (bool, opcional): Permite usar `mmap` con los ficheros grandes. Default: True.
+
+    Returns:
+        str: Cadena hexadecimal del hash (del algoritmo efectivo, ver `resolver_algoritmo`).
+
+    Ejemplo:
+        hash_archivo = hash_fichero("/tmp/imagen.png", "xxh3_128")
+
+    Notas:
+        - Si otro proceso trunca el fichero mientras se lee con `mmap`, el sistema envía
+          SIGBUS al proceso. Si los ficheros grandes pueden cambiar durante la
+          sincronización, conviene llamar con `usar_mmap=False`.
+    """
+    algoritmo = resolver_algoritmo(algoritmo)
+    hasher = ALGORITMOS_HASH[algoritmo][0]()
+    with open(fichero, "rb", buffering=0) as f:
+        stat = os.fstat(f.fileno())
+        # Los ficheros pequeños se leen de una vez en cualquier sistema de ficheros
+        sistema = sistema_ficheros(stat) if stat.st_size > 256 * 1024 else None
+        bloque = min(bloque or tamano_bloque(stat.st_size, sistema), BLOQUE_MAXIMO)
+
+        if usar_mmap and stat.st_size >= UMBRAL_MMAP and sistema not in SISTEMAS_RED:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if hasattr(mapa, "madvise"):
+                    mapa.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapa) as vista:
+                    for inicio in range(0, len(vista), bloque):
+                        hasher.update(vista[inicio:inicio + bloque])
+            _contar_lectura(algoritmo, stat.st_size)
+            return hasher.hexdigest()
+
+        bufer = _bufer_hilo()[:bloque]
+        total = 0
+        while leidos := f.readinto(bufer):
+            hasher.update(bufer[:leidos])
+            total += leidos
+            # Lectura corta tras alcanzar el tamaño: fin de fichero sin otra llamada a read
+            if leidos < bloque and total >= stat.st_size:
+                break
+    _contar_lectura(algoritmo, total)
+    return hasher.hexdigest()
+
+
+def _contar_lectura(algoritmo, leidos):
+    """
+    Anota en `metricas` un fichero leído para calcular su hash y los bytes leídos.
+    """
+    metricas.sumar("ficheros_hasheados", 1, algoritmo=algoritmo)
+    metricas.sumar("bytes_hasheados", leidos, algoritmo=algoritmo)
+
+
+def huella_rapida(fichero, algoritmo="md5", stat=None):
+    """
+    Calcula la huella rápida de un fichero: el hash de su tamaño y de tres bloques de
+    `MUESTRA_HUELLA` bytes tomados del inicio, la mitad y el final.
+
+    Lee como mucho 3 MiB aunque el fichero ocupe varios GB. Dos ficheros con distinta
+    huella rápida son distintos seguro; con la misma huella rápida probablemente son
+    iguales, pero un cambio fuera de las muestras que no altere el tamaño no se detecta
+    (ver `obtener_metadatos` para cuándo se pasa al hash completo).
+
+    Args:
+        fichero (str): Ruta al archivo.
+        algoritmo (str, opcional): Uno de `ALGORITMOS_HASH`. Default: "md5".
+        stat (os.stat_result, opcional): Resultado de `os.stat` ya obtenido. Default: None.
+
+    Returns:
+        str: Cadena hexadecimal de la huella.
+
+    Ejemplo:
+        huella = huella_rapida("/videos/rodaje.mov", "xxh3_128")
+    """
+    algoritmo = resolver_algoritmo(algoritmo)
+    hasher = ALGORITMOS_HASH[algoritmo][0]()
+    with open(fichero, "rb", buffering=0) as f:
+        tamano = (stat or os.fstat(f.fileno())).st_size
+        hasher.update(tamano.to_bytes(8, "little"))
+        bufer = _bufer_hilo()[:MUESTRA_HUELLA]
+        total = 0
+        for inicio in (0, max(0, tamano // 2 - MUESTRA_HUELLA // 2), max(0, tamano - MUESTRA_HUELLA)):
+            f.seek(inicio)
+            leidos = f.readinto(bufer)
+            hasher.update(bufer[:leidos])
+            total += leidos
+    _contar_lectura(algoritmo, total)
+    return hasher.hexdigest()
+
+
+def calcular_md5(fichero, bloque=None):
     """
     Calcula el hash MD5 de un fichero.
 
     Args:
         fichero (str): Ruta al archivo cuyo hash se desea calcular.
-        bloque (int, opcional): Tamaño de bloque en bytes para leer el archivo. Default: 65536.
+        bloque (int, opcional): Tamaño de bloque en bytes para leer el archivo.
+            Default: None, se elige con `tamano_bloque`.
 
     Returns:
         str: Cadena hexadecimal del hash MD5 del archivo.
@@ -40,55 +332,435 @@ def calcular_md5(fichero, bloque=65536):
     Ejemplo:
         hash_archivo = calcular_md5("/tmp/imagen.png")
     """
-    md5 = hashlib.md5()
-    with open(fichero, "rb") as f:
-        while chunk := f.read(bloque):
-            md5.update(chunk)
-    return md5.hexdigest()
+    return hash_fichero(fichero, "md5", bloque)
 
-def obtener_metadatos(ruta):
+def huella_stat(stat):
+    """
+    Devuelve la huella de un fichero a partir de su resultado de `os.stat`.
+
+    Dos llamadas con la misma huella corresponden, a efectos prácticos, al mismo
+    contenido: mismo dispositivo, mismo inodo, mismo tamaño y misma fecha de
+    modificación en nanosegundos.
+
+    Args:
+        stat (os.stat_result): Resultado de `os.stat` del fichero.
+
+    Returns:
+        tuple: (dispositivo, inodo, tamano, mtime_ns)
+
+    Ejemplo:
+        huella = huella_stat(os.stat("/tmp/imagen.png"))
+    """
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def obtener_metadatos(ruta, previo=None, calcular_hash=True, stat=None, algoritmo="md5",
+                      usar_mmap=True, rapido=False):
     """
     Obtiene metadatos de un archivo.
 
+    Si se proporciona `previo` (los metadatos guardados en una ejecución anterior)
+    y su huella (dispositivo, inodo, tamano, mtime_ns) y su algoritmo de hash coinciden
+    con los actuales, se reutiliza su `hash_md5` sin abrir el fichero.
+
+    En modo rápido, los ficheros de más de `UMBRAL_HUELLA_RAPIDA` bytes se identifican
+    con `huella_rapida` en lugar del hash completo (`nivel_huella` = "rapido"). Si
+    `previo` tenía huella rápida y el fichero ha cambiado desde entonces, se calcula el
+    hash completo, porque la huella rápida no vería un cambio fuera de las muestras. Las
+    colisiones entre huellas rápidas de ficheros distintos las resuelve `sync` (ver
+    `_escalar_colisiones`).
+
+    Por compatibilidad, el hash se devuelve siempre en la clave `hash_md5`, aunque se
+    calcule con otro algoritmo; `algoritmo_hash` indica cuál.
+
     Args:
         ruta (str): Ruta al archivo.
+        previo (dict, opcional): Metadatos almacenados con las claves `hash_md5`,
+            `dispositivo`, `inodo`, `tamano`, `mtime_ns` y `algoritmo_hash` (si falta,
+            se supone "md5"). Default: None.
+        calcular_hash (bool, opcional): Si es False, no se lee el fichero y `hash_md5`
+            es None salvo que se pueda reutilizar el de `previo`. Default: True.
+        stat (os.stat_result, opcional): Resultado de `os.stat` ya obtenido (por ejemplo,
+            por `recorrer_directorio`), para no repetir la llamada. Default: None.
+        algoritmo (str, opcional): Algoritmo de hash (ver `ALGORITMOS_HASH`). Default: "md5".
+        usar_mmap (bool, opcional): Permite leer con `mmap` los ficheros grandes (ver
+            `hash_fichero`). Default: True.
+        rapido (bool, opcional): Usa la huella rápida en los ficheros grandes. Default: False.
 
     Returns:
         dict: Diccionario con la siguiente información:
             - nombre (str): Nombre del archivo.
             - ruta (str): Ruta completa.
-            - hash_md5 (str): Hash MD5 del archivo.
+            - hash_md5 (str | None): Hash del archivo (con `algoritmo_hash`).
+            - algoritmo_hash (str): Algoritmo efectivo del hash.
+            - nivel_huella (str): "completo" (hash de todo el contenido) o "rapido"
+              (`huella_rapida`).
             - tamano (int): Tamaño en bytes.
             - fecha_creacion (datetime): Fecha de creación del archivo.
             - extension (str): Extensión del archivo (con punto).
             - mime_type (str): Tipo MIME estimado (puede ser None).
+            - dispositivo (int): Identificador del dispositivo (st_dev).
+            - inodo (int): Número de inodo (st_ino).
+            - mtime_ns (int): Fecha de modificación en nanosegundos.
+            - hash_reutilizado (bool): True si el hash se tomó de `previo`.
 
     Ejemplo:
         meta = obtener_metadatos("/tmp/imagen.png")
     """
-    stat = os.stat(ruta)
+    if stat is None:
+        stat = os.stat(ruta)
     nombre = os.path.basename(ruta)
     tamano = stat.st_size
     fecha_creacion = datetime.datetime.fromtimestamp(stat.st_ctime)
     extension = os.path.splitext(nombre)[1].lower()
     mime_type, _ = mimetypes.guess_type(ruta)
-    hash_md5 = calcular_md5(ruta)
+    dispositivo, inodo, _, mtime_ns = huella = huella_stat(stat)
+
+    algoritmo = resolver_algoritmo(algoritmo)
+    nivel_previo = (previo.get("nivel_huella") or "completo") if previo else None
+    hash_reutilizado = modificado_rapido = False
+    if previo and previo.get("hash_md5") and previo.get("algoritmo_hash", "md5") == algoritmo:
+        huella_previa = (previo.get("dispositivo"), previo.get("inodo"),
+                         previo.get("tamano"), previo.get("mtime_ns"))
+        # Un hash completo sirve siempre; una huella rápida, solo en modo rápido
+        hash_reutilizado = huella_previa == huella and (rapido or nivel_previo == "completo")
+        modificado_rapido = huella_previa != huella and nivel_previo == "rapido"
+
+    hash_md5, nivel_huella = None, "completo"
+    if hash_reutilizado:
+        hash_md5, nivel_huella = previo["hash_md5"], nivel_previo
+    elif calcular_hash:
+        # Un fichero con huella rápida que ha cambiado pasa al hash completo: la huella
+        # rápida no vería una modificación fuera de las muestras
+        if rapido and tamano > UMBRAL_HUELLA_RAPIDA and not modificado_rapido:
+            hash_md5, nivel_huella = huella_rapida(ruta, algoritmo, stat), "rapido"
+        else:
+            hash_md5 = hash_fichero(ruta, algoritmo, usar_mmap=usar_mmap)
+
     return {
         "nombre": nombre,
         "ruta": ruta,
         "hash_md5": hash_md5,
+        "algoritmo_hash": algoritmo,
+        "nivel_huella": nivel_huella,
         "tamano": tamano,
         "fecha_creacion": fecha_creacion,
         "extension": extension,
-        "mime_type": mime_type
+        "mime_type": mime_type,
+        "dispositivo": dispositivo,
+        "inodo": inodo,
+        "mtime_ns": mtime_ns,
+        "hash_reutilizado": hash_reutilizado
     }
 
-def escanear_directorio(base):
+class _AjusteWorkers:
+    """
+    Ajusta el número de hashes simultáneos según los MB/s medidos.
+
+    Empieza con un worker y duplica la concurrencia mientras el rendimiento de cada
+    ventana de medida mejore al menos un 10 %. En cuanto deja de mejorar, se queda con
+    la mejor concurrencia observada.
+    """
+
+    def __init__(self, maximo, ventana=2.0):
+        self.concurrencia = 1
+        self.maximo = maximo
+        self.ventana = ventana
+        self.explorando = maximo > 1
+        self.mejor_mbs = 0.0
+        self.mejor_concurrencia = 1
+        self._bytes = 0
+        self._inicio = time.monotonic()
+
+    def registrar(self, bytes_leidos):
+        if not self.explorando:
+            return
+        self._bytes += bytes_leidos
+        transcurrido = time.monotonic() - self._inicio
+        if transcurrido < self.ventana or self._bytes == 0:
+            return
+
+        mbs = self._bytes / transcurrido / (1024 * 1024)
+        logger.debug(f"Rendimiento con {self.concurrencia} workers: {mbs:.1f} MB/s")
+        if mbs > self.mejor_mbs * 1.10:
+            self.mejor_mbs = mbs
+            self.mejor_concurrencia = self.concurrencia
+            if self.concurrencia < self.maximo:
+                self.concurrencia = min(self.maximo, self.concurrencia * 2)
+            else:
+                self.explorando = False
+        else:
+            self.concurrencia = self.mejor_concurrencia
+            self.explorando = False
+        if not self.explorando:
+            logger.info(f"Workers de hash ajustados a {self.concurrencia} ({self.mejor_mbs:.1f} MB/s)")
+        self._bytes = 0
+        self._inicio = time.monotonic()
+
+def obtener_metadatos_en_paralelo(rutas, workers=1, buscar_previo=None, maximo_workers=None,
+                                  algoritmo="md5", usar_mmap=True, rapido=False):
+    """
+    Obtiene los metadatos de varios ficheros en paralelo con un pool de hilos.
+
+    La lectura de disco y el cálculo del MD5 liberan el GIL, por lo que varios hilos
+    mantienen varias lecturas en curso y aprovechan varios núcleos. Los resultados se
+    devuelven en orden de finalización, no en el orden de `rutas`.
+
+    Args:
+        rutas (iterable[str | tuple]): Rutas de los ficheros a procesar, o pares
+            (ruta, stat) como los que devuelve `recorrer_directorio`. Se consumen
+            de forma perezosa, a medida que hay hilos libres.
+        workers (int | str, opcional): Número de hilos, o "auto" para ajustarlo según
+            los MB/s medidos. Default: 1.
+        buscar_previo (callable, opcional): Función `ruta -> dict | None` que devuelve
+            los metadatos guardados del fichero (ver `obtener_metadatos`). Se ejecuta
+            dentro del worker. Default: None.
+        maximo_workers (int, opcional): Límite de hilos en modo "auto".
+            Default: número de CPUs.
+        algoritmo (str, opcional): Algoritmo de hash (ver `ALGORITMOS_HASH`). Default: "md5".
+        usar_mmap (bool, opcional): Permite leer con `mmap` los ficheros grandes. Default: True.
+        rapido (bool, opcional): Usa la huella rápida en los ficheros grandes (ver
+            `obtener_metadatos`). Default: False.
+
+    Yields:
+        tuple: (meta, previo) con los metadatos calculados y lo devuelto por `buscar_previo`.
+        Los ficheros que desaparecen o no se pueden leer mientras se procesan se omiten
+        (con un aviso en el log): su borrado lo detecta la siguiente sincronización.
+
+    Ejemplo:
+        for meta, previo in obtener_metadatos_en_paralelo(rutas, workers=8):
+            print(meta["ruta"], meta["hash_md5"])
+    """
+    if workers == "auto":
+        ajuste = _AjusteWorkers(maximo_workers or os.cpu_count() or 1)
+        limite = ajuste.maximo
+    else:
+        ajuste = None
+        limite = max(1, int(workers))
+
+    def tarea(entrada):
+        ruta, stat = entrada if isinstance(entrada, tuple) else (entrada, None)
+        previo = buscar_previo(ruta) if buscar_previo else None
+        try:
+            meta = obtener_metadatos(ruta, previo, stat=stat, algoritmo=algoritmo, usar_mmap=usar_mmap,
+                                     rapido=rapido)
+        except FileNotFoundError:
+            logger.info(f"{ruta} ha desaparecido mientras se procesaba; se omite")
+            return None, previo
+        except OSError as e:
+            logger.warning(f"No puedo leer {ruta}: {e}; se omite")
+            return None, previo
+        return meta, previo
+
+    iterador = iter(rutas)
+    pendientes = set()
+    agotado = False
+    with ThreadPoolExecutor(max_workers=limite) as pool:
+        while True:
+            concurrencia = ajuste.concurrencia if ajuste else limite
+            while not agotado and len(pendientes) < concurrencia:
+                entrada = next(iterador, None)
+                if entrada is None:
+                    agotado = True
+                else:
+                    pendientes.add(pool.submit(tarea, entrada))
+            if not pendientes:
+                break
+
+            terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                meta, previo = futuro.result()
+                if meta is None:
+                    continue
+                if ajuste and not meta["hash_reutilizado"]:
+                    ajuste.registrar(meta["tamano"])
+                yield meta, previo
+
+# Patrones de ficheros temporales habituales (editores, descargas a medias, Office)
+PATRONES_TEMPORALES = ("*.tmp", "*.temp", "*.part", "*.partial", "*.crdownload", "*.swp", "*~", "~$*", ".~lock.*#")
+
+ENLACES = ("archivos", "seguir", "ignorar")
+
+
+class _ReglasEscaneo:
+    """
+    Reglas de `recorrer_directorio` compiladas a partir de su diccionario de opciones.
+
+    Los patrones sin '/' se comparan con el nombre; los que tienen '/', con la ruta
+    relativa a la carpeta base (separada siempre con '/').
+    """
+
+    def __init__(self, opciones=None):
+        opciones = opciones or {}
+        self.incluir = list(opciones.get("incluir") or [])
+        self.excluir = list(opciones.get("excluir") or [])
+        if opciones.get("omitir_temporales", False):
+            self.excluir.extend(PATRONES_TEMPORALES)
+        self.omitir_ocultos = opciones.get("omitir_ocultos", False)
+        self.profundidad_maxima = opciones.get("profundidad_maxima")
+        self.enlaces = opciones.get("enlaces", "archivos")
+        if self.enlaces not in ENLACES:
+            raise ValueError(f"Política de enlaces no soportada: {self.enlaces} (use {', '.join(ENLACES)})")
+
+    @staticmethod
+    def _coincide(patrones, nombre, relativa):
+        return any(fnmatch.fnmatch(relativa if "/" in patron else nombre, patron) for patron in patrones)
+
+    def admite_carpeta(self, nombre, relativa, nivel):
+        if self.profundidad_maxima is not None and nivel > self.profundidad_maxima:
+            return False
+        if self.omitir_ocultos and nombre.startswith("."):
+            return False
+        return not self._coincide(self.excluir, nombre, relativa)
+
+    def admite_fichero(self, nombre, relativa):
+        if self.omitir_ocultos and nombre.startswith("."):
+            return False
+        if self._coincide(self.excluir, nombre, relativa):
+            return False
+        return not self.incluir or self._coincide(self.incluir, nombre, relativa)
+
+
+def recorrer_directorio(base, opciones=None):
+    """
+    Recorre un directorio con `os.scandir` y devuelve sus ficheros de uno en uno.
+
+    Es un generador: no construye ninguna lista con todo el árbol, y las carpetas
+    excluidas se descartan antes de entrar en ellas. Cada fichero se devuelve con su
+    `stat`, que puede pasarse a `obtener_metadatos` para no repetir la llamada.
+
+    Args:
+        base (str): Ruta del directorio a recorrer.
+        opciones (dict, opcional): Reglas del escaneo:
+            - incluir (list[str]): Patrones glob; si se indican, solo se devuelven los
+              ficheros que cumplan alguno. Default: todos.
+            - excluir (list[str]): Patrones glob de ficheros y carpetas a descartar.
+            - profundidad_maxima (int): Niveles de subcarpetas a recorrer (0 = solo los
+              ficheros de `base`). Default: sin límite.
+            - omitir_ocultos (bool): Descartar ficheros y carpetas que empiezan por '.'.
+              Default: False.
+            - omitir_temporales (bool): Descartar ficheros temporales habituales
+              (ver `PATRONES_TEMPORALES`). Default: False.
+            - enlaces (str): "archivos" sigue los enlaces a ficheros pero no entra en
+              enlaces a carpetas (como `os.walk`); "seguir" sigue ambos, evitando ciclos;
+              "ignorar" descarta todos los enlaces simbólicos. Default: "archivos".
+
+        Los patrones sin '/' se comparan con el nombre y los que tienen '/' con la ruta
+        relativa a `base`; por ejemplo `"*.bak"` o `"cache/*"`.
+
+    Yields:
+        tuple: (ruta, stat) con la ruta completa y el `os.stat_result` del fichero.
+
+    Ejemplo:
+        for ruta, stat in recorrer_directorio("/tmp/Images", {"excluir": [".git", "*.tmp"]}):
+            print(ruta, stat.st_size)
+    """
+    reglas = _ReglasEscaneo(opciones)
+    seguir = reglas.enlaces == "seguir"
+    visitadas = set()
+    pila = [(base, "", 0)]
+    while pila:
+        carpeta, relativa, nivel = pila.pop()
+        if seguir:
+            try:
+                identidad = os.stat(carpeta)
+            except OSError as e:
+                logger.warning(f"No puedo acceder a {carpeta}: {e}")
+                continue
+            if (identidad.st_dev, identidad.st_ino) in visitadas:
+                continue
+            visitadas.add((identidad.st_dev, identidad.st_ino))
+        try:
+            iterador = os.scandir(carpeta)
+        except OSError as e:
+            logger.warning(f"No puedo leer la carpeta {carpeta}: {e}")
+            continue
+
+        subcarpetas = []
+        with iterador:
+            for entrada in iterador:
+                nombre = entrada.name
+                ruta_relativa = f"{relativa}/{nombre}" if relativa else nombre
+                try:
+                    if reglas.enlaces == "ignorar" and entrada.is_symlink():
+                        continue
+                    if entrada.is_dir(follow_symlinks=seguir):
+                        if reglas.admite_carpeta(nombre, ruta_relativa, nivel + 1):
+                            subcarpetas.append((entrada.is_symlink(), entrada.path, ruta_relativa, nivel + 1))
+                        continue
+                    if not entrada.is_file() or not reglas.admite_fichero(nombre, ruta_relativa):
+                        continue
+                    stat = entrada.stat()
+                except OSError as e:
+                    logger.warning(f"No puedo acceder a {entrada.path}: {e}")
+                    continue
+                yield entrada.path, stat
+        # Las carpetas reales antes que los enlaces, para que con "seguir" cada
+        # carpeta se recorra por su ruta real cuando sea posible
+        subcarpetas.sort(key=lambda subcarpeta: subcarpeta[0])
+        pila.extend(subcarpeta[1:] for subcarpeta in reversed(subcarpetas))
+
+
+def admite_ruta(ruta, base, opciones=None):
+    """
+    Indica si un fichero pasaría las reglas de `recorrer_directorio(base, opciones)`.
+
+    Sirve para aplicar las mismas reglas a rutas sueltas, por ejemplo a las que notifica
+    el modo vigilancia. No comprueba la política de enlaces.
+
+    Args:
+        ruta (str): Ruta completa del fichero.
+        base (str): Carpeta base del escaneo.
+        opciones (dict, opcional): Las mismas opciones que `recorrer_directorio`.
+
+    Returns:
+        bool: True si la ruta está dentro de `base` y no la descarta ninguna regla.
+    """
+    reglas = _ReglasEscaneo(opciones)
+    relativa = os.path.relpath(ruta, base)
+    if relativa.startswith(os.pardir):
+        return False
+    partes = relativa.split(os.sep)
+    for nivel, nombre in enumerate(partes[:-1], start=1):
+        if not reglas.admite_carpeta(nombre, "/".join(partes[:nivel]), nivel):
+            return False
+    return reglas.admite_fichero(partes[-1], "/".join(partes))
+
+
+def admite_carpeta(ruta, base, opciones=None):
+    """
+    Indica si `recorrer_directorio(base, opciones)` entraría en la carpeta `ruta`.
+
+    Es el equivalente de `admite_ruta` para carpetas: el modo vigilancia lo usa para no
+    vigilar las carpetas que el escaneo descarta.
+
+    Args:
+        ruta (str): Ruta completa de la carpeta.
+        base (str): Carpeta base del escaneo.
+        opciones (dict, opcional): Las mismas opciones que `recorrer_directorio`.
+
+    Returns:
+        bool: True si la carpeta es `base` o está dentro y no la descarta ninguna regla.
+    """
+    reglas = _ReglasEscaneo(opciones)
+    relativa = os.path.relpath(ruta, base)
+    if relativa == os.curdir:
+        return True
+    if relativa.startswith(os.pardir):
+        return False
+    partes = relativa.split(os.sep)
+    return all(reglas.admite_carpeta(nombre, "/".join(partes[:nivel]), nivel)
+               for nivel, nombre in enumerate(partes, start=1))
+
+
+def escanear_directorio(base, opciones=None):
     """
     Escanea recursivamente un directorio y devuelve la lista de archivos encontrados.
 
+    Para árboles grandes es preferible `recorrer_directorio`, que no construye la lista.
+
     Args:
         base (str): Ruta del directorio a escanear.
+        opciones (dict, opcional): Reglas del escaneo (ver `recorrer_directorio`).
 
     Returns:
         list[str]: Lista de rutas completas de los archivos encontrados.
@@ -96,8 +768,4 @@ def escanear_directorio(base):
     Ejemplo:
         archivos = escanear_directorio("/tmp/Images")
     """
-    archivos = []
-    for root, _, files in os.walk(base):
-        for f in files:
-            archivos.append(os.path.join(root, f))
-    return archivos
+    return [ruta for ruta, _ in recorrer_directorio(base, opciones)]
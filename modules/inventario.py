@@ -0,0 +1,509 @@
+"""
+Módulo `inventario`
+--------------------
+
+Proporciona la lectura y escritura del fichero de inventario que el servidor publica
+y el cliente descarga, en varios formatos y con compresión opcional.
+
+Formatos:
+    - json: array de objetos (formato original, compatible con clientes antiguos).
+    - ndjson: una línea de cabecera y después un array JSON por registro.
+    - csv: una fila con los nombres de columna y después una fila por registro.
+    - msgpack: una cabecera y después una lista por registro, en MessagePack.
+
+Compresiones:
+    - ninguna, gzip, zstd.
+
+La cabecera de ndjson y msgpack es un diccionario {"inventario": {...}} con el formato,
+las columnas y la fecha de generación. El lector detecta la compresión por los primeros
+bytes del fichero y el formato por la extensión (o, si no es concluyente, por el contenido).
+
+Funciones principales:
+    - nombre_fichero(fichero, formato, compresion): Ajusta la extensión al formato y compresión.
+    - EscritorInventario(ruta, columnas, formato, compresion, compacto): Escribe registros en streaming.
+    - abrir_inventario(ruta): Gestor de contexto que devuelve (cabecera, registros) en streaming.
+    - leer_inventario(ruta): Lee el inventario completo y devuelve (cabecera, lista de registros).
+    - nombre_version(fichero, tipo, version, formato, compresion): Nombre de una base o delta numerada.
+    - nombre_manifiesto(fichero): Nombre del manifiesto de las exportaciones incrementales.
+    - actualizar_incremental(ruta_manifiesto, descargar, ruta_estado, ruta_local):
+        Aplica en el cliente la base y los deltas publicados que aún no tiene.
+
+Exportaciones incrementales:
+    El servidor publica una base numerada con el inventario completo, deltas numerados con
+    las altas, cambios y bajas (registros con `eliminado` = 1) desde la versión anterior, y
+    un manifiesto JSON que indica la base vigente y los deltas posteriores:
+
+        {"version": 7,
+         "base": {"version": 5, "fichero": "inventario.base.5.json"},
+         "deltas": [{"version": 6, "fichero": "inventario.delta.6.json"},
+                    {"version": 7, "fichero": "inventario.delta.7.json"}]}
+
+Dependencias:
+    - json, csv, gzip, io, os, textwrap, datetime, logging
+    - orjson (opcional): serializador JSON más rápido.
+    - zstandard (opcional): compresión zstd.
+    - msgpack (opcional): formato MessagePack.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import textwrap
+from contextlib import contextmanager
+from datetime import datetime, date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ("json", "ndjson", "csv", "msgpack")
+COMPRESIONES = {"ninguna": "", "gzip": ".gz", "zstd": ".zst"}
+VERSION_FORMATO = 1
+
+# Columnas numéricas que se restauran como enteros al leer formatos sin tipos (csv).
+COLUMNAS_ENTERAS = ("id", "tamano", "dispositivo", "inodo", "mtime_ns", "eliminado")
+
+_MAGIA_GZIP = b"\x1f\x8b"
+_MAGIA_ZSTD = b"\x28\xb5\x2f\xfd"
+
+
+def _convertir(o):
+    """
+    Convierte los tipos que JSON/MessagePack no saben serializar (fechas a ISO 8601, resto a texto).
+    """
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return str(o)
+
+
+def _json_compacto(obj):
+    """
+    Serializa `obj` a JSON compacto en bytes, con orjson si está instalado.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_convertir)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_convertir).encode("utf-8")
+
+
+def _json_cargar(texto):
+    """
+    Deserializa JSON, con orjson si está instalado.
+    """
+    if orjson is not None:
+        return orjson.loads(texto)
+    return json.loads(texto)
+
+
+def _valor_csv(valor):
+    """
+    Convierte un valor para CSV (None a cadena vacía y fechas a ISO 8601).
+    """
+    if valor is None:
+        return ""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _raiz(fichero):
+    """
+    Devuelve `fichero` sin las extensiones de formato y compresión.
+    """
+    base = fichero
+    for sufijo in COMPRESIONES.values():
+        if sufijo and base.lower().endswith(sufijo):
+            base = base[:-len(sufijo)]
+    raiz, extension = os.path.splitext(base)
+    return raiz if extension.lower().lstrip(".") in FORMATOS else base
+
+
+def nombre_fichero(fichero, formato="json", compresion="ninguna"):
+    """
+    Devuelve el nombre del fichero con la extensión que corresponde al formato y la compresión.
+
+    Args:
+        fichero (str): Nombre base configurado (por ejemplo "inventario_imagenes.json").
+        formato (str, opcional): Uno de `FORMATOS`. Default: "json".
+        compresion (str, opcional): Una de las claves de `COMPRESIONES`. Default: "ninguna".
+
+    Returns:
+        str: Nombre con la extensión ajustada.
+
+    Ejemplo:
+        nombre_fichero("inventario.json", "ndjson", "gzip")  # "inventario.ndjson.gz"
+    """
+    return f"{_raiz(fichero)}.{formato}{COMPRESIONES[compresion]}"
+
+
+def _abrir_binario(ruta, modo, compresion):
+    """
+    Abre `ruta` en binario aplicando la compresión indicada.
+    """
+    if compresion == "gzip":
+        return gzip.open(ruta, modo + "b")
+    if compresion == "zstd":
+        if zstandard is None:
+            raise ImportError("La compresión zstd necesita el paquete 'zstandard' (pip install zstandard)")
+        fichero = open(ruta, modo + "b")
+        if modo == "w":
+            return zstandard.ZstdCompressor().stream_writer(fichero, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(fichero, closefd=True)
+    return open(ruta, modo + "b")
+
+
+class EscritorInventario:
+    """
+    Escribe el inventario registro a registro en el formato y compresión indicados.
+
+    La memoria usada no depende del número de registros. Usado como gestor de
+    contexto, cierra correctamente el formato (por ejemplo, el `]` final del JSON).
+
+    Args:
+        ruta (str): Ruta del fichero a escribir.
+        columnas (list[str]): Nombres de las columnas, en el orden de las filas.
+        formato (str, opcional): Uno de `FORMATOS`. Default: "json".
+        compresion (str, opcional): Una de las claves de `COMPRESIONES`. Default: "ninguna".
+        compacto (bool, opcional): Solo para "json": sin sangría, un registro por línea.
+            Default: False.
+        cabecera (dict, opcional): Datos adicionales para la cabecera. Default: None.
+
+    Ejemplo:
+        with EscritorInventario("inventario.ndjson.gz", ["nombre", "hash_md5"], "ndjson", "gzip") as esc:
+            esc.escribir(("a.png", "d41d8cd98f00b204e9800998ecf8427e"))
+    """
+
+    def __init__(self, ruta, columnas, formato="json", compresion="ninguna", compacto=False, cabecera=None):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de inventario desconocido: {formato}")
+        if compresion not in COMPRESIONES:
+            raise ValueError(f"Compresión de inventario desconocida: {compresion}")
+        if formato == "msgpack" and msgpack is None:
+            raise ImportError("El formato msgpack necesita el paquete 'msgpack' (pip install msgpack)")
+        self.columnas = list(columnas)
+        self.formato = formato
+        self.compacto = compacto
+        self.num_registros = 0
+        self.cabecera = {
+            "version_formato": VERSION_FORMATO,
+            "formato": formato,
+            "columnas": self.columnas,
+            "generado": datetime.now().isoformat(timespec="seconds"),
+            **(cabecera or {})
+        }
+        self._fichero = _abrir_binario(ruta, "w", compresion)
+        self._texto = None
+        self._csv = None
+
+        if formato == "json":
+            self._fichero.write(b"[")
+        elif formato == "ndjson":
+            self._fichero.write(_json_compacto({"inventario": self.cabecera}) + b"\n")
+        elif formato == "msgpack":
+            self._fichero.write(msgpack.packb({"inventario": self.cabecera}, default=_convertir))
+        elif formato == "csv":
+            self._texto = io.TextIOWrapper(self._fichero, encoding="utf-8", newline="")
+            self._csv = csv.writer(self._texto)
+            self._csv.writerow(self.columnas)
+
+    def escribir(self, fila):
+        """
+        Escribe un registro.
+
+        Args:
+            fila (tuple | list): Valores en el orden de `columnas`.
+        """
+        if self.formato == "json":
+            registro = dict(zip(self.columnas, fila))
+            if self.compacto:
+                texto = _json_compacto(registro)
+            else:
+                texto = textwrap.indent(
+                    json.dumps(registro, ensure_ascii=False, indent=4, default=_convertir), "    "
+                ).encode("utf-8")
+            self._fichero.write((b"," if self.num_registros else b"") + b"\n" + texto)
+        elif self.formato == "ndjson":
+            self._fichero.write(_json_compacto(list(fila)) + b"\n")
+        elif self.formato == "msgpack":
+            self._fichero.write(msgpack.packb(list(fila), default=_convertir))
+        elif self.formato == "csv":
+            self._csv.writerow([_valor_csv(v) for v in fila])
+        self.num_registros += 1
+
+    def cerrar(self):
+        """
+        Termina el formato y cierra el fichero.
+        """
+        if self.formato == "json":
+            self._fichero.write(b"\n]" if self.num_registros else b"]")
+        if self._texto is not None:
+            self._texto.close()
+        else:
+            self._fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+        return False
+
+
+def _detectar_compresion(ruta):
+    """
+    Detecta la compresión de un fichero por sus primeros bytes.
+    """
+    with open(ruta, "rb") as f:
+        magia = f.read(4)
+    if magia.startswith(_MAGIA_GZIP):
+        return "gzip"
+    if magia.startswith(_MAGIA_ZSTD):
+        return "zstd"
+    return "ninguna"
+
+
+def _detectar_formato(ruta, primer_byte):
+    """
+    Detecta el formato por la extensión del fichero o, si no es concluyente, por su primer byte.
+    """
+    nombre = ruta.lower()
+    for sufijo in COMPRESIONES.values():
+        if sufijo and nombre.endswith(sufijo):
+            nombre = nombre[:-len(sufijo)]
+    extension = os.path.splitext(nombre)[1].lstrip(".")
+    if extension in FORMATOS:
+        return extension
+    if primer_byte == b"[":
+        return "json"
+    if primer_byte == b"{":
+        return "ndjson"
+    if primer_byte and (0x80 <= primer_byte[0] <= 0x8f or primer_byte[0] in (0xde, 0xdf)):
+        return "msgpack"
+    return "csv"
+
+
+def _registros_csv(texto):
+    """
+    Lee un inventario CSV: la primera fila son las columnas y las numéricas se convierten a int.
+    """
+    lector = csv.reader(texto)
+    columnas = next(lector, [])
+    cabecera = {"formato": "csv", "columnas": columnas}
+
+    def registros():
+        for fila in lector:
+            registro = dict(zip(columnas, fila))
+            for columna in COLUMNAS_ENTERAS:
+                if columna in registro:
+                    registro[columna] = int(registro[columna]) if registro[columna] != "" else None
+            yield registro
+
+    return cabecera, registros()
+
+
+@contextmanager
+def abrir_inventario(ruta):
+    """
+    Abre un fichero de inventario detectando formato y compresión, y lo lee en streaming.
+
+    Args:
+        ruta (str): Ruta local del fichero de inventario.
+
+    Yields:
+        tuple: (cabecera, registros) donde `cabecera` es un diccionario con al menos
+        "formato" y `registros` es un iterador de diccionarios columna → valor.
+
+    Ejemplo:
+        with abrir_inventario("inventario.ndjson.gz") as (cabecera, registros):
+            for registro in registros:
+                print(registro["ruta"])
+    """
+    fichero = _abrir_binario(ruta, "r", _detectar_compresion(ruta))
+    try:
+        lector = io.BufferedReader(fichero) if not isinstance(fichero, io.BufferedReader) else fichero
+        formato = _detectar_formato(ruta, lector.peek(1)[:1])
+
+        if formato == "json":
+            datos = _json_cargar(lector.read())
+            yield {"formato": "json"}, iter(datos)
+
+        elif formato == "ndjson":
+            texto = io.TextIOWrapper(lector, encoding="utf-8")
+            cabecera = _json_cargar(texto.readline())["inventario"]
+            columnas = cabecera["columnas"]
+            yield cabecera, (dict(zip(columnas, _json_cargar(linea))) for linea in texto if linea.strip())
+
+        elif formato == "msgpack":
+            if msgpack is None:
+                raise ImportError("El formato msgpack necesita el paquete 'msgpack' (pip install msgpack)")
+            desempaquetador = msgpack.Unpacker(lector, raw=False)
+            cabecera = next(desempaquetador)["inventario"]
+            columnas = cabecera["columnas"]
+            yield cabecera, (dict(zip(columnas, fila)) for fila in desempaquetador)
+
+        else:
+            texto = io.TextIOWrapper(lector, encoding="utf-8", newline="")
+            yield _registros_csv(texto)
+    finally:
+        fichero.close()
+
+
+def leer_inventario(ruta):
+    """
+    Lee un fichero de inventario completo detectando formato y compresión.
+
+    Args:
+        ruta (str): Ruta local del fichero de inventario.
+
+    Returns:
+        tuple: (cabecera, registros) con la cabecera (dict) y la lista de registros (list[dict]).
+
+    Ejemplo:
+        cabecera, registros = leer_inventario("inventario_imagenes.json")
+    """
+    with abrir_inventario(ruta) as (cabecera, registros):
+        return cabecera, list(registros)
+
+
+def nombre_version(fichero, tipo, version, formato="json", compresion="ninguna"):
+    """
+    Devuelve el nombre de una base o un delta numerado de las exportaciones incrementales.
+
+    Args:
+        fichero (str): Nombre base configurado (por ejemplo "inventario_imagenes.json").
+        tipo (str): "base" o "delta".
+        version (int): Número de versión.
+        formato (str, opcional): Uno de `FORMATOS`. Default: "json".
+        compresion (str, opcional): Una de las claves de `COMPRESIONES`. Default: "ninguna".
+
+    Returns:
+        str: Nombre del fichero.
+
+    Ejemplo:
+        nombre_version("inventario.json", "delta", 7, "ndjson", "gzip")  # "inventario.delta.7.ndjson.gz"
+    """
+    return f"{_raiz(fichero)}.{tipo}.{version}.{formato}{COMPRESIONES[compresion]}"
+
+
+def nombre_manifiesto(fichero):
+    """
+    Devuelve el nombre del manifiesto de las exportaciones incrementales.
+
+    Ejemplo:
+        nombre_manifiesto("inventario.json")  # "inventario.manifiesto.json"
+    """
+    return f"{_raiz(fichero)}.manifiesto.json"
+
+
+def _guardar_json_atomico(ruta, datos):
+    """
+    Escribe `datos` como JSON en un fichero temporal y lo renombra sobre `ruta`.
+    """
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=4)
+    os.replace(temporal, ruta)
+
+
+def _aplicar_fichero(indice, ruta):
+    """
+    Aplica una base o un delta sobre `indice` (ruta → registro).
+
+    Los registros con `eliminado` a 1 son bajas; el resto son altas o cambios.
+    """
+    altas = bajas = 0
+    with abrir_inventario(ruta) as (_, registros):
+        for registro in registros:
+            eliminado = registro.pop("eliminado", None)
+            if eliminado in (1, True, "1"):
+                indice.pop(registro["ruta"], None)
+                bajas += 1
+            else:
+                indice[registro["ruta"]] = registro
+                altas += 1
+    return altas, bajas
+
+
+def actualizar_incremental(ruta_manifiesto, descargar, ruta_estado="estado_inventario.json",
+                           ruta_local="inventario_local.json"):
+    """
+    Pone al día la copia local del inventario a partir del manifiesto publicado.
+
+    Si la copia local es anterior a la base vigente (o posterior a la última versión,
+    porque el servidor se ha reiniciado), descarga la base y todos sus deltas. En otro
+    caso descarga solo los deltas con versión mayor que la aplicada. Los ficheros
+    descargados se borran una vez aplicados. La copia local y la versión aplicada se
+    guardan de forma atómica al terminar.
+
+    Args:
+        ruta_manifiesto (str): Ruta local del manifiesto ya descargado.
+        descargar (callable): Función `nombre_fichero -> (bool, ruta_local)` que descarga
+            un fichero publicado (por ejemplo, envolviendo `ssh.DescargarArchivoSFTP`).
+        ruta_estado (str, opcional): Fichero JSON con la versión aplicada.
+            Default: "estado_inventario.json".
+        ruta_local (str, opcional): Copia local materializada del inventario.
+            Default: "inventario_local.json".
+
+    Returns:
+        tuple: (version, registros) con la versión aplicada y la lista de registros (list[dict]).
+
+    Raises:
+        RuntimeError: Si no se puede descargar alguno de los ficheros necesarios.
+
+    Ejemplo:
+        version, registros = actualizar_incremental("inventario.manifiesto.json", descargar)
+    """
+    with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    estado = {"version": 0}
+    if os.path.isfile(ruta_estado) and os.path.isfile(ruta_local):
+        with open(ruta_estado, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+
+    version_local = estado["version"]
+    base = manifiesto["base"]
+    if version_local < base["version"] or version_local > manifiesto["version"]:
+        indice = {}
+        pendientes = [base] + manifiesto["deltas"]
+        logger.info(f"Inventario local en versión {version_local}: se descarga la base {base['version']}")
+    else:
+        _, registros = leer_inventario(ruta_local)
+        indice = {registro["ruta"]: registro for registro in registros}
+        pendientes = [d for d in manifiesto["deltas"] if d["version"] > version_local]
+
+    for entrada in pendientes:
+        ok, fichero = descargar(entrada["fichero"])
+        if not ok:
+            raise RuntimeError(f"No se pudo descargar {entrada['fichero']}")
+        altas, bajas = _aplicar_fichero(indice, fichero)
+        os.remove(fichero)
+        logger.info(f"Aplicada versión {entrada['version']} ({entrada['fichero']}): "
+                    f"{altas} altas/cambios, {bajas} bajas")
+
+    if pendientes or version_local != manifiesto["version"]:
+        columnas = sorted({columna for registro in indice.values() for columna in registro})
+        temporal = ruta_local + ".tmp"
+        with EscritorInventario(temporal, columnas, compacto=True) as escritor:
+            for registro in indice.values():
+                escritor.escribir(tuple(registro.get(c) for c in columnas))
+        os.replace(temporal, ruta_local)
+        _guardar_json_atomico(ruta_estado, {"version": manifiesto["version"]})
+    else:
+        logger.info(f"Inventario local ya en la versión {version_local}")
+
+    return manifiesto["version"], list(indice.values())
@@ -0,0 +1,202 @@
+"""
+Módulo `metricas`
+-----------------
+
+Métricas de la ejecución (duración de cada fase, ficheros escaneados, bytes leídos
+para calcular hashes, filas escritas, tamaño del inventario, subidas por destino...)
+para poder vigilar y alertar sobre las ejecuciones programadas.
+
+Las métricas se acumulan en memoria durante la ejecución y `escribir_textfile` las
+vuelca en el formato de texto de Prometheus, para el "textfile collector" de
+node_exporter. El fichero se escribe primero en uno temporal de la misma carpeta y se
+renombra, de modo que node_exporter nunca lee un fichero a medias.
+
+Funciones principales:
+    - sumar(nombre, valor=1, **etiquetas): Suma `valor` a una métrica.
+    - fijar(nombre, valor, **etiquetas): Fija el valor de una métrica.
+    - valor(nombre, **etiquetas): Devuelve el valor actual de una métrica.
+    - total(nombre): Suma de una métrica con todas sus etiquetas.
+    - fase(nombre): Gestor de contexto que mide la duración de una fase y si terminó bien.
+    - escribir_textfile(ruta, prefijo="inventario"): Escribe las métricas en `ruta`.
+    - reiniciar(): Borra las métricas acumuladas.
+
+Ejemplo:
+    with metricas.fase("sincronizacion"):
+        sync.sincronizar(directorio, tabla, opciones_sync)
+    metricas.escribir_textfile("/var/lib/node_exporter/textfile_collector/inventario.prom")
+
+Notas:
+    - Todas las métricas se publican como `gauge`: cada fichero describe la última
+      ejecución (o, en el modo vigilancia, lo acumulado desde que arrancó el proceso).
+    - Los nombres se publican con el prefijo indicado en `escribir_textfile`
+      (`inventario_fase_duracion_segundos{fase="sincronizacion"} 12.5`).
+
+Dependencias:
+    - os, tempfile, threading, time, contextlib
+"""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Texto de ayuda (# HELP) de las métricas conocidas; el resto se publica sin descripción
+DESCRIPCIONES = {
+    "fase_duracion_segundos": "Duración de cada fase en segundos",
+    "fase_exito": "1 si la fase terminó sin errores, 0 si falló",
+    "ficheros_escaneados": "Ficheros recorridos en el directorio",
+    "ficheros_hasheados": "Ficheros leídos para calcular su hash o su huella rápida",
+    "bytes_hasheados": "Bytes leídos para calcular hashes y huellas rápidas",
+    "hash_cache": "Ficheros cuyo hash se reutilizó (acierto) o se calculó (fallo)",
+    "filas_bd": "Filas insertadas, actualizadas o eliminadas en la tabla",
+    "exportacion_registros": "Registros del último fichero de inventario exportado",
+    "exportacion_bytes": "Tamaño en bytes del último fichero de inventario exportado",
+    "subida_ficheros": "Ficheros subidos, omitidos por ser idénticos o fallidos por destino",
+    "subida_bytes": "Bytes subidos por destino",
+    "subida_segundos": "Segundos dedicados a subir ficheros por destino",
+    "subida_bytes_por_segundo": "Velocidad media de subida por destino",
+    "inventario_registros": "Registros del inventario recibido del servidor",
+    "diferencias": "Ficheros de cada categoría en la comparación con el inventario",
+    "informe_enviado": "1 si el informe de diferencias se envió por ese canal, 0 si falló",
+    "ejecucion_exito": "1 si la ejecución terminó sin errores, 0 si falló",
+    "ultima_ejecucion_timestamp_segundos": "Fecha (epoch) en que se escribieron estas métricas",
+}
+
+_valores = {}
+_lock = threading.Lock()
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def sumar(nombre, valor=1, **etiquetas):
+    """
+    Suma `valor` a la métrica `nombre` con las etiquetas dadas (empieza en 0).
+
+    Es seguro llamarla desde varios hilos (p. ej. los que calculan hashes).
+
+    Ejemplo:
+        sumar("filas_bd", 25, operacion="insertadas")
+    """
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _valores[clave] = _valores.get(clave, 0) + valor
+
+
+def fijar(nombre, valor, **etiquetas):
+    """
+    Fija el valor de la métrica `nombre` con las etiquetas dadas.
+
+    Ejemplo:
+        fijar("exportacion_bytes", os.path.getsize("inventario.json"))
+    """
+    with _lock:
+        _valores[_clave(nombre, etiquetas)] = valor
+
+
+def valor(nombre, **etiquetas):
+    """
+    Devuelve el valor actual de la métrica `nombre` con las etiquetas dadas, o 0.
+    """
+    with _lock:
+        return _valores.get(_clave(nombre, etiquetas), 0)
+
+
+def total(nombre):
+    """
+    Devuelve la suma de la métrica `nombre` con todas sus etiquetas, o 0.
+
+    Ejemplo:
+        total("bytes_hasheados")  # de todos los algoritmos
+    """
+    with _lock:
+        return sum(v for (n, _), v in _valores.items() if n == nombre)
+
+
+def reiniciar():
+    """
+    Borra todas las métricas acumuladas.
+    """
+    with _lock:
+        _valores.clear()
+
+
+@contextmanager
+def fase(nombre):
+    """
+    Gestor de contexto que mide una fase de la ejecución.
+
+    Al salir fija `fase_duracion_segundos{fase=nombre}` y `fase_exito{fase=nombre}`
+    (0 si el bloque lanzó una excepción, que se propaga igualmente).
+
+    Ejemplo:
+        with fase("exportacion"):
+            export.exportar_tabla_a_json(tabla, fichero)
+    """
+    inicio = time.monotonic()
+    exito = 0
+    try:
+        yield
+        exito = 1
+    finally:
+        fijar("fase_duracion_segundos", round(time.monotonic() - inicio, 3), fase=nombre)
+        fijar("fase_exito", exito, fase=nombre)
+
+
+def _escapar(texto):
+    return str(texto).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear(prefijo):
+    """
+    Devuelve las métricas acumuladas en el formato de texto de Prometheus.
+    """
+    with _lock:
+        valores = dict(_valores)
+    valores[("ultima_ejecucion_timestamp_segundos", ())] = round(time.time(), 3)
+
+    lineas = []
+    nombre_anterior = None
+    for (nombre, etiquetas), numero in sorted(valores.items()):
+        metrica = f"{prefijo}_{nombre}"
+        if nombre != nombre_anterior:
+            if nombre in DESCRIPCIONES:
+                lineas.append(f"# HELP {metrica} {DESCRIPCIONES[nombre]}")
+            lineas.append(f"# TYPE {metrica} gauge")
+            nombre_anterior = nombre
+        if etiquetas:
+            metrica += "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas) + "}"
+        lineas.append(f"{metrica} {float(numero)!r}")
+    return "\n".join(lineas) + "\n"
+
+
+def escribir_textfile(ruta, prefijo="inventario"):
+    """
+    Escribe las métricas acumuladas en `ruta` en formato de texto de Prometheus.
+
+    La escritura es atómica: se escribe un temporal en la misma carpeta (que
+    node_exporter ignora porque no termina en `.prom`) y se renombra sobre `ruta`.
+
+    Args:
+        ruta (str): Fichero de destino, normalmente en la carpeta del textfile collector
+            de node_exporter y con extensión `.prom`.
+        prefijo (str, opcional): Prefijo de los nombres de métrica. Default: "inventario".
+
+    Ejemplo:
+        escribir_textfile("/var/lib/node_exporter/textfile_collector/inventario.prom")
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio, prefix=".metricas_",
+                                     suffix=".tmp", delete=False) as tmp:
+        tmp.write(_formatear(prefijo))
+    try:
+        # NamedTemporaryFile crea el fichero con permisos 0600; node_exporter suele
+        # ejecutarse con otro usuario
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, ruta)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
@@ -0,0 +1,182 @@
+"""
+Módulo `progreso`
+-----------------
+
+Informes periódicos del avance de las operaciones largas (la sincronización de un
+árbol grande puede durar horas): ficheros procesados sobre el total, MB/s leídos para
+calcular hashes, filas por segundo escritas en la base de datos y tiempo estimado
+hasta terminar.
+
+Cada informe se escribe en el log y, opcionalmente, en un fichero de estado JSON que
+puede leer una comprobación de monitorización. El fichero se escribe en un temporal y
+se renombra, así que nunca se lee a medias.
+
+Clases principales:
+    - Progreso(descripcion, total=None, intervalo=30, ruta_estado=None): Acumula el
+      avance con `avanzar` y emite un informe cada `intervalo` segundos.
+
+Ejemplo:
+    progreso = Progreso("sincronización", total=len(rutas), ruta_estado="estado_sincronizacion.json")
+    for ruta in rutas:
+        ...
+        progreso.avanzar(filas=1)
+    progreso.terminar()
+
+Dependencias:
+    - metricas: de donde se toman los bytes leídos para calcular hashes.
+    - json, os, time, datetime, logging
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+
+def _duracion(segundos):
+    """
+    Formatea una duración como "1h 05m", "12m 30s" o "45s".
+    """
+    segundos = int(segundos)
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}h {minutos:02d}m"
+    if minutos:
+        return f"{minutos}m {segundos:02d}s"
+    return f"{segundos}s"
+
+
+class Progreso:
+    """
+    Seguimiento del avance de una operación larga con informes periódicos.
+
+    Las velocidades de cada informe son las de los últimos `intervalo` segundos (MB/s
+    de hash según `metricas.total("bytes_hasheados")` y filas/s según `avanzar`), y la
+    estimación del tiempo restante usa la velocidad media en ficheros desde el inicio.
+
+    Args:
+        descripcion (str): Nombre de la operación en el log ("sincronización").
+        total (int, opcional): Número de ficheros previsto. Puede ser una estimación
+            (ver `fijar_total`). Default: None (sin porcentaje ni tiempo restante).
+        intervalo (float, opcional): Segundos entre informes. Default: 30.
+        ruta_estado (str, opcional): Fichero JSON donde escribir cada informe.
+            Default: None (solo log).
+
+    Ejemplo:
+        progreso = Progreso("sincronización", total=120000, intervalo=60)
+        progreso.avanzar()
+    """
+
+    def __init__(self, descripcion, total=None, intervalo=30, ruta_estado=None):
+        self.descripcion = descripcion
+        self.total = total
+        self.total_exacto = False
+        self.intervalo = intervalo
+        self.ruta_estado = ruta_estado
+        self.ficheros = 0
+        self.filas = 0
+        self.inicio = time.monotonic()
+        self.fecha_inicio = datetime.now().replace(microsecond=0)
+        self._bytes_inicio = metricas.total("bytes_hasheados")
+        self._ultimo = (self.inicio, self._bytes_inicio, 0)
+        self._siguiente = self.inicio + intervalo
+
+    def fijar_total(self, total, exacto=True):
+        """
+        Cambia el total previsto, por ejemplo cuando termina el recorrido del directorio
+        y se conoce el número real de ficheros.
+        """
+        self.total = total
+        self.total_exacto = exacto
+
+    def avanzar(self, ficheros=1, filas=0):
+        """
+        Suma ficheros procesados y filas escritas y, si ha pasado el intervalo, emite un informe.
+        """
+        self.ficheros += ficheros
+        self.filas += filas
+        if time.monotonic() >= self._siguiente:
+            self.informar()
+
+    def estado(self, desde_inicio=False):
+        """
+        Devuelve el avance actual y las velocidades desde el informe anterior (o, con
+        `desde_inicio`, las medias desde el principio).
+
+        Returns:
+            dict: descripcion, estado ("en_curso" o "terminado"), inicio, actualizado,
+            ficheros, total, total_exacto, porcentaje, mb_s_hash, filas_s_bd,
+            segundos y eta_segundos (None si no hay total o todavía no hay avance).
+        """
+        ahora = time.monotonic()
+        bytes_hash = metricas.total("bytes_hasheados")
+        momento, bytes_anteriores, filas_anteriores = (
+            (self.inicio, self._bytes_inicio, 0) if desde_inicio else self._ultimo)
+        tramo = max(ahora - momento, 1e-6)
+        transcurrido = ahora - self.inicio
+
+        total = self.total
+        if total is not None:
+            # Con una estimación, el total no puede ser menor que lo ya procesado
+            total = max(total, self.ficheros)
+        eta = None
+        if total and self.ficheros:
+            eta = round((total - self.ficheros) * transcurrido / self.ficheros)
+
+        return {
+            "descripcion": self.descripcion,
+            "estado": "en_curso",
+            "inicio": self.fecha_inicio.isoformat(),
+            "actualizado": datetime.now().replace(microsecond=0).isoformat(),
+            "ficheros": self.ficheros,
+            "total": total,
+            "total_exacto": self.total_exacto,
+            "porcentaje": round(100 * self.ficheros / total, 1) if total else None,
+            "mb_s_hash": round((bytes_hash - bytes_anteriores) / tramo / (1024 * 1024), 1),
+            "filas_s_bd": round((self.filas - filas_anteriores) / tramo, 1),
+            "segundos": round(transcurrido),
+            "eta_segundos": eta,
+        }
+
+    def informar(self, terminado=False):
+        """
+        Escribe un informe en el log y en `ruta_estado` y reinicia la ventana de velocidades.
+        """
+        estado = self.estado(desde_inicio=terminado)
+        if terminado:
+            estado.update(estado="terminado", eta_segundos=0)
+        self._ultimo = (time.monotonic(), metricas.total("bytes_hasheados"), self.filas)
+        self._siguiente = self._ultimo[0] + self.intervalo
+
+        if estado["total"]:
+            avance = (f"{estado['ficheros']} de {'' if estado['total_exacto'] else '~'}{estado['total']} "
+                      f"ficheros ({estado['porcentaje']} %)")
+        else:
+            avance = f"{estado['ficheros']} ficheros"
+        restante = f", quedan {_duracion(estado['eta_segundos'])}" if estado["eta_segundos"] else ""
+        titulo = f"Fin de la {self.descripcion} (medias)" if terminado else f"Progreso de la {self.descripcion}"
+        logger.info(f"{titulo}: {avance}, {estado['mb_s_hash']} MB/s de hash, "
+                    f"{estado['filas_s_bd']} filas/s en BD, {_duracion(estado['segundos'])} transcurridos{restante}")
+
+        if self.ruta_estado:
+            try:
+                temporal = self.ruta_estado + ".tmp"
+                with open(temporal, "w", encoding="utf-8") as f:
+                    json.dump(estado, f, ensure_ascii=False, indent=4)
+                os.replace(temporal, self.ruta_estado)
+            except OSError as e:
+                logger.warning(f"No se pudo escribir el estado de la {self.descripcion} en {self.ruta_estado}: {e}")
+        return estado
+
+    def terminar(self):
+        """
+        Emite el informe final con el estado "terminado" y las velocidades medias.
+        """
+        self.fijar_total(self.ficheros)
+        return self.informar(terminado=True)
@@ -6,94 +6,456 @@ Proporciona funciones para sincronizar los metadatos de archivos de un directori
 local con una tabla de base de datos MariaDB.
 
 Funciones principales:
-    - sincronizar(directorio, tabla):
+    - sincronizar(directorio, tabla, opciones=None):
         Escanea un directorio local, compara los archivos con los registros de la tabla
-        y realiza inserciones, actualizaciones o eliminaciones según corresponda.
+        y realiza inserciones, actualizaciones o eliminaciones según corresponda,
+        fila a fila o por conjuntos (tabla de staging + LOAD DATA).
+    - sincronizar_rutas(tabla, rutas, carpetas_eliminadas=(), opciones=None):
+        Aplica solo los cambios de las rutas indicadas (usado por el modo vigilancia).
 
 Dependencias:
     - modules.db: para ejecutar consultas en la base de datos.
     - modules.files: para escanear directorios y obtener metadatos de archivos.
+    - modules.metricas: para las métricas de ficheros escaneados y filas escritas.
+    - modules.progreso: para los informes periódicos de avance.
     - logging: para registrar el progreso de la sincronización.
+    - tempfile: para el fichero TSV del modo de sincronización por conjuntos.
 """
 
-from modules import db, files
+from modules import db, files, metricas
+from modules.progreso import Progreso
+import datetime
 import logging
+import os
+import tempfile
 logger = logging.getLogger(__name__)
 
+# Columnas que la sincronización escribe en la tabla, en el orden de las consultas.
+COLUMNAS = ("nombre", "ruta", "hash_md5", "tamano", "fecha_creacion", "extension", "mime_type",
+            "dispositivo", "inodo", "mtime_ns", "algoritmo_hash", "nivel_huella")
 
-def sincronizar(directorio, tabla):
+# Columnas del estado de la tabla que se cargan para decidir qué cambia y reutilizar hashes.
+_COLUMNAS_ESTADO = ("id", "hash_md5", "tamano", "dispositivo", "inodo", "mtime_ns", "algoritmo_hash",
+                    "nivel_huella")
+
+
+def sincronizar(directorio, tabla, opciones=None):
     """
     Sincroniza los metadatos de los archivos de un directorio con una tabla de base de datos.
 
     Args:
         directorio (str): Ruta del directorio local a escanear.
         tabla (str): Nombre de la tabla en la base de datos donde se almacenan los metadatos.
+        opciones (dict, opcional): Sección "sincronizacion" de `config/config.json`:
+            - hash_workers (int | str): Hilos que calculan hashes a la vez, o "auto" para
+              ajustarlos según los MB/s medidos. Default: 1.
+            - hash_workers_max (int): Límite de hilos en modo "auto". Default: número de CPUs.
+            - lote_bd (int): Filas que se escriben en cada lote (`executemany` + commit).
+              Default: 1000.
+            - modo (str): "filas" aplica los cambios desde Python; "conjuntos" carga el
+              escaneo en una tabla de staging y reconcilia con sentencias de conjunto
+              (ver `_aplicar_por_conjuntos`; solo con MariaDB). Default: "filas".
+            - algoritmo_hash (str): Algoritmo de hash: "md5", "sha256", "blake2b", "blake3",
+              "xxh3_64", "xxh3_128" o "xxh64" (ver `files.ALGORITMOS_HASH`). Se guarda en
+              cada fila; al cambiarlo, los hashes se recalculan en la siguiente ejecución.
+              Default: "md5".
+            - hash_mmap (bool): Lee con `mmap` los ficheros grandes de discos locales al
+              calcular el hash (ver `files.hash_fichero`). Default: True.
+            - huella_rapida (bool): Identifica los ficheros grandes por su tamaño y tres
+              muestras en lugar del hash completo (ver `files.obtener_metadatos`); los que
+              coinciden con otro pasan al hash completo. Default: False.
+            - escaneo (dict): Reglas del recorrido del directorio (incluir, excluir,
+              profundidad_maxima, omitir_ocultos, omitir_temporales, enlaces); ver
+              `files.recorrer_directorio`. Default: todos los ficheros.
+            - progreso (dict): Informes periódicos de avance (ver `progreso.Progreso`):
+                - intervalo (float): Segundos entre informes. Default: 30.
+                - ruta_estado (str): Fichero JSON donde escribir cada informe. Default: None.
+                - contar_antes (bool): Recorre el directorio una vez antes de empezar para
+                  conocer el total exacto de ficheros. Sin ello, el total se estima con
+                  las filas de la tabla hasta que termina el recorrido. Default: False.
 
     Comportamiento:
-        1. Escanea el directorio y obtiene la lista de archivos.
-        2. Obtiene las rutas de los registros existentes en la tabla.
-        3. Inserta nuevos archivos que no existan en la base de datos.
-        4. Actualiza los registros cuyo hash MD5 o tamaño haya cambiado.
-        5. Elimina registros de la base de datos si ya no existen localmente.
-        6. Registra el número total de archivos sincronizados al finalizar.
+        1. Carga con una única consulta en streaming el estado de la tabla
+           (ruta → id, hash, tamaño y huella) en un índice en memoria.
+        2. Recorre el directorio con `files.recorrer_directorio`, de forma perezosa:
+           no se construye la lista de ficheros y se reutiliza el `stat` del recorrido.
+        3. Inserta nuevos archivos que no existan en el índice.
+           Si la huella (dispositivo, inodo, tamaño, mtime_ns) guardada coincide con
+           la actual, reutiliza el hash MD5 almacenado sin volver a leer el fichero.
+           Los hashes se calculan en paralelo y se procesan según van terminando.
+           Las escrituras se agrupan en lotes sobre una única conexión.
+        4. Actualiza los registros cuyo hash MD5, tamaño o huella haya cambiado.
+        5. Elimina registros de la base de datos si ya no existen localmente,
+           por bloques de `lote_bd` rutas.
+        6. Con `huella_rapida`, calcula el hash completo de los ficheros cuya huella
+           rápida coincide con la de otro (ver `_escalar_colisiones`).
+        7. Registra el número total de archivos sincronizados al finalizar.
 
     Logging:
+        - INFO periódico con el avance: ficheros, MB/s de hash, filas/s y tiempo restante.
         - INFO para cada inserción, actualización y eliminación.
+        - INFO con los aciertos y fallos de la caché de hashes.
         - INFO con el número total de archivos al final.
     
     Ejemplo:
         sincronizar("/tmp/Images", "archivos")
     """
-    # 1. Escanear ficheros reales
-    ficheros = files.escanear_directorio(directorio)
-    rutas_reales = set(ficheros)
-    logger.info(f"Escaneados {len(ficheros)} ficheros en el directorio {directorio}")
-    
-    # 2. Obtener rutas de BD
-    query_rutas = f"SELECT ruta FROM {tabla}"
-    rutas_db = {r[0] for r in db.ejecutar_select(query_rutas)}
-
-    # 3. Insertar o actualizar
-    for fichero in ficheros:
-        meta = files.obtener_metadatos(fichero)
-
-        query_buscar = f"SELECT id, hash_md5, tamano FROM {tabla} WHERE ruta = ?"
-        row = db.ejecutar_select(query_buscar, (meta["ruta"],))
-
-        if not row:
-            # INSERT
-            query_insert = f"""
-                INSERT INTO {tabla} (nombre, ruta, hash_md5, tamano, fecha_creacion, extension, mime_type)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            db.ejecutar_modificacion(query_insert, (
-                meta["nombre"], meta["ruta"], meta["hash_md5"], meta["tamano"],
-                meta["fecha_creacion"], meta["extension"], meta["mime_type"]
-            ))
-            logger.info(f"Insertado: {meta['ruta']}")
-
-        else:
-            # UPDATE si ha cambiado
-            id_, hash_db, tamano_db = row[0]
-            if hash_db != meta["hash_md5"] or tamano_db != meta["tamano"]:
-                query_update = f"""
-                    UPDATE {tabla}
-                    SET nombre=?, hash_md5=?, tamano=?, fecha_creacion=?, extension=?, mime_type=?
-                    WHERE id=?
-                """
-                db.ejecutar_modificacion(query_update, (
-                    meta["nombre"], meta["hash_md5"], meta["tamano"], meta["fecha_creacion"],
-                    meta["extension"], meta["mime_type"], id_
-                ))
-                logger.info(f"Actualizado: {meta['ruta']}")
-
-    # 4. Eliminar registros que ya no existen
-    faltan = rutas_db - rutas_reales
-    for ruta in faltan:
-        query_delete = f"DELETE FROM {tabla} WHERE ruta = ?"
-        db.ejecutar_modificacion(query_delete, (ruta,))
-        logger.info(f"Eliminado: {ruta}")
+    opciones = opciones or {}
+
+    # 1. Cargar el estado de la BD en memoria con una única consulta
+    #    ruta -> (id, hash_md5, tamano, dispositivo, inodo, mtime_ns, algoritmo_hash, nivel_huella)
+    query_estado = f"SELECT ruta, {', '.join(_COLUMNAS_ESTADO)} FROM {tabla}"
+    indice_db = {fila[0]: fila[1:] for fila in db.iterar_select(query_estado)}
+    logger.info(f"Cargados {len(indice_db)} registros de la tabla {tabla}")
+
+    opciones_progreso = opciones.get("progreso", {})
+    progreso = Progreso("sincronización", len(indice_db) or None,
+                        opciones_progreso.get("intervalo", 30), opciones_progreso.get("ruta_estado"))
+    if opciones_progreso.get("contar_antes", False):
+        progreso.fijar_total(sum(1 for _ in files.recorrer_directorio(directorio, opciones.get("escaneo"))))
+        logger.info(f"Ficheros a sincronizar: {progreso.total}")
+
+    # 2. Recorrer el directorio de forma perezosa: cada fichero visto se retira del
+    #    índice, así que al terminar solo quedan las rutas que ya no existen
+    escaneados = 0
+
+    def entradas():
+        nonlocal escaneados
+        for entrada in files.recorrer_directorio(directorio, opciones.get("escaneo")):
+            escaneados += 1
+            yield entrada
+        # Recorrido terminado: a partir de aquí el total es exacto
+        progreso.fijar_total(escaneados)
+
+    # 3. Insertar o actualizar (los hashes se calculan en paralelo)
+    workers = opciones.get("hash_workers", 1)
+    maximo_workers = opciones.get("hash_workers_max")
+
+    def buscar_previo(ruta):
+        fila = indice_db.pop(ruta, None)
+        return dict(zip(_COLUMNAS_ESTADO, fila)) if fila is not None else None
+
+    resultados = files.obtener_metadatos_en_paralelo(
+        entradas(), workers=workers, buscar_previo=buscar_previo, maximo_workers=maximo_workers,
+        algoritmo=opciones.get("algoritmo_hash", "md5"), usar_mmap=opciones.get("hash_mmap", True),
+        rapido=opciones.get("huella_rapida", False))
+    modo = opciones.get("modo", "filas")
+    if modo == "conjuntos" and db.motor() == "sqlite":
+        logger.warning("El modo 'conjuntos' usa LOAD DATA y solo está disponible con MariaDB; se usa 'filas'")
+        modo = "filas"
+    if modo == "conjuntos":
+        aciertos_cache = _aplicar_por_conjuntos(tabla, resultados, progreso)
+    else:
+        # `indice_db.keys()` es una vista: cuando se aplican los borrados, al final,
+        # contiene exactamente las rutas de la tabla que no se han visto en disco
+        aciertos_cache = _aplicar_por_filas(tabla, resultados, indice_db.keys(), opciones.get("lote_bd", 1000),
+                                            progreso)
+    progreso.terminar()
+    logger.info(f"Escaneados {escaneados} ficheros en el directorio {directorio}")
+
+    fallos_cache = escaneados - aciertos_cache
+    logger.info(f"Caché de hashes: {aciertos_cache} aciertos, {fallos_cache} fallos")
+    metricas.sumar("ficheros_escaneados", escaneados)
+    metricas.sumar("hash_cache", aciertos_cache, resultado="acierto")
+    metricas.sumar("hash_cache", fallos_cache, resultado="fallo")
+
+    if opciones.get("huella_rapida", False):
+        _escalar_colisiones(tabla, opciones)
 
     # 5. Log final con número total de archivos sincronizados
-    num_ficheros_final = len(rutas_reales)
-    logger.info(f"Sincronización completada con {num_ficheros_final} archivos")
\ No newline at end of file
+    logger.info(f"Sincronización completada con {escaneados} archivos")
+
+
+def sincronizar_rutas(tabla, rutas, carpetas_eliminadas=(), opciones=None):
+    """
+    Sincroniza solo un conjunto de rutas, sin escanear el directorio completo.
+
+    Es el paso incremental del modo vigilancia (ver `modules.vigilancia`): recibe las
+    rutas en las que se ha notificado algún cambio y las carpetas que han desaparecido.
+
+    Args:
+        tabla (str): Nombre de la tabla.
+        rutas (iterable[str]): Rutas de ficheros creados, modificados, movidos o borrados.
+        carpetas_eliminadas (iterable[str], opcional): Carpetas borradas o movidas fuera;
+            se eliminan todos los registros que cuelgan de ellas.
+        opciones (dict, opcional): Sección "sincronizacion" de `config/config.json`
+            (se usan `hash_workers`, `hash_workers_max` y `lote_bd`).
+
+    Comportamiento:
+        1. Elimina todos los registros que cuelgan de `carpetas_eliminadas`.
+        2. Carga de la tabla solo las filas de esas rutas (por bloques de `lote_bd`).
+        3. Las rutas que siguen existiendo se insertan o actualizan igual que en
+           `sincronizar`, reutilizando el hash si la huella no ha cambiado.
+        4. Las que ya no existen se eliminan.
+
+    Ejemplo:
+        sincronizar_rutas("archivos", ["/tmp/Images/a.png"], ["/tmp/Images/viejas"])
+    """
+    opciones = opciones or {}
+    lote_bd = opciones.get("lote_bd", 1000)
+    rutas = set(rutas)
+    carpetas_eliminadas = list(carpetas_eliminadas)
+
+    for carpeta in carpetas_eliminadas:
+        # '!' como carácter de escape explícito: MariaDB y SQLite lo entienden igual
+        patron = (carpeta.rstrip(os.sep).replace("!", "!!").replace("%", "!%").replace("_", "!_")
+                  + os.sep + "%")
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(f"DELETE FROM {tabla} WHERE ruta LIKE ? ESCAPE '!'", (patron,))
+            eliminadas = cur.rowcount
+            conn.commit()
+            cur.close()
+        logger.info(f"Eliminados {eliminadas} registros bajo la carpeta {carpeta}")
+        metricas.sumar("filas_bd", eliminadas, operacion="eliminadas")
+
+    indice_db = {}
+    lista = list(rutas)
+    for i in range(0, len(lista), lote_bd):
+        bloque = lista[i:i + lote_bd]
+        query = (f"SELECT ruta, {', '.join(_COLUMNAS_ESTADO)} FROM {tabla} "
+                 f"WHERE ruta IN ({', '.join('?' * len(bloque))})")
+        indice_db.update((fila[0], fila[1:]) for fila in db.iterar_select(query, tuple(bloque)))
+
+    def buscar_previo(ruta):
+        fila = indice_db.get(ruta)
+        return dict(zip(_COLUMNAS_ESTADO, fila)) if fila is not None else None
+
+    existentes = [ruta for ruta in rutas if os.path.isfile(ruta)]
+    faltan = indice_db.keys() - set(existentes)
+    resultados = files.obtener_metadatos_en_paralelo(
+        existentes, workers=opciones.get("hash_workers", 1), buscar_previo=buscar_previo,
+        maximo_workers=opciones.get("hash_workers_max"), algoritmo=opciones.get("algoritmo_hash", "md5"),
+        usar_mmap=opciones.get("hash_mmap", True), rapido=opciones.get("huella_rapida", False))
+    _aplicar_por_filas(tabla, resultados, faltan, lote_bd)
+    metricas.sumar("ficheros_escaneados", len(existentes))
+    if opciones.get("huella_rapida", False):
+        _escalar_colisiones(tabla, opciones)
+
+    logger.info(f"Sincronización incremental de {len(rutas)} rutas y {len(carpetas_eliminadas)} carpetas completada")
+
+
+def _escalar_colisiones(tabla, opciones):
+    """
+    Calcula el hash completo de los ficheros cuya huella rápida coincide con la de otro.
+
+    La misma huella rápida puede ser una copia del fichero o un fichero distinto que
+    solo coincide en las muestras; con el hash completo el cliente distingue ambos casos
+    al detectar movidos. Las filas pasan a `nivel_huella` = "completo" y, mientras su
+    huella no cambie, se reutiliza ese hash en las siguientes sincronizaciones.
+
+    Args:
+        tabla (str): Nombre de la tabla.
+        opciones (dict): Sección "sincronizacion" de `config/config.json`.
+
+    Returns:
+        int: Número de ficheros cuyo hash completo se ha calculado.
+    """
+    query = f"""
+        SELECT t.ruta, {", ".join(f"t.{c}" for c in _COLUMNAS_ESTADO)} FROM {tabla} t
+        JOIN (SELECT hash_md5, tamano, algoritmo_hash FROM {tabla}
+              WHERE nivel_huella = 'rapido'
+              GROUP BY hash_md5, tamano, algoritmo_hash HAVING COUNT(*) > 1) c
+          ON c.hash_md5 = t.hash_md5 AND c.tamano = t.tamano AND c.algoritmo_hash = t.algoritmo_hash
+        WHERE t.nivel_huella = 'rapido'
+    """
+    indice = {fila[0]: fila[1:] for fila in db.iterar_select(query)}
+    existentes = [ruta for ruta in indice if os.path.isfile(ruta)]
+    if not existentes:
+        return 0
+    logger.info(f"Huellas rápidas repetidas en {len(existentes)} ficheros: se calcula su hash completo")
+
+    def buscar_previo(ruta):
+        return dict(zip(_COLUMNAS_ESTADO, indice[ruta]))
+
+    resultados = files.obtener_metadatos_en_paralelo(
+        existentes, workers=opciones.get("hash_workers", 1), buscar_previo=buscar_previo,
+        maximo_workers=opciones.get("hash_workers_max"), algoritmo=opciones.get("algoritmo_hash", "md5"),
+        usar_mmap=opciones.get("hash_mmap", True), rapido=False)
+    _aplicar_por_filas(tabla, resultados, (), opciones.get("lote_bd", 1000))
+    return len(existentes)
+
+
+def _aplicar_por_filas(tabla, resultados, faltan, lote_bd, progreso=None):
+    """
+    Aplica los cambios fila a fila desde Python, agrupando las escrituras en lotes.
+
+    Args:
+        tabla (str): Nombre de la tabla.
+        resultados (iterable[tuple]): Pares (meta, previo) de `files.obtener_metadatos_en_paralelo`.
+        faltan (iterable[str]): Rutas de la tabla que ya no existen en disco. Se recorre
+            después de consumir `resultados`.
+        lote_bd (int): Filas por lote de escritura.
+        progreso (Progreso, opcional): Recibe cada fichero procesado y cada fila escrita.
+
+    Returns:
+        int: Número de ficheros cuyo hash se reutilizó de la caché.
+    """
+    aciertos_cache = insertadas = actualizadas = eliminadas = 0
+    query_insert = f"""
+        INSERT INTO {tabla} ({", ".join(COLUMNAS)})
+        VALUES ({", ".join("?" * len(COLUMNAS))})
+    """
+    query_update = f"""
+        UPDATE {tabla}
+        SET {", ".join(f"{c}=?" for c in COLUMNAS if c != "ruta")}
+        WHERE id=?
+    """
+    with db.EscritorLotes(lote_bd) as escritor:
+        for meta, previo in resultados:
+            if meta["hash_reutilizado"]:
+                aciertos_cache += 1
+
+            if previo is None:
+                # INSERT
+                escritor.agregar(query_insert, tuple(meta[c] for c in COLUMNAS))
+                insertadas += 1
+                logger.info(f"Insertado: {meta['ruta']}")
+
+            else:
+                # UPDATE si ha cambiado el contenido o la huella (para reutilizar el hash la próxima vez)
+                contenido_cambiado = (previo["hash_md5"] != meta["hash_md5"]
+                                      or previo["tamano"] != meta["tamano"]
+                                      or previo["algoritmo_hash"] != meta["algoritmo_hash"]
+                                      or previo["nivel_huella"] != meta["nivel_huella"])
+                huella_cambiada = (previo["dispositivo"], previo["inodo"], previo["mtime_ns"]) != (
+                    meta["dispositivo"], meta["inodo"], meta["mtime_ns"])
+                if contenido_cambiado or huella_cambiada:
+                    escritor.agregar(query_update, tuple(meta[c] for c in COLUMNAS if c != "ruta") + (previo["id"],))
+                    actualizadas += 1
+                    if contenido_cambiado:
+                        logger.info(f"Actualizado: {meta['ruta']}")
+                    else:
+                        logger.debug(f"Huella actualizada: {meta['ruta']}")
+            if progreso:
+                progreso.avanzar(filas=int(previo is None or contenido_cambiado or huella_cambiada))
+
+        # 4. Eliminar registros que ya no existen (por bloques con WHERE ruta IN (...))
+        escritor.eliminar_en(tabla, "ruta", faltan)
+        for ruta in faltan:
+            eliminadas += 1
+            logger.info(f"Eliminado: {ruta}")
+
+    _contar_filas(insertadas, actualizadas, eliminadas)
+    return aciertos_cache
+
+
+def _contar_filas(insertadas, actualizadas, eliminadas):
+    """
+    Suma a `metricas` las filas escritas en la tabla.
+    """
+    metricas.sumar("filas_bd", insertadas, operacion="insertadas")
+    metricas.sumar("filas_bd", actualizadas, operacion="actualizadas")
+    metricas.sumar("filas_bd", eliminadas, operacion="eliminadas")
+
+
+def _valor_tsv(valor):
+    """
+    Convierte un valor al formato de `LOAD DATA` (tabulador como separador,
+    barra invertida como carácter de escape y `\\N` para NULL).
+    """
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, datetime.datetime):
+        valor = valor.strftime("%Y-%m-%d %H:%M:%S")
+    return (str(valor).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _aplicar_por_conjuntos(tabla, resultados, progreso=None):
+    """
+    Aplica los cambios en MariaDB con sentencias de conjunto.
+
+    Escribe el resultado del escaneo en un fichero TSV temporal, lo carga con
+    `LOAD DATA LOCAL INFILE` en una tabla temporal de staging y reconcilia con
+    tres sentencias dentro de una misma transacción:
+        1. INSERT ... SELECT de las rutas nuevas (anti-join).
+        2. INSERT ... SELECT ... ON DUPLICATE KEY UPDATE de las filas cambiadas.
+        3. DELETE anti-join de las rutas que ya no existen.
+
+    Requiere `"local_infile": true` en la sección "BBDD" de `config/credenciales.json`
+    y que el servidor tenga habilitado `local_infile`.
+
+    Args:
+        tabla (str): Nombre de la tabla.
+        resultados (iterable[tuple]): Pares (meta, previo) de `files.obtener_metadatos_en_paralelo`.
+        progreso (Progreso, opcional): Recibe cada fichero escrito en el TSV; las filas se
+            escriben todas al final.
+
+    Returns:
+        int: Número de ficheros cuyo hash se reutilizó de la caché.
+    """
+    aciertos_cache = 0
+    staging = f"{tabla}_staging"
+    columnas = ", ".join(COLUMNAS)
+    columnas_staging = ", ".join(f"s.{c}" for c in COLUMNAS)
+    iguales = " AND ".join(f"t.{c} <=> s.{c}" for c in ("hash_md5", "tamano", "dispositivo", "inodo", "mtime_ns",
+                                                         "algoritmo_hash", "nivel_huella"))
+    actualizar = ", ".join(f"{c}=VALUES({c})" for c in COLUMNAS if c != "ruta")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8",
+                                     newline="\n", delete=False) as tsv:
+        for meta, _ in resultados:
+            if meta["hash_reutilizado"]:
+                aciertos_cache += 1
+            tsv.write("\t".join(_valor_tsv(meta[c]) for c in COLUMNAS) + "\n")
+            if progreso:
+                progreso.avanzar()
+
+    try:
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+                cur.execute(f"""
+                    CREATE TEMPORARY TABLE {staging} (
+                        nombre VARCHAR(255), ruta TEXT, hash_md5 VARCHAR(64), tamano BIGINT,
+                        fecha_creacion DATETIME, extension VARCHAR(20), mime_type VARCHAR(100),
+                        dispositivo BIGINT UNSIGNED, inodo BIGINT UNSIGNED, mtime_ns BIGINT,
+                        algoritmo_hash VARCHAR(16), nivel_huella VARCHAR(8),
+                        KEY (ruta(255))
+                    )
+                """)
+                fichero_sql = tsv.name.replace("\\", "\\\\").replace("'", "\\'")
+                cur.execute(f"LOAD DATA LOCAL INFILE '{fichero_sql}' INTO TABLE {staging} ({columnas})")
+                logger.info(f"Cargadas {cur.rowcount} filas en la tabla de staging {staging}")
+
+                cur.execute(f"""
+                    INSERT INTO {tabla} ({columnas})
+                    SELECT {columnas_staging} FROM {staging} s
+                    LEFT JOIN {tabla} t ON t.ruta = s.ruta
+                    WHERE t.id IS NULL
+                """)
+                insertadas = cur.rowcount
+
+                cur.execute(f"""
+                    INSERT INTO {tabla} ({columnas})
+                    SELECT {columnas_staging} FROM {staging} s
+                    JOIN {tabla} t ON t.ruta = s.ruta
+                    WHERE NOT ({iguales})
+                    ON DUPLICATE KEY UPDATE {actualizar}
+                """)
+                # ON DUPLICATE KEY UPDATE cuenta 2 por cada fila actualizada
+                actualizadas = cur.rowcount // 2
+
+                cur.execute(f"""
+                    DELETE t FROM {tabla} t
+                    LEFT JOIN {staging} s ON s.ruta = t.ruta
+                    WHERE s.ruta IS NULL
+                """)
+                eliminadas = cur.rowcount
+
+                conn.commit()
+                cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+    finally:
+        os.remove(tsv.name)
+
+    logger.info(f"Sincronización por conjuntos: {insertadas} insertados, "
+                f"{actualizadas} actualizados, {eliminadas} eliminados")
+    _contar_filas(insertadas, actualizadas, eliminadas)
+    return aciertos_cache
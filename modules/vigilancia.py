@@ -0,0 +1,352 @@
+"""
+Módulo `vigilancia`
+-------------------
+
+Modo vigilancia del servidor: en lugar de recorrer todo `directorio_base` en cada
+ejecución, se suscribe a los eventos de inotify del árbol y aplica en la tabla solo
+los cambios notificados, unos segundos después de que ocurran.
+
+Funciones principales:
+    - vigilar(directorio, tabla, opciones=None, opciones_sync=None, publicar=None):
+        Bucle principal. Agrupa los eventos (debounce), aplica inserciones,
+        actualizaciones y borrados con `sync.sincronizar_rutas` y hace una
+        reconciliación completa con `sync.sincronizar` periódicamente.
+
+Clases:
+    - Inotify: envoltorio mínimo de la API inotify de Linux mediante ctypes.
+
+Dependencias:
+    - modules.sync: para aplicar los cambios en la base de datos.
+    - modules.files: para aplicar a los eventos las reglas de escaneo.
+    - ctypes, select, struct, os, time, logging
+
+Notas:
+    - Solo funciona en Linux. Cada carpeta del árbol consume un watch; si el árbol tiene
+      muchas carpetas puede ser necesario subir `fs.inotify.max_user_watches`.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+from modules import files, sync
+
+logger = logging.getLogger(__name__)
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+MASCARA = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+           | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_CABECERA_EVENTO = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Envoltorio mínimo de inotify (Linux) mediante ctypes, sin dependencias externas.
+
+    Ejemplo:
+        with Inotify() as ino:
+            ino.agregar("/tmp/Images")
+            for wd, mascara, cookie, nombre in ino.leer(1.0):
+                print(wd, hex(mascara), nombre)
+    """
+
+    def __init__(self):
+        nombre_libc = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(nombre_libc, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify no está disponible en este sistema (solo Linux)")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, f"inotify_init1: {os.strerror(numero)}")
+
+    def agregar(self, ruta, mascara=MASCARA):
+        """
+        Añade un watch sobre una carpeta y devuelve su descriptor.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(ruta), mascara)
+        if wd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, f"inotify_add_watch {ruta}: {os.strerror(numero)}")
+        return wd
+
+    def quitar(self, wd):
+        """
+        Elimina un watch. No hace nada si ya no existe (carpeta borrada).
+        """
+        if self._libc.inotify_rm_watch(self.fd, wd) < 0:
+            numero = ctypes.get_errno()
+            if numero != errno.EINVAL:
+                raise OSError(numero, f"inotify_rm_watch {wd}: {os.strerror(numero)}")
+
+    def leer(self, espera):
+        """
+        Espera hasta `espera` segundos y devuelve los eventos disponibles.
+
+        Returns:
+            list[tuple]: Eventos (wd, mascara, cookie, nombre).
+        """
+        listos, _, _ = select.select([self.fd], [], [], espera)
+        if not listos:
+            return []
+        try:
+            datos = os.read(self.fd, 1024 * 1024)
+        except BlockingIOError:
+            return []
+        eventos = []
+        posicion = 0
+        while posicion < len(datos):
+            wd, mascara, cookie, longitud = _CABECERA_EVENTO.unpack_from(datos, posicion)
+            posicion += _CABECERA_EVENTO.size
+            nombre = os.fsdecode(datos[posicion:posicion + longitud].rstrip(b"\0"))
+            posicion += longitud
+            eventos.append((wd, mascara, cookie, nombre))
+        return eventos
+
+    def cerrar(self):
+        """
+        Cierra el descriptor de inotify (y con él todos los watches).
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+        return False
+
+
+class _Arbol:
+    """
+    Mantiene un watch por carpeta del árbol vigilado y traduce los eventos a rutas.
+
+    Solo se vigilan las carpetas en las que entraría `files.recorrer_directorio` con
+    las mismas reglas de escaneo.
+    """
+
+    def __init__(self, inotify, base, escaneo=None):
+        self.inotify = inotify
+        self.base = base
+        self.escaneo = escaneo
+        self.carpetas = {}
+
+    def agregar_recursivo(self, raiz):
+        """
+        Vigila `raiz` y todas sus subcarpetas. Devuelve los ficheros que contienen,
+        por si se crearon antes de que el watch estuviera activo.
+        """
+        ficheros = []
+        if not files.admite_carpeta(raiz, self.base, self.escaneo):
+            return ficheros
+        for actual, subcarpetas, nombres in os.walk(raiz):
+            # Igual que en el escaneo, no se entra en las carpetas excluidas
+            subcarpetas[:] = [nombre for nombre in subcarpetas
+                              if files.admite_carpeta(os.path.join(actual, nombre), self.base, self.escaneo)]
+            try:
+                self.carpetas[self.inotify.agregar(actual)] = actual
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logger.error("Se ha alcanzado fs.inotify.max_user_watches; "
+                                 "los cambios de algunas carpetas solo se verán en la reconciliación completa")
+                    return ficheros
+                logger.warning(f"No puedo vigilar {actual}: {e}")
+                continue
+            ficheros.extend(os.path.join(actual, nombre) for nombre in nombres)
+        return ficheros
+
+    def quitar_recursivo(self, raiz):
+        """
+        Deja de vigilar `raiz` y todas sus subcarpetas (por ejemplo, si se ha movido fuera del árbol).
+        """
+        prefijo = raiz.rstrip(os.sep) + os.sep
+        for wd, carpeta in list(self.carpetas.items()):
+            if carpeta == raiz or carpeta.startswith(prefijo):
+                try:
+                    self.inotify.quitar(wd)
+                except OSError as e:
+                    logger.warning(f"No puedo dejar de vigilar {carpeta}: {e}")
+                del self.carpetas[wd]
+
+
+def _olvidar_movidas(arbol, movidas):
+    """
+    Deja de vigilar las carpetas movidas fuera del árbol (IN_MOVED_FROM sin su IN_MOVED_TO).
+    """
+    for origen in movidas.values():
+        arbol.quitar_recursivo(origen)
+    movidas.clear()
+
+
+def _publicar(publicar):
+    """
+    Llama a `publicar` sin dejar que un error (SFTP, base de datos...) detenga la vigilancia.
+
+    Returns:
+        bool: True si se publicó, False si falló.
+    """
+    try:
+        publicar()
+        return True
+    except Exception as e:
+        logger.exception(f"❌ Error al publicar el inventario: {e}; se reintentará en el siguiente ciclo")
+        return False
+
+
+def vigilar(directorio, tabla, opciones=None, opciones_sync=None, publicar=None):
+    """
+    Vigila un directorio y mantiene la tabla al día a partir de los eventos de inotify.
+
+    Args:
+        directorio (str): Carpeta a vigilar (normalmente `directorio_base`).
+        tabla (str): Nombre de la tabla en la base de datos.
+        opciones (dict, opcional): Sección "vigilancia" de `config/config.json`:
+            - espera (float): Segundos sin eventos antes de aplicar los cambios. Default: 2.
+            - espera_maxima (float): Segundos máximos que un cambio puede esperar aunque
+              sigan llegando eventos. Default: 30.
+            - reconciliar_cada (float): Segundos entre reconciliaciones completas
+              (`sync.sincronizar`), como red de seguridad. Default: 3600.
+            - publicar_cada (float): Segundos mínimos entre dos llamadas a `publicar`.
+              Default: 300.
+        opciones_sync (dict, opcional): Sección "sincronizacion", que se pasa a `sync`.
+        publicar (callable, opcional): Función sin argumentos que exporta y sube el
+            inventario. Se llama tras la primera reconciliación y después, si ha habido
+            cambios, como mucho una vez cada `publicar_cada` segundos.
+
+    Comportamiento:
+        1. Crea los watches de todo el árbol y hace una reconciliación completa.
+        2. Acumula las rutas afectadas por los eventos y, cuando pasan `espera` segundos
+           sin eventos (o `espera_maxima` desde el primero), las aplica con
+           `sync.sincronizar_rutas`.
+        3. Las carpetas nuevas se vigilan al momento (salvo las que excluyen las reglas de
+           `escaneo`) y sus ficheros se incluyen en el lote; las carpetas borradas o
+           movidas fuera eliminan todos sus registros y dejan de vigilarse.
+        4. Si la cola de inotify se desborda, si falla la aplicación de un lote, o cada
+           `reconciliar_cada` segundos, se hace una reconciliación completa.
+        5. Los errores de la reconciliación y de `publicar` se registran y la operación
+           se reintenta en el siguiente ciclo, sin detener la vigilancia.
+
+    Ejemplo:
+        vigilar("/tmp/Images", "archivos", {"espera": 5})
+    """
+    opciones = opciones or {}
+    espera = float(opciones.get("espera", 2))
+    espera_maxima = float(opciones.get("espera_maxima", 30))
+    reconciliar_cada = float(opciones.get("reconciliar_cada", 3600))
+    publicar_cada = float(opciones.get("publicar_cada", 300))
+
+    with Inotify() as inotify:
+        escaneo = (opciones_sync or {}).get("escaneo")
+        arbol = _Arbol(inotify, directorio, escaneo)
+        arbol.agregar_recursivo(directorio)
+        logger.info(f"👀 Vigilando {directorio} ({len(arbol.carpetas)} carpetas)")
+
+        sync.sincronizar(directorio, tabla, opciones_sync)
+        sin_publicar = bool(publicar) and not _publicar(publicar)
+        ultima_reconciliacion = ultima_publicacion = time.monotonic()
+
+        pendientes = set()
+        carpetas_eliminadas = set()
+        # Carpetas movidas (IN_MOVED_FROM) a la espera de su IN_MOVED_TO, por cookie
+        movidas = {}
+        primer_evento = ultimo_evento = None
+        reconciliar = False
+
+        while True:
+            eventos = inotify.leer(espera)
+            ahora = time.monotonic()
+
+            for wd, mascara, cookie, nombre in eventos:
+                if mascara & IN_Q_OVERFLOW:
+                    logger.warning("Desbordamiento de la cola de inotify: se hará una reconciliación completa")
+                    reconciliar = True
+                    continue
+                if mascara & IN_IGNORED:
+                    arbol.carpetas.pop(wd, None)
+                    continue
+                carpeta = arbol.carpetas.get(wd)
+                if carpeta is None or mascara & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    continue
+                ruta = os.path.join(carpeta, nombre) if nombre else carpeta
+
+                if mascara & IN_ISDIR:
+                    if mascara & IN_MOVED_TO and cookie in movidas:
+                        # Movida dentro del árbol: sus watches siguen activos, pero con la ruta antigua
+                        arbol.quitar_recursivo(movidas.pop(cookie))
+                    if mascara & (IN_CREATE | IN_MOVED_TO):
+                        pendientes.update(arbol.agregar_recursivo(ruta))
+                    elif mascara & (IN_DELETE | IN_MOVED_FROM):
+                        carpetas_eliminadas.add(ruta)
+                        if mascara & IN_MOVED_FROM:
+                            movidas[cookie] = ruta
+                else:
+                    pendientes.add(ruta)
+
+                ultimo_evento = ahora
+                if primer_evento is None:
+                    primer_evento = ahora
+
+            if reconciliar or ahora - ultima_reconciliacion >= reconciliar_cada:
+                _olvidar_movidas(arbol, movidas)
+                # Lo pendiente lo recoge la reconciliación (esta o, si falla, la siguiente)
+                pendientes.clear()
+                carpetas_eliminadas.clear()
+                primer_evento = ultimo_evento = None
+                try:
+                    sync.sincronizar(directorio, tabla, opciones_sync)
+                except Exception as e:
+                    logger.exception(f"❌ Error en la reconciliación completa: {e}; se reintentará en el siguiente ciclo")
+                    reconciliar = True
+                else:
+                    reconciliar = False
+                    ultima_reconciliacion = time.monotonic()
+                    sin_publicar = True
+
+            elif primer_evento is not None and (ahora - ultimo_evento >= espera
+                                              or ahora - primer_evento >= espera_maxima):
+                _olvidar_movidas(arbol, movidas)
+                pendientes = {ruta for ruta in pendientes if files.admite_ruta(ruta, directorio, escaneo)}
+                if pendientes or carpetas_eliminadas:
+                    logger.info(f"Aplicando {len(pendientes)} cambios y {len(carpetas_eliminadas)} carpetas eliminadas")
+                    try:
+                        sync.sincronizar_rutas(tabla, pendientes, carpetas_eliminadas, opciones_sync)
+                    except Exception as e:
+                        # Un lote fallido no detiene la vigilancia: la reconciliación
+                        # del siguiente ciclo recupera los cambios que se hayan perdido
+                        logger.exception(f"❌ Error al aplicar los cambios: {e}; se hará una reconciliación completa")
+                        reconciliar = True
+                    sin_publicar = True
+                pendientes.clear()
+                carpetas_eliminadas.clear()
+                primer_evento = ultimo_evento = None
+
+            if publicar and sin_publicar and time.monotonic() - ultima_publicacion >= publicar_cada:
+                # Si falla, `sin_publicar` sigue activo y se reintenta en el siguiente ciclo
+                if _publicar(publicar):
+                    ultima_publicacion = time.monotonic()
+                    sin_publicar = False
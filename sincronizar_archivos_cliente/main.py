@@ -6,11 +6,14 @@ Sincronizador Cliente de Metadatos de Archivos
 =========================================================
 
 Este script se ejecuta en el CLIENTE y tiene como objetivo:
-    - Descargar desde un servidor SFTP un fichero JSON con la información
-      de los archivos esperados (metadatos).
+    - Descargar desde un servidor SFTP un fichero de inventario con la información
+      de los archivos esperados (metadatos). Puede ser JSON, NDJSON, CSV o MessagePack,
+      comprimido o no con gzip/zstd; el formato se detecta automáticamente.
     - Comparar esa información con la carpeta local del cliente.
     - Generar un informe HTML de diferencias.
     - Enviar el informe por correo electrónico y/o subirlo por SFTP.
+    - Escribir las métricas de cada fase (descarga, comparación, informe y envío) en un
+      fichero de texto de Prometheus para node_exporter, si está configurado.
 
 El comportamiento se define mediante:
     - config/config.json          → Parámetros de ejecución
@@ -19,16 +22,30 @@ El comportamiento se define mediante:
 
 Dependencias externas:
     pip install paramiko
+    pip install orjson zstandard msgpack   # opcionales, según el formato del inventario
 
 Versión: 1.0
 Fecha: 2025-10-04
 """
 
-from modules import ssh, utils, verificar
+from modules import ssh, utils, verificar, inventario, metricas
 from modules.logging_config import configurar_logger
-import json
 import os
 
+
+def escribir_metricas(opciones_metricas):
+    """
+    Escribe las métricas de la ejecución si `metricas.ruta` está configurada.
+
+    Un fallo al escribirlas se registra, pero no cambia el resultado del script.
+    """
+    if not opciones_metricas.get("ruta"):
+        return
+    try:
+        metricas.escribir_textfile(opciones_metricas["ruta"], opciones_metricas.get("prefijo", "inventario_cliente"))
+    except OSError as e:
+        logger.warning(f"No se pudieron escribir las métricas en {opciones_metricas['ruta']}: {e}")
+
 if __name__ == "__main__":
     # Cargar configuración y credenciales
     config = utils.cargar_config("config/config.json")
@@ -39,32 +56,76 @@ if __name__ == "__main__":
 
     logger.info("=== INICIO DEL SCRIPT ===")
 
-    # Descargar JSON maestro
-    exito, json_local = ssh.DescargarArchivoSFTP(
-        credenciales["SFTP"],
-        config["fichero_json_origen"],
-        config["ruta_remota_fichero"]
-    )
-    if not exito:
-        logger.error("No se pudo descargar el JSON del servidor")
-        exit(1)
-
-    # Leer JSON
-    with open(json_local, "r", encoding="utf-8") as f:
-        json_servidor = json.load(f)
-
-    # Procesar diferencias y generar HTML + enviar
-    verificar.procesar_diferencias(
-        json_servidor,
-        config["carpeta_local"],
-        config["ruta_html_salida"],
-        config["accion_salida"],
-        {
-            **credenciales,
-            "ruta_remota_salida": config["ruta_remota_salida"],
-            "email": config["email"]
-        },
-        nombre_servidor=config.get("servidor_nombre", "ServidorDesconocido")
-    )
+    opciones_metricas = config.get("metricas", {})
+    # Se pone a 1 al terminar; exit(1) y las excepciones la dejan en 0
+    metricas.fijar("ejecucion_exito", 0)
+    try:
+        with metricas.fase("descarga"):
+            if config.get("incremental", False):
+                # Descargar el manifiesto y aplicar solo la base/deltas que faltan,
+                # todo sobre la misma conexión SFTP
+                ruta_remota = config["ruta_remota_fichero"]
+                try:
+                    with ssh.SesionSFTP(credenciales["SFTP"]) as sesion:
+                        manifiesto_local = sesion.descargar(config["fichero_manifiesto"], ruta_remota)
+
+                        def descargar(nombre):
+                            try:
+                                return True, sesion.descargar(nombre, ruta_remota)
+                            except Exception as e:
+                                logger.error(f"No consigo descargar el fichero {nombre} del servidor {credenciales['SFTP'][0]}")
+                                logger.error(e)
+                                return False, ''
+
+                        version, json_servidor = inventario.actualizar_incremental(
+                            manifiesto_local,
+                            descargar,
+                            config.get("ruta_estado_inventario", "estado_inventario.json"),
+                            config.get("inventario_local", "inventario_local.json")
+                        )
+                    cabecera = utils.cargar_json(manifiesto_local)
+                except Exception as e:
+                    logger.error("No se pudo actualizar el inventario desde el servidor")
+                    logger.error(e)
+                    exit(1)
+                logger.info(f"Inventario en versión {version}: {len(json_servidor)} registros")
+            else:
+                # Descargar JSON maestro (solo si ha cambiado desde la última descarga)
+                exito, json_local, _ = ssh.DescargarArchivoSFTPSiCambia(
+                    credenciales["SFTP"],
+                    config["fichero_json_origen"],
+                    config["ruta_remota_fichero"],
+                    config.get("ruta_estado_descarga", ssh.ESTADO_DESCARGA)
+                )
+                if not exito:
+                    logger.error("No se pudo descargar el JSON del servidor")
+                    exit(1)
+
+                # Leer inventario (formato y compresión se detectan automáticamente)
+                cabecera, json_servidor = inventario.leer_inventario(json_local)
+                logger.info(f"Inventario leído: {len(json_servidor)} registros en formato {cabecera['formato']}")
+        metricas.fijar("inventario_registros", len(json_servidor))
+
+        # Procesar diferencias y generar HTML + enviar
+        verificar.procesar_diferencias(
+            json_servidor,
+            config["carpeta_local"],
+            config["ruta_html_salida"],
+            config["accion_salida"],
+            {
+                **credenciales,
+                "ruta_remota_salida": config["ruta_remota_salida"],
+                "email": config["email"]
+            },
+            nombre_servidor=config.get("servidor_nombre", "ServidorDesconocido"),
+            algoritmo=verificar.algoritmo_inventario(json_servidor, cabecera),
+            raiz_servidor=verificar.raiz_inventario(json_servidor, cabecera, config.get("raiz_servidor")),
+            ruta_cache=config.get("ruta_cache_hashes", "cache_hashes.sqlite"),
+            workers=config.get("hash_workers", 1),
+            escaneo=config.get("escaneo")
+        )
+        metricas.fijar("ejecucion_exito", 1)
+    finally:
+        escribir_metricas(opciones_metricas)
 
     logger.info("=== FIN DEL SCRIPT ===")
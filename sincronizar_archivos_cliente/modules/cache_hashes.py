@@ -0,0 +1,110 @@
+"""
+Módulo `cache_hashes`
+---------------------
+
+Caché local de hashes del cliente, guardada en un fichero SQLite entre ejecuciones.
+
+Para cada fichero se guarda su huella (dispositivo, inodo, tamaño, mtime_ns) junto con
+el hash calculado y su algoritmo. En la ejecución siguiente `files.obtener_metadatos`
+reutiliza el hash de los ficheros cuya huella no ha cambiado (y cuyo algoritmo coincide),
+de modo que solo se leen del disco los ficheros nuevos o modificados.
+
+Clases principales:
+    - CacheHashes(ruta): Carga la caché en memoria, ofrece `buscar(ruta)` como
+      `buscar_previo` de `files.obtener_metadatos_en_paralelo` y guarda los resultados
+      de la ejecución en una sola transacción.
+
+Dependencias:
+    - sqlite3: para el fichero de caché.
+    - os, logging
+"""
+
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+_COLUMNAS = ("ruta", "dispositivo", "inodo", "tamano", "mtime_ns", "hash_md5", "algoritmo_hash")
+
+
+class CacheHashes:
+    """
+    Caché de hashes persistida en SQLite.
+
+    Al abrirla se carga entera en un diccionario (una consulta), las búsquedas durante
+    el escaneo no tocan el disco y al cerrarla se reescribe con los ficheros vistos en
+    esta ejecución, eliminando los que ya no existen.
+
+    Args:
+        ruta (str): Fichero SQLite de la caché. Se crea si no existe.
+
+    Ejemplo:
+        with CacheHashes("cache_hashes.sqlite") as cache:
+            for meta, previo in files.obtener_metadatos_en_paralelo(rutas, buscar_previo=cache.buscar):
+                cache.registrar(meta)
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._previos = {}
+        self._vistos = []
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta)
+        existentes = [fila[1] for fila in self._conexion.execute("PRAGMA table_info(hashes)")]
+        if existentes and existentes != list(_COLUMNAS):
+            # Caché de una versión anterior: se descarta y se reconstruye en esta ejecución
+            logger.info(f"La caché de hashes {ruta} tiene un formato antiguo; se vuelve a crear")
+            self._conexion.execute("DROP TABLE hashes")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "ruta TEXT PRIMARY KEY, dispositivo INTEGER, inodo INTEGER, "
+            "tamano INTEGER, mtime_ns INTEGER, hash_md5 TEXT, algoritmo_hash TEXT)"
+        )
+        cursor = self._conexion.execute(f"SELECT {', '.join(_COLUMNAS)} FROM hashes")
+        for fila in cursor:
+            self._previos[fila[0]] = dict(zip(_COLUMNAS, fila))
+        logger.info(f"Caché de hashes cargada de {ruta}: {len(self._previos)} ficheros")
+
+    def buscar(self, ruta):
+        """
+        Devuelve los metadatos guardados para `ruta`, o None si no está en la caché.
+        """
+        return self._previos.get(ruta)
+
+    def registrar(self, meta):
+        """
+        Anota los metadatos de un fichero visto en esta ejecución.
+        """
+        self._vistos.append(tuple(meta[c] for c in _COLUMNAS))
+
+    def guardar(self):
+        """
+        Sustituye el contenido de la caché por los ficheros registrados en esta ejecución.
+        """
+        with self._conexion:
+            self._conexion.execute("DELETE FROM hashes")
+            self._conexion.executemany(
+                f"INSERT OR REPLACE INTO hashes ({', '.join(_COLUMNAS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNAS)})",
+                self._vistos
+            )
+
+    def cerrar(self):
+        """
+        Cierra el fichero de la caché.
+        """
+        self._conexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if tipo is None:
+                self.guardar()
+        finally:
+            self.cerrar()
+        return False
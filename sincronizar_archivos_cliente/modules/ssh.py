@@ -4,12 +4,18 @@
 """
 Librería para conexión y gestión de archivos en servidores SFTP usando paramiko.
 
-Funciones disponibles:
+Clase disponible:
+- SesionSFTP: mantiene una conexión abierta (con keepalive y reconexión automática)
+  y expone todas las operaciones como métodos. Se usa como gestor de contexto.
+
+Funciones disponibles (abren y cierran una sesión en cada llamada):
 - CrearCarpetaSFTP
 - SubirFicheroSFTP
+- SubirFicheroSFTPMultiple
 - BorrarFicheroSFTP
 - ListarArchivosSFTP
 - DescargarArchivoSFTP
+- DescargarArchivoSFTPSiCambia
 - VerificarFicheroSFTP
 - ListarArchivosSFTPconAtributos
 """
@@ -17,9 +23,21 @@ Funciones disponibles:
 import logging
 import sys
 import os
+import io
+import hashlib
+import json
+import shutil
+import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 import paramiko
 
+# Sufijo del fichero que acompaña a cada subida con el MD5 de su contenido
+SUFIJO_CHECKSUM = ".md5"
+
+# Fichero de estado por defecto de `DescargarArchivoSFTPSiCambia`
+ESTADO_DESCARGA = "estado_descarga.json"
+
 logger = logging.getLogger(__name__)
 
 def conectar_sftp(credenciales):
@@ -45,6 +63,427 @@ def conectar_sftp(credenciales):
     return sftp, transport
 
 
+def _md5_fichero(fichero, bloque=1024 * 1024):
+    """
+    Calcula el MD5 de un fichero local leyéndolo por bloques.
+    """
+    h = hashlib.md5()
+    with open(fichero, "rb") as f:
+        for trozo in iter(lambda: f.read(bloque), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+def _sin_sidecars(elementos, nombre=lambda elemento: elemento):
+    """
+    Quita de un listado los sidecars MD5: los `<fichero>.md5` cuyo `<fichero>` también
+    está en el listado. Un `.md5` sin su fichero (por ejemplo `checksums.md5`) se mantiene.
+    """
+    nombres = {nombre(elemento) for elemento in elementos}
+    return [elemento for elemento in elementos
+            if not (nombre(elemento).endswith(SUFIJO_CHECKSUM)
+                    and nombre(elemento)[:-len(SUFIJO_CHECKSUM)] in nombres)]
+
+
+class SesionSFTP:
+    """
+    Sesión SFTP reutilizable sobre una única conexión autenticada.
+
+    Mantiene el transporte abierto entre operaciones, envía keepalives para que no lo
+    cierre el servidor o un cortafuegos y, si la conexión se pierde en mitad de una
+    operación, reconecta y la reintenta. A diferencia de las funciones del módulo, los
+    métodos lanzan las excepciones en lugar de registrarlas y devolver False.
+
+    Las subidas son atómicas: el fichero se envía con un nombre temporal y se renombra
+    al final, así que nadie puede descargar una versión a medias. Junto a cada fichero
+    se deja `<nombre>.md5` con su MD5; si el remoto tiene el mismo tamaño y el mismo MD5
+    que el local, la subida se omite.
+
+    Args:
+        credenciales (list): Lista con los parámetros de conexión
+            [servidor, puerto, usuario, clave, clave_privada, pass_clave_privada].
+        keepalive (int, opcional): Segundos entre keepalives (0 para desactivarlos). Default: 30.
+        reintentos (int, opcional): Reconexiones por operación si se pierde la conexión. Default: 1.
+
+    Ejemplo:
+        with SesionSFTP(credenciales) as sesion:
+            if not sesion.existe("inventario.json", "/ruta1"):
+                sesion.subir("/ruta1", "inventario.json", "inventario.json")
+            print(sesion.listar("/ruta1"))
+    """
+
+    def __init__(self, credenciales, keepalive=30, reintentos=1):
+        self.credenciales = credenciales
+        self.keepalive = keepalive
+        self.reintentos = reintentos
+        self.sftp = None
+        self.transport = None
+
+    def conectar(self):
+        """
+        Abre (o vuelve a abrir) la conexión SFTP.
+        """
+        self.cerrar()
+        self.sftp, self.transport = conectar_sftp(self.credenciales)
+        if self.keepalive:
+            self.transport.set_keepalive(self.keepalive)
+
+    def activa(self):
+        """
+        Indica si la conexión está abierta.
+        """
+        return self.transport is not None and self.transport.is_active()
+
+    def cerrar(self):
+        """
+        Cierra la conexión SFTP si está abierta.
+        """
+        if self.sftp is not None:
+            self.sftp.close()
+        if self.transport is not None:
+            self.transport.close()
+        self.sftp = None
+        self.transport = None
+
+    def __enter__(self):
+        self.conectar()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+        return False
+
+    def _ejecutar(self, operacion):
+        """
+        Ejecuta `operacion(sftp)` reconectando si la conexión se ha perdido.
+
+        Solo se reintenta cuando, tras el fallo, el transporte ya no está activo; los
+        errores de la propia operación (por ejemplo, FileNotFoundError) se propagan.
+        """
+        for intento in range(self.reintentos + 1):
+            if not self.activa():
+                self.conectar()
+            try:
+                return operacion(self.sftp)
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                if self.activa() or intento == self.reintentos:
+                    raise
+                logger.warning(f"Conexión SFTP con {self.credenciales[0]} perdida, reconectando: {e}")
+
+    def crear_carpeta(self, ruta):
+        """
+        Crea una carpeta remota si no existe.
+
+        Returns:
+            bool: True si la carpeta se creó, False si ya existía.
+        """
+        def operacion(sftp):
+            try:
+                sftp.stat(ruta)
+                return False
+            except FileNotFoundError:
+                sftp.mkdir(ruta)
+                return True
+        return self._ejecutar(operacion)
+
+    def _es_identico(self, sftp, remoto, tamano, checksum):
+        """
+        Indica si el fichero remoto tiene ya el tamaño y el MD5 indicados.
+
+        El sidecar solo se lee cuando el tamaño coincide, así que un fichero sin cambios
+        cuesta un `stat` y la lectura de unos pocos bytes.
+        """
+        try:
+            if sftp.stat(remoto).st_size != tamano:
+                return False
+            with sftp.open(remoto + SUFIJO_CHECKSUM, "r") as f:
+                remoto_checksum = f.read().decode("ascii", "replace").split()
+        except FileNotFoundError:
+            return False
+        return bool(remoto_checksum) and remoto_checksum[0] == checksum
+
+    @staticmethod
+    def _renombrar(sftp, origen, destino):
+        """
+        Renombra `origen` a `destino` sustituyéndolo si existe.
+
+        Usa la extensión `posix-rename` (atómica); si el servidor no la soporta,
+        borra el destino y renombra.
+        """
+        try:
+            sftp.posix_rename(origen, destino)
+        except IOError:
+            try:
+                sftp.remove(destino)
+            except FileNotFoundError:
+                pass
+            sftp.rename(origen, destino)
+
+    def _publicar(self, sftp, enviar, carpeta, nombrefichero, tamano, checksum, condicional):
+        """
+        Publica un fichero en `carpeta` de forma atómica junto con su sidecar MD5.
+
+        Los dos se envían primero con nombres temporales. Antes de renombrar el fichero
+        se borra el sidecar anterior, de modo que quien lo descargue nunca ve el
+        contenido nuevo con el MD5 viejo (como mucho, un momento sin sidecar, que el
+        cliente trata como "sin checksum").
+
+        Args:
+            sftp (paramiko.SFTPClient): Canal SFTP a usar.
+            enviar (callable): `enviar(sftp, ruta_remota)` envía el contenido a esa ruta.
+            carpeta (str): Carpeta remota.
+            nombrefichero (str): Nombre final en el servidor.
+            tamano (int): Tamaño del contenido en bytes.
+            checksum (str): MD5 del contenido.
+            condicional (bool): Si es True, no se sube si el remoto ya es idéntico.
+
+        Returns:
+            bool: True si se subió, False si se omitió por ser idéntico.
+        """
+        remoto = carpeta + "/" + nombrefichero
+        if condicional and self._es_identico(sftp, remoto, tamano, checksum):
+            return False
+        temporal = f"{carpeta}/.{nombrefichero}.{os.getpid()}.tmp"
+        temporal_sidecar = f"{carpeta}/.{nombrefichero}{SUFIJO_CHECKSUM}.{os.getpid()}.tmp"
+        try:
+            enviar(sftp, temporal)
+            sidecar = f"{checksum}  {nombrefichero}\n".encode("ascii")
+            sftp.putfo(io.BytesIO(sidecar), temporal_sidecar, file_size=len(sidecar))
+            try:
+                sftp.remove(remoto + SUFIJO_CHECKSUM)
+            except FileNotFoundError:
+                pass
+            self._renombrar(sftp, temporal, remoto)
+            self._renombrar(sftp, temporal_sidecar, remoto + SUFIJO_CHECKSUM)
+        except Exception:
+            for resto in (temporal, temporal_sidecar):
+                try:
+                    sftp.remove(resto)
+                except (IOError, paramiko.SSHException):
+                    pass
+            raise
+        return True
+
+    def subir(self, carpeta, fichero, nombrefichero, condicional=True):
+        """
+        Sube un archivo local a una carpeta remota, creándola si no existe.
+
+        Args:
+            carpeta (str): Carpeta remota (sin '/' al final).
+            fichero (str): Ruta local del archivo.
+            nombrefichero (str): Nombre con el que se guardará en el servidor.
+            condicional (bool, opcional): Omitir la subida si el remoto es idéntico. Default: True.
+
+        Returns:
+            bool: True si se subió, False si se omitió por ser idéntico.
+        """
+        tamano = os.path.getsize(fichero)
+        checksum = _md5_fichero(fichero)
+        self.crear_carpeta(carpeta)
+        return self._ejecutar(lambda sftp: self._publicar(
+            sftp, lambda canal, destino: canal.put(fichero, destino),
+            carpeta, nombrefichero, tamano, checksum, condicional))
+
+    def subir_multiple(self, carpetas, fichero, nombrefichero, max_canales=4, condicional=True):
+        """
+        Sube un archivo local a varias carpetas a la vez, con un canal SFTP por destino
+        sobre el transporte de la sesión.
+
+        El MD5 se calcula una sola vez, leyendo el fichero por bloques. Cada canal abre
+        después su propio descriptor del fichero y lo envía por bloques, así que la
+        memoria no depende del tamaño del inventario.
+
+        Returns:
+            dict: Para cada carpeta, un diccionario con `ok`, `omitido`, `error`, `bytes` y `segundos`.
+        """
+        resumen = {carpeta: {"ok": False, "omitido": False, "error": None, "bytes": 0, "segundos": 0.0}
+                   for carpeta in carpetas}
+        if not carpetas:
+            return resumen
+        tamano = os.path.getsize(fichero)
+        checksum = _md5_fichero(fichero)
+        if not self.activa():
+            self.conectar()
+
+        def enviar(canal, destino):
+            with open(fichero, "rb") as local, canal.open(destino, "wb") as remoto:
+                # Sin esperar la confirmación de cada escritura, como `putfo`
+                remoto.set_pipelined(True)
+                shutil.copyfileobj(local, remoto, 1024 * 1024)
+            enviados = canal.stat(destino).st_size
+            if enviados != tamano:
+                raise IOError(f"Tamaño remoto incorrecto en {destino}: {enviados} != {tamano}")
+
+        def subir(carpeta):
+            inicio = time.monotonic()
+            try:
+                canal = paramiko.SFTPClient.from_transport(self.transport)
+                try:
+                    try:
+                        canal.stat(carpeta)
+                    except FileNotFoundError:
+                        canal.mkdir(carpeta)
+                    subido = self._publicar(canal, enviar, carpeta, nombrefichero,
+                                            tamano, checksum, condicional)
+                    resumen[carpeta].update(ok=True, omitido=not subido,
+                                            bytes=tamano if subido else 0)
+                finally:
+                    canal.close()
+            except Exception as e:
+                resumen[carpeta]["error"] = str(e)
+                logger.error(f"No consigo subir al servidor {self.credenciales[0]} el fichero {fichero} en {carpeta}")
+                logger.error(e)
+            resumen[carpeta]["segundos"] = round(time.monotonic() - inicio, 3)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_canales, len(carpetas)))) as pool:
+            list(pool.map(subir, carpetas))
+        return resumen
+
+    def borrar(self, carpeta, fichero):
+        """
+        Borra un archivo remoto (y su sidecar MD5, si lo tiene).
+
+        Returns:
+            bool: True si se borró, False si no existía.
+        """
+        def operacion(sftp):
+            try:
+                sftp.remove(carpeta + "/" + fichero + SUFIJO_CHECKSUM)
+            except FileNotFoundError:
+                pass
+            try:
+                sftp.remove(carpeta + "/" + fichero)
+                return True
+            except FileNotFoundError:
+                return False
+        return self._ejecutar(operacion)
+
+    def listar(self, carpeta):
+        """
+        Devuelve la lista de nombres de archivo de una carpeta remota, sin los sidecars MD5
+        (ver `_sin_sidecars`).
+        """
+        return _sin_sidecars(self._ejecutar(lambda sftp: sftp.listdir(carpeta)))
+
+    def descargar(self, archivo, ruta='/', destino=None):
+        """
+        Descarga un archivo remoto.
+
+        Las peticiones de lectura se lanzan por adelantado (prefetch) para no esperar
+        un viaje de ida y vuelta por bloque, y el fichero se escribe con un nombre
+        temporal que se renombra al terminar, así que `destino` nunca queda a medias.
+
+        Args:
+            archivo (str): Nombre del archivo remoto.
+            ruta (str, opcional): Carpeta remota. Default '/'.
+            destino (str, opcional): Ruta local. Default: el mismo nombre en la carpeta actual.
+
+        Returns:
+            str: Ruta local del archivo descargado.
+        """
+        destino = destino or archivo
+        temporal = destino + ".tmp"
+
+        def operacion(sftp):
+            with sftp.open(ruta + "/" + archivo, "rb") as remoto:
+                remoto.prefetch()
+                with open(temporal, "wb") as local:
+                    shutil.copyfileobj(remoto, local, 1024 * 1024)
+
+        try:
+            self._ejecutar(operacion)
+            os.replace(temporal, destino)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return destino
+
+    def info_remota(self, archivo, ruta='/'):
+        """
+        Devuelve el tamaño, la fecha de modificación y, si se publicó, el MD5 de un
+        archivo remoto (ver `SUFIJO_CHECKSUM`).
+
+        Returns:
+            dict: Con las claves `tamano`, `mtime` y `checksum` (None si no hay sidecar).
+        """
+        def operacion(sftp):
+            remoto = ruta + "/" + archivo
+            atributos = sftp.stat(remoto)
+            try:
+                with sftp.open(remoto + SUFIJO_CHECKSUM, "r") as f:
+                    checksum = (f.read().decode("ascii", "replace").split() or [None])[0]
+            except FileNotFoundError:
+                checksum = None
+            return {"tamano": atributos.st_size, "mtime": atributos.st_mtime, "checksum": checksum}
+        return self._ejecutar(operacion)
+
+    def descargar_si_cambia(self, archivo, ruta='/', destino=None, previo=None):
+        """
+        Descarga un archivo remoto solo si ha cambiado desde la descarga anterior.
+
+        Si el servidor publica el MD5 del fichero se compara con el de la descarga
+        anterior (y el tamaño); si no, se comparan tamaño y fecha de modificación.
+        Si la copia local ya no existe se descarga siempre.
+
+        Args:
+            archivo (str): Nombre del archivo remoto.
+            ruta (str, opcional): Carpeta remota. Default '/'.
+            destino (str, opcional): Ruta local. Default: el mismo nombre en la carpeta actual.
+            previo (dict, opcional): Información devuelta por la descarga anterior.
+
+        Returns:
+            tuple: (descargado, info) con un bool que indica si se ha descargado y la
+            información remota (ver `info_remota`) para guardarla como `previo`.
+        """
+        destino = destino or archivo
+        info = self.info_remota(archivo, ruta)
+        if previo and os.path.isfile(destino) and info["tamano"] == previo.get("tamano"):
+            if info["checksum"] and previo.get("checksum"):
+                sin_cambios = info["checksum"] == previo["checksum"]
+            else:
+                sin_cambios = info["mtime"] == previo.get("mtime")
+            if sin_cambios:
+                return False, info
+        self.descargar(archivo, ruta, destino)
+        return True, info
+
+    def existe(self, archivo, ruta='/'):
+        """
+        Indica si un archivo remoto existe.
+        """
+        def operacion(sftp):
+            try:
+                sftp.stat(ruta + "/" + archivo)
+                return True
+            except FileNotFoundError:
+                return False
+        return self._ejecutar(operacion)
+
+    def listar_con_atributos(self, carpeta):
+        """
+        Lista los archivos de una carpeta con sus atributos, ordenados por fecha de
+        modificación (el más reciente primero). No incluye los sidecars MD5 (ver `_sin_sidecars`).
+
+        Returns:
+            list[dict]: Diccionarios con nombre, size, uid, gid, mode, atime y mtime.
+        """
+        archivos = _sin_sidecars(self._ejecutar(lambda sftp: sftp.listdir_attr(carpeta)),
+                                 lambda atributos: atributos.filename)
+        archivos.sort(key=lambda x: x.st_mtime, reverse=True)
+        return [
+            {
+                'nombre': atributos.filename,
+                'size': atributos.st_size,
+                'uid': atributos.st_uid,
+                'gid': atributos.st_gid,
+                'mode': atributos.st_mode,
+                'atime': datetime.datetime.fromtimestamp(atributos.st_atime),
+                'mtime': datetime.datetime.fromtimestamp(atributos.st_mtime)
+            }
+            for atributos in archivos
+        ]
+
+
 def CrearCarpetaSFTP(credenciales, ruta):
     """
     Crea una carpeta en el servidor SFTP si no existe.
@@ -58,15 +497,8 @@ def CrearCarpetaSFTP(credenciales, ruta):
     """
     Aux = False
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        try:
-            sftp.stat(ruta)
-            #logger.warning(f"La carpeta {ruta} ya existe en {credenciales[0]}")
-        except FileNotFoundError:
-            sftp.mkdir(ruta)
-            Aux = True
-        sftp.close()
-        transport.close()
+        with SesionSFTP(credenciales) as sesion:
+            Aux = sesion.crear_carpeta(ruta)
     except Exception as e:
         Cadena = f"No consigo conectar con el servidor {credenciales[0]} con el usuario {credenciales[2]}"
         logger.error(Cadena)
@@ -74,29 +506,30 @@ def CrearCarpetaSFTP(credenciales, ruta):
     return Aux
 
 
-def SubirFicheroSFTP(credenciales, carpeta, fichero, nombrefichero):
+def SubirFicheroSFTP(credenciales, carpeta, fichero, nombrefichero, condicional=True):
     """
     Sube un archivo local al servidor SFTP.
     Si la carpeta remota no existe, la crea automáticamente.
 
+    La subida es atómica (nombre temporal + renombrado) y, si `condicional` es True,
+    se omite cuando el remoto ya tiene el mismo tamaño y MD5.
+
     Args:
         credenciales (list): Lista con los parámetros de conexión.
         carpeta (str): Carpeta remota donde subir el archivo (sin '/' al final).
         fichero (str): Ruta local del archivo a subir.
         nombrefichero (str): Nombre con el que se guardará en el servidor.
+        condicional (bool, opcional): Omitir la subida si el remoto es idéntico. Default: True.
 
     Returns:
-        bool: True si el archivo se subió correctamente, False en caso de error.
+        bool: True si el archivo se subió correctamente (o ya estaba igual), False en caso de error.
     """
     Aux = False
     try:
-        CrearCarpetaSFTP(credenciales, carpeta)
-        sftp, transport = conectar_sftp(credenciales)
-        remoteFilePath = carpeta + "/" + nombrefichero
-        sftp.put(fichero, remoteFilePath)
+        with SesionSFTP(credenciales) as sesion:
+            if not sesion.subir(carpeta, fichero, nombrefichero, condicional):
+                logger.info(f"{nombrefichero} no ha cambiado en {carpeta}, no se sube")
         Aux = True
-        sftp.close()
-        transport.close()
     except Exception as e:
         Cadena = f"No consigo subir al servidor {credenciales[0]} el fichero {fichero}"
         logger.error(Cadena)
@@ -104,6 +537,45 @@ def SubirFicheroSFTP(credenciales, carpeta, fichero, nombrefichero):
     return Aux
 
 
+def SubirFicheroSFTPMultiple(credenciales, carpetas, fichero, nombrefichero, max_canales=4, condicional=True):
+    """
+    Sube un archivo local a varias carpetas del servidor SFTP a la vez.
+
+    Usa una única conexión autenticada (un solo intercambio de claves) y abre un canal
+    SFTP por destino, hasta `max_canales` en paralelo. El fichero local se lee una vez
+    para calcular su MD5 y después cada canal lo vuelve a leer por bloques desde disco
+    (normalmente desde la caché de páginas), sin cargarlo entero en memoria. Las
+    carpetas que no existen se crean.
+    Cada subida es atómica y, si `condicional` es True, se omite en los destinos donde
+    el fichero ya es idéntico.
+
+    Args:
+        credenciales (list): Lista con los parámetros de conexión.
+        carpetas (list[str]): Carpetas remotas donde subir el archivo (sin '/' al final).
+        fichero (str): Ruta local del archivo a subir.
+        nombrefichero (str): Nombre con el que se guardará en el servidor.
+        max_canales (int, opcional): Canales SFTP simultáneos. Default: 4.
+        condicional (bool, opcional): Omitir los destinos idénticos. Default: True.
+
+    Returns:
+        dict: Para cada carpeta, un diccionario con:
+            - ok (bool): True si el archivo se subió correctamente o ya estaba igual.
+            - omitido (bool): True si no se subió por ser idéntico al remoto.
+            - error (str | None): Descripción del error, si lo hubo.
+            - bytes (int): Bytes enviados.
+            - segundos (float): Duración de la subida a esa carpeta.
+    """
+    try:
+        with SesionSFTP(credenciales) as sesion:
+            return sesion.subir_multiple(carpetas, fichero, nombrefichero, max_canales, condicional)
+    except Exception as e:
+        Cadena = f"No consigo subir al servidor {credenciales[0]} el fichero {fichero}"
+        logger.error(Cadena)
+        logger.error(e)
+        return {carpeta: {"ok": False, "omitido": False, "error": str(e), "bytes": 0, "segundos": 0.0}
+                for carpeta in carpetas}
+
+
 def BorrarFicheroSFTP(credenciales, carpeta, fichero):
     """
     Borra un archivo del servidor SFTP.
@@ -118,16 +590,11 @@ def BorrarFicheroSFTP(credenciales, carpeta, fichero):
     """
     Aux = False
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        remoteFile = carpeta + "/" + fichero
-        try:
-            sftp.remove(remoteFile)
-            Aux = True
-        except FileNotFoundError:
+        with SesionSFTP(credenciales) as sesion:
+            Aux = sesion.borrar(carpeta, fichero)
+        if not Aux:
             Cadena = f"No puedo borrar el fichero {fichero} de la carpeta {carpeta} en el servidor {credenciales[0]}"
             logger.warning(Cadena)
-        sftp.close()
-        transport.close()
     except Exception as e:
         Cadena = f"No consigo conectar con el servidor {credenciales[0]} con el usuario {credenciales[2]}"
         logger.error(Cadena)
@@ -146,16 +613,15 @@ def ListarArchivosSFTP(credenciales, carpeta):
     Returns:
         tuple:
             - bool: True si la conexión fue exitosa.
-            - list: Lista con los nombres de archivos (vacía si no hay nada).
+            - list: Lista con los nombres de archivos (vacía si no hay nada), sin los
+              sidecars MD5 de los ficheros listados (ver `SUFIJO_CHECKSUM`).
     """
     Aux = False
     ListaFicheros = []
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        ListaFicheros = sftp.listdir(carpeta)
+        with SesionSFTP(credenciales) as sesion:
+            ListaFicheros = sesion.listar(carpeta)
         Aux = True
-        sftp.close()
-        transport.close()
     except Exception as e:
         Cadena = f"No consigo conectar con el servidor {credenciales[0]} con el usuario {credenciales[2]}"
         logger.error(Cadena)
@@ -180,13 +646,9 @@ def DescargarArchivoSFTP(credenciales, archivo, ruta='/'):
     Aux = False
     NombreFicheroLocal = ''
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        remoteFile = ruta + "/" + archivo
-        sftp.get(remoteFile, archivo)
+        with SesionSFTP(credenciales) as sesion:
+            NombreFicheroLocal = sesion.descargar(archivo, ruta)
         Aux = True
-        NombreFicheroLocal = archivo
-        sftp.close()
-        transport.close()
     except Exception as e:
         Cadena = f"No consigo descargar el fichero {archivo} del servidor {credenciales[0]}"
         logger.error(Cadena)
@@ -194,6 +656,58 @@ def DescargarArchivoSFTP(credenciales, archivo, ruta='/'):
     return Aux, NombreFicheroLocal
 
 
+def DescargarArchivoSFTPSiCambia(credenciales, archivo, ruta='/', ruta_estado=ESTADO_DESCARGA):
+    """
+    Descarga un archivo desde el servidor SFTP a la carpeta local actual solo si ha
+    cambiado desde la última descarga (ver `SesionSFTP.descargar_si_cambia`).
+
+    Lo descargado en cada ejecución se recuerda en `ruta_estado`, un JSON con el
+    tamaño, la fecha y el MD5 remotos de cada archivo.
+
+    Args:
+        credenciales (list): Lista con los parámetros de conexión.
+        archivo (str): Nombre del archivo remoto a descargar.
+        ruta (str, opcional): Carpeta remota donde está el archivo. Default '/'.
+        ruta_estado (str, opcional): Fichero JSON de estado. Default: `ESTADO_DESCARGA`
+            ("estado_descarga.json").
+
+    Returns:
+        tuple:
+            - bool: True si la copia local está al día (descargada o sin cambios), False en caso de error.
+            - str: Nombre del archivo local, vacío si falló.
+            - bool: True si se ha descargado en esta llamada.
+    """
+    Aux = False
+    NombreFicheroLocal = ''
+    Descargado = False
+    clave = ruta + "/" + archivo
+    estado = {}
+    if os.path.isfile(ruta_estado):
+        try:
+            with open(ruta_estado, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No puedo leer el estado de descargas {ruta_estado}: {e}")
+    try:
+        with SesionSFTP(credenciales) as sesion:
+            Descargado, info = sesion.descargar_si_cambia(archivo, ruta, archivo, estado.get(clave))
+        NombreFicheroLocal = archivo
+        Aux = True
+        if Descargado:
+            estado[clave] = info
+            temporal = ruta_estado + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(estado, f, indent=2)
+            os.replace(temporal, ruta_estado)
+        else:
+            logger.info(f"El fichero {archivo} no ha cambiado en el servidor, no se descarga")
+    except Exception as e:
+        Cadena = f"No consigo descargar el fichero {archivo} del servidor {credenciales[0]}"
+        logger.error(Cadena)
+        logger.error(e)
+    return Aux, NombreFicheroLocal, Descargado
+
+
 def VerificarFicheroSFTP(credenciales, archivo, ruta='/'):
     """
     Verifica si un archivo existe en el servidor SFTP.
@@ -208,15 +722,8 @@ def VerificarFicheroSFTP(credenciales, archivo, ruta='/'):
     """
     Aux = False
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        remoteFile = ruta + "/" + archivo
-        try:
-            sftp.stat(remoteFile)
-            Aux = True
-        except FileNotFoundError:
-            Aux = False
-        sftp.close()
-        transport.close()
+        with SesionSFTP(credenciales) as sesion:
+            Aux = sesion.existe(archivo, ruta)
     except Exception as e:
         Cadena = f"No consigo conectar con el servidor {credenciales[0]} con el usuario {credenciales[2]}"
         logger.error(Cadena)
@@ -241,25 +748,11 @@ def ListarArchivosSFTPconAtributos(credenciales, carpeta):
     Aux = False
     Lista = []
     try:
-        sftp, transport = conectar_sftp(credenciales)
-        archivos = sftp.listdir_attr(carpeta)
-        archivos.sort(key=lambda x: x.st_mtime, reverse=True)
-        for atributos in archivos:
-            diccionario_atributos = {
-                'nombre': atributos.filename,
-                'size': atributos.st_size,
-                'uid': atributos.st_uid,
-                'gid': atributos.st_gid,
-                'mode': atributos.st_mode,
-                'atime': datetime.datetime.fromtimestamp(atributos.st_atime),
-                'mtime': datetime.datetime.fromtimestamp(atributos.st_mtime)
-            }
-            Lista.append(diccionario_atributos)
+        with SesionSFTP(credenciales) as sesion:
+            Lista = sesion.listar_con_atributos(carpeta)
         Aux = True
-        sftp.close()
-        transport.close()
     except Exception as e:
         Cadena = f"No consigo conectar con el servidor {credenciales[0]} con el usuario {credenciales[2]}"
         logger.error(Cadena)
         logger.error(e)
-    return Aux, Lista
\ No newline at end of file
+    return Aux, Lista
@@ -8,13 +8,19 @@ con los resultados y, según la configuración, enviar dicho informe por correo
 o subirlo al servidor mediante SFTP.
 
 Funciones principales:
-    - comparar_carpetas(): Detecta archivos faltantes o extra en la carpeta local.
+    - comparar_inventarios(): Clasifica servidor y cliente en idénticos, modificados,
+      movidos, faltantes y extra usando índices hash (coste lineal).
+    - comparar_carpetas(): Escanea la carpeta local y la compara con el inventario.
+    - algoritmo_inventario(): Averigua con qué algoritmo de hash se generó el inventario.
+    - raiz_inventario(): Averigua qué carpeta del servidor se sincronizó en el inventario.
     - generar_html(): Crea un informe HTML con los resultados de la comparación.
     - procesar_diferencias(): Coordina el flujo completo de comparación, generación de 
       informe y envío según la acción configurada.
 
 Dependencias:
     - modules.files: para el escaneo y metadatos de archivos locales.
+    - modules.cache_hashes: para reutilizar los hashes de ejecuciones anteriores.
+    - modules.metricas: para las métricas de la comparación y de cada fase.
     - modules.ssh: para la transferencia de archivos vía SFTP.
     - modules.email: para el envío del informe por correo electrónico.
     - Jinja2: para la generación de la plantilla HTML.
@@ -22,15 +28,217 @@ Dependencias:
 
 import os
 import json
+import posixpath
+from collections import Counter
 import logging
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
-from . import files, ssh, utils
+from . import files, ssh, utils, metricas
+from .cache_hashes import CacheHashes
 from modules.email_module import EnviarCorreoSSL  # tu fichero de correo
 
 logger = logging.getLogger(__name__)
 
-def comparar_carpetas(json_servidor, carpeta_local):
+CATEGORIAS = ("identico", "modificado", "movido", "falta_local", "extra_local")
+
+
+def _normalizar(ruta):
+    """
+    Normaliza una ruta a separadores '/' y sin '/' final, para poder comparar rutas
+    de servidor y cliente aunque usen sistemas operativos distintos.
+    """
+    return ruta.replace("\\", "/").rstrip("/")
+
+
+def _raiz_comun(rutas):
+    """
+    Devuelve la carpeta común a todas las rutas. Solo es una aproximación de la carpeta
+    sincronizada en el servidor: si todo cuelga de una subcarpeta, o el inventario tiene
+    un único fichero, devuelve una carpeta de más (ver `raiz_inventario`).
+    """
+    carpetas = [posixpath.dirname(_normalizar(r)) for r in rutas]
+    if not carpetas:
+        return ""
+    try:
+        return posixpath.commonpath(carpetas)
+    except ValueError:
+        return ""
+
+
+def _ruta_relativa(ruta, raiz):
+    """
+    Devuelve `ruta` relativa a `raiz` (normalizada con '/'), o la ruta completa si no cuelga de ella.
+    """
+    ruta = _normalizar(ruta)
+    if raiz and ruta.startswith(raiz + "/"):
+        return ruta[len(raiz) + 1:]
+    return ruta
+
+
+def _nivel(registro):
+    """
+    Devuelve el nivel de huella de un registro ("completo" si el inventario no lo indica).
+    """
+    return registro.get("nivel_huella") or "completo"
+
+
+def _huellas(local):
+    """
+    Devuelve las huellas calculadas de un fichero local como {nivel: valor}.
+    """
+    huellas = {}
+    if local["hash_md5"] is not None:
+        huellas[_nivel(local)] = local["hash_md5"]
+    if local.get("huella_rapida") is not None:
+        huellas["rapido"] = local["huella_rapida"]
+    return huellas
+
+
+def comparar_inventarios(json_servidor, metadatos_locales, raiz_servidor=None, raiz_local=""):
+    """
+    Clasifica los ficheros del servidor y del cliente en tiempo lineal usando índices hash.
+
+    Cada fichero se identifica por su ruta relativa a la carpeta sincronizada, de modo
+    que la comparación no depende de dónde esté montada esa carpeta en cada máquina.
+
+    Args:
+        json_servidor (list[dict]): Registros del inventario del servidor (nombre, ruta, hash_md5, ...).
+        metadatos_locales (list[dict]): Metadatos de los ficheros locales (ver `files.obtener_metadatos`).
+            Los que tienen `hash_md5` a None (descartados por tamaño) solo pueden acabar como
+            "modificado" o "extra_local". Pueden llevar además `huella_rapida`.
+        raiz_servidor (str, opcional): Carpeta sincronizada en el servidor (ver
+            `raiz_inventario`). Si es None se deduce, con un aviso, de la carpeta común a
+            todas las rutas del inventario.
+        raiz_local (str, opcional): Carpeta local equivalente.
+
+    Cada registro del servidor se compara con la huella local del mismo nivel
+    (`nivel_huella`): un hash completo nunca se compara con una huella rápida.
+
+    Returns:
+        dict: Una lista por categoría (ver `CATEGORIAS`). Cada elemento es un diccionario
+        con la clave "tipo" y las claves "servidor" y/o "local" con los metadatos:
+
+            - "identico": misma ruta relativa y mismo hash.
+            - "modificado": misma ruta relativa y distinto hash.
+            - "movido": mismo hash en otra ruta (se prefiere el que tiene el mismo nombre).
+            - "falta_local": está en el servidor y no hay nada equivalente en local.
+            - "extra_local": está en local y no hay nada equivalente en el servidor.
+
+    Ejemplo:
+        resultado = comparar_inventarios(json_servidor, metadatos_locales, raiz_local="/tmp/Images")
+        print(len(resultado["movido"]))
+    """
+    if raiz_servidor is None:
+        raiz_servidor = _deducir_raiz(json_servidor)
+    raiz_servidor = _normalizar(raiz_servidor)
+    raiz_local = _normalizar(raiz_local)
+
+    resultado = {categoria: [] for categoria in CATEGORIAS}
+
+    # Índice local por ruta relativa
+    locales_por_ruta = {_ruta_relativa(f["ruta"], raiz_local): f for f in metadatos_locales}
+
+    # Misma ruta: idénticos o modificados; el resto queda pendiente
+    solo_servidor = []
+    for servidor in json_servidor:
+        local = locales_por_ruta.pop(_ruta_relativa(servidor["ruta"], raiz_servidor), None)
+        if local is None:
+            solo_servidor.append(servidor)
+        elif _huellas(local).get(_nivel(servidor)) == servidor["hash_md5"]:
+            resultado["identico"].append({"tipo": "identico", "servidor": servidor, "local": local})
+        else:
+            resultado["modificado"].append({"tipo": "modificado", "servidor": servidor, "local": local})
+
+    # Índices de los locales sin pareja por (nombre, nivel, hash) y por (nivel, hash)
+    por_nombre_hash = {}
+    por_hash = {}
+    for ruta, local in locales_por_ruta.items():
+        for nivel, huella in _huellas(local).items():
+            por_nombre_hash.setdefault((local["nombre"], nivel, huella), []).append(ruta)
+            por_hash.setdefault((nivel, huella), []).append(ruta)
+
+    def emparejar(candidatas):
+        while candidatas:
+            ruta = candidatas.pop()
+            if ruta in locales_por_ruta:
+                return locales_por_ruta.pop(ruta)
+        return None
+
+    # Mismo contenido en otra ruta: movidos
+    for servidor in solo_servidor:
+        clave = (_nivel(servidor), servidor["hash_md5"])
+        local = (emparejar(por_nombre_hash.get((servidor["nombre"],) + clave, []))
+                 or emparejar(por_hash.get(clave, [])))
+        if local is None:
+            resultado["falta_local"].append({"tipo": "falta_local", "servidor": servidor})
+        else:
+            resultado["movido"].append({"tipo": "movido", "servidor": servidor, "local": local})
+
+    resultado["extra_local"] = [{"tipo": "extra_local", "local": local} for local in locales_por_ruta.values()]
+    return resultado
+
+
+def algoritmo_inventario(json_servidor, cabecera=None):
+    """
+    Devuelve el algoritmo de hash con el que se calcularon los hashes del inventario.
+
+    Se toma de la cabecera (o del manifiesto) si lo declara; si no, de la columna
+    `algoritmo_hash` de los registros (el más frecuente) y, si tampoco está, "md5".
+
+    Args:
+        json_servidor (list[dict]): Registros del inventario.
+        cabecera (dict, opcional): Cabecera del inventario o manifiesto.
+
+    Returns:
+        str: Nombre del algoritmo (ver `files.ALGORITMOS_HASH`).
+    """
+    if cabecera and cabecera.get("algoritmo_hash"):
+        return cabecera["algoritmo_hash"]
+    recuento = Counter(f.get("algoritmo_hash") for f in json_servidor if f.get("algoritmo_hash"))
+    if len(recuento) > 1:
+        logger.warning(f"El inventario mezcla varios algoritmos de hash: {dict(recuento)}")
+    return recuento.most_common(1)[0][0] if recuento else "md5"
+
+
+def _deducir_raiz(json_servidor):
+    """
+    Último recurso para la carpeta del servidor: la carpeta común de las rutas, con aviso.
+    """
+    raiz = _raiz_comun(f["ruta"] for f in json_servidor)
+    logger.warning(f"El inventario no indica la carpeta sincronizada en el servidor (los formatos json y csv "
+                   f"no tienen cabecera); se supone {raiz!r}. "
+                   f"Si todos los ficheros cuelgan de una subcarpeta, las rutas se desplazan un nivel: "
+                   f"configura `raiz_servidor`")
+    return raiz
+
+
+def raiz_inventario(json_servidor, cabecera=None, configurada=None):
+    """
+    Devuelve la carpeta del servidor de la que cuelgan las rutas del inventario.
+
+    Por orden: la configurada en el cliente (`raiz_servidor`), la que declara la
+    cabecera o el manifiesto del inventario (`directorio`) y, como último recurso y con
+    un aviso en el log, la carpeta común a todas las rutas. Solo los inventarios ndjson
+    y msgpack y el manifiesto incremental tienen cabecera; con json o csv hay que
+    configurar `raiz_servidor`.
+
+    Args:
+        json_servidor (list[dict]): Registros del inventario.
+        cabecera (dict, opcional): Cabecera del inventario o manifiesto.
+        configurada (str, opcional): Valor de `raiz_servidor` en `config/config.json`.
+
+    Returns:
+        str: Carpeta sincronizada en el servidor.
+    """
+    if configurada:
+        return configurada
+    if cabecera and cabecera.get("directorio"):
+        return cabecera["directorio"]
+    return _deducir_raiz(json_servidor)
+
+
+def comparar_carpetas(json_servidor, carpeta_local, raiz_servidor=None, ruta_cache=None, workers=1,
+                      escaneo=None, algoritmo=None):
     """
     Compara los ficheros de una carpeta local con los metadatos
     de referencia obtenidos del servidor.
@@ -50,66 +258,119 @@ def comparar_carpetas(json_servidor, carpeta_local):
                 - fecha_creacion
         carpeta_local (str): Ruta local donde se buscarán los archivos
             del cliente para comparar.
+        raiz_servidor (str, opcional): Carpeta sincronizada en el servidor (ver
+            `raiz_inventario`). Por defecto se deduce, con un aviso, de las rutas del inventario.
+        ruta_cache (str, opcional): Fichero SQLite con la caché de hashes (ver
+            `cache_hashes.CacheHashes`). Si es None, se calculan todos los hashes.
+        workers (int | str, opcional): Hilos que calculan hashes, o "auto". Default: 1.
+        escaneo (dict, opcional): Reglas del recorrido de `carpeta_local` (ver
+            `files.recorrer_directorio`). Default: todos los ficheros.
+        algoritmo (str, opcional): Algoritmo de hash del inventario. Default: el que
+            indique `algoritmo_inventario(json_servidor)`.
 
     Returns:
-        list[dict]: Lista de diferencias detectadas. Cada elemento tiene
-        la siguiente estructura:
+        dict: Resultado de `comparar_inventarios`, con una lista por categoría:
+        "identico", "modificado", "movido", "falta_local" y "extra_local".
 
-            {
-                "tipo": "extra_local" | "falta_local",
-                "local": { ... } | "servidor": { ... }
-            }
-
-        Donde:
-            - "extra_local": el archivo existe localmente pero no en el JSON del servidor.
-            - "falta_local": el archivo existe en el JSON del servidor pero no localmente.
+    Raises:
+        RuntimeError: Si el inventario usa un algoritmo cuya biblioteca no está instalada
+            en el cliente (los hashes no serían comparables).
 
     Ejemplo:
-        diferencias = comparar_carpetas(json_servidor, "/tmp/Images")
+        resultado = comparar_carpetas(json_servidor, "/tmp/Images")
 
     Notas:
-        - La comparación se realiza por combinación de (nombre, hash_md5),
-          ignorando la ruta del archivo, ya que puede diferir entre cliente
-          y servidor.
-        - Los archivos idénticos (mismo nombre y hash) se consideran sincronizados.
+        - La comparación usa índices hash por ruta relativa, por (nombre, hash_md5)
+          y por hash_md5, así que su coste es lineal en el número de ficheros.
+        - Primero se hace `stat` de todo y solo se calcula el hash de los ficheros
+          cuyo tamaño aparece en el inventario; el resto es seguro "extra_local" (o
+          "modificado", si el servidor tiene otro fichero en esa ruta).
+        - Con caché, solo se leen del disco los ficheros nuevos o cuya huella
+          (dispositivo, inodo, tamaño, mtime_ns) ha cambiado desde la ejecución anterior.
+        - Si el inventario trae `nivel_huella` = "rapido" en algunos registros, de los
+          ficheros locales de ese tamaño se calcula la huella rápida (`files.huella_rapida`)
+          en lugar del hash completo, para compararlos al mismo nivel.
     """
-    ficheros_locales = files.escanear_directorio(carpeta_local)
-    metadatos_locales = [files.obtener_metadatos(f) for f in ficheros_locales]
-
-    diferencias = []
-
-    # Diccionario servidor por (nombre, hash)
-    servidor_dict = {(f['nombre'], f['hash_md5']): f for f in json_servidor}
-
-    # Extra en local
-    for local in metadatos_locales:
-        key = (local['nombre'], local['hash_md5'])
-        if key not in servidor_dict:
-            diferencias.append({"tipo": "extra_local", "local": local})
-
-    # Falta en local
-    for servidor in json_servidor:
-        key = (servidor['nombre'], servidor['hash_md5'])
-        if not any((local['nombre'], local['hash_md5']) == key for local in metadatos_locales):
-            diferencias.append({"tipo": "falta_local", "servidor": servidor})
-
-    return diferencias
-
-
-def generar_html(diferencias, ruta_salida, servidor_nombre="ServidorDesconocido", ruta_local_servidor=""):
+    algoritmo = algoritmo or algoritmo_inventario(json_servidor)
+    if files.resolver_algoritmo(algoritmo) != algoritmo:
+        raise RuntimeError(f"El inventario usa hashes {algoritmo} y falta su biblioteca en el cliente")
+    logger.info(f"Algoritmo de hash del inventario: {algoritmo}")
+
+    # Prefiltro por tamaño: un fichero local cuyo tamaño no está en el inventario no
+    # puede coincidir con nada del servidor, así que no hace falta su hash. Además, de
+    # cada fichero se calculan solo las huellas del nivel de los registros de su tamaño
+    niveles_por_tamano = {}
+    for f in json_servidor:
+        niveles_por_tamano.setdefault(f.get("tamano"), set()).add(_nivel(f))
+    prefiltro = None not in niveles_por_tamano
+    todos_niveles = set().union(*niveles_por_tamano.values())
+    completos, rapidos, descartados = [], [], []
+    for ruta, stat in files.recorrer_directorio(carpeta_local, escaneo):
+        niveles = niveles_por_tamano.get(stat.st_size) if prefiltro else todos_niveles
+        if not niveles:
+            descartados.append((ruta, stat))
+        elif niveles == {"rapido"}:
+            rapidos.append((ruta, stat))
+        else:
+            completos.append((ruta, stat))
+    metricas.sumar("ficheros_escaneados", len(completos) + len(rapidos) + len(descartados))
+    if prefiltro:
+        logger.info(f"Prefiltro por tamaño: {len(completos) + len(rapidos)} de "
+                    f"{len(completos) + len(rapidos) + len(descartados)} ficheros necesitan hash "
+                    f"({len(rapidos)} solo la huella rápida)")
+
+    cache = CacheHashes(ruta_cache) if ruta_cache else None
+    buscar = cache.buscar if cache else None
+    try:
+        metadatos_locales = [files.obtener_metadatos(ruta, buscar(ruta) if buscar else None,
+                                                     calcular_hash=False, stat=stat, algoritmo=algoritmo)
+                             for ruta, stat in descartados]
+        for meta, _ in files.obtener_metadatos_en_paralelo(completos, workers, buscar, algoritmo=algoritmo):
+            # Tamaño con registros de los dos niveles en el servidor: también la huella rápida
+            if "rapido" in (niveles_por_tamano.get(meta["tamano"]) if prefiltro else todos_niveles):
+                meta["huella_rapida"] = files.huella_rapida(meta["ruta"], algoritmo)
+            metadatos_locales.append(meta)
+        # La caché solo guarda hashes completos, así que las huellas rápidas se calculan sin ella
+        for meta, _ in files.obtener_metadatos_en_paralelo(rapidos, workers, algoritmo=algoritmo, rapido=True):
+            metadatos_locales.append(meta)
+        if cache:
+            for meta in metadatos_locales:
+                if meta["hash_md5"] is not None and meta["nivel_huella"] == "completo":
+                    cache.registrar(meta)
+            cache.guardar()
+    finally:
+        if cache:
+            cache.cerrar()
+    if cache:
+        reutilizados = sum(1 for meta in metadatos_locales if meta["hash_reutilizado"])
+        calculados = sum(1 for meta in metadatos_locales
+                         if meta["hash_md5"] is not None and meta["nivel_huella"] == "completo") - reutilizados
+        logger.info(f"Caché de hashes: {reutilizados} aciertos, {calculados} fallos")
+        metricas.sumar("hash_cache", reutilizados, resultado="acierto")
+        metricas.sumar("hash_cache", calculados, resultado="fallo")
+    resultado = comparar_inventarios(json_servidor, metadatos_locales, raiz_servidor, carpeta_local)
+    por_huella_rapida = sum(1 for d in resultado["identico"] if _nivel(d["servidor"]) == "rapido")
+    if por_huella_rapida:
+        logger.info(f"{por_huella_rapida} ficheros idénticos comprobados solo con la huella rápida")
+    return resultado
+
+
+def generar_html(diferencias, ruta_salida, servidor_nombre="ServidorDesconocido", ruta_local_servidor="",
+                 resumen=None):
     """
     Genera un informe HTML con las diferencias detectadas entre los archivos locales
     y el inventario del servidor, utilizando una plantilla Jinja2.
 
     Args:
         diferencias (list[dict]): Lista de diferencias obtenida tras comparar los archivos.
-            Cada elemento debe incluir la clave "tipo" ("extra_local" o "falta_local")
-            y la información correspondiente del archivo local o del servidor.
+            Cada elemento debe incluir la clave "tipo" ("modificado", "movido", "falta_local"
+            o "extra_local") y la información del archivo local y/o del servidor.
         ruta_salida (str): Ruta local donde se guardará el archivo HTML generado.
         servidor_nombre (str, opcional): Nombre del servidor o cliente donde se ejecuta
             la comparación. Se muestra en el encabezado del informe.
         ruta_local_servidor (str, opcional): Ruta local analizada durante la comparación,
             mostrada junto al nombre del servidor en el informe.
+        resumen (dict, opcional): Número de ficheros por categoría, mostrado al principio del informe.
 
     Returns:
         str: Ruta completa del archivo HTML generado.
@@ -128,7 +389,8 @@ def generar_html(diferencias, ruta_salida, servidor_nombre="ServidorDesconocido"
         diferencias=diferencias,
         servidor_nombre=servidor_nombre,
         ruta_local_servidor=ruta_local_servidor,
-        fecha_comparacion=fecha_comparacion
+        fecha_comparacion=fecha_comparacion,
+        resumen=resumen or {}
     )
 
     directorio = os.path.dirname(ruta_salida)
@@ -142,7 +404,8 @@ def generar_html(diferencias, ruta_salida, servidor_nombre="ServidorDesconocido"
     return ruta_salida
 
 
-def procesar_diferencias(json_servidor, carpeta_local, ruta_html, accion, credenciales, nombre_servidor="ServidorDesconocido"):
+def procesar_diferencias(json_servidor, carpeta_local, ruta_html, accion, credenciales, nombre_servidor="ServidorDesconocido",
+                         ruta_cache=None, workers=1, escaneo=None, algoritmo=None, raiz_servidor=None):
     """
     Procesa las diferencias entre el inventario del servidor y la carpeta local,
     generando un informe HTML y enviándolo según la configuración (SFTP, EMAIL o TODOS).
@@ -163,6 +426,14 @@ def procesar_diferencias(json_servidor, carpeta_local, ruta_html, accion, creden
                 - "email": información del destinatario y asunto.
         nombre_servidor (str, opcional): Nombre del cliente o servidor local donde se ejecuta 
             la comparación. Por defecto, "ServidorDesconocido".
+        ruta_cache (str, opcional): Fichero de la caché de hashes local. Default: None (sin caché).
+        workers (int | str, opcional): Hilos que calculan hashes, o "auto". Default: 1.
+        escaneo (dict, opcional): Reglas del recorrido de `carpeta_local` (ver
+            `files.recorrer_directorio`). Default: None.
+        algoritmo (str, opcional): Algoritmo de hash del inventario. Default: se deduce
+            de los registros (ver `algoritmo_inventario`).
+        raiz_servidor (str, opcional): Carpeta sincronizada en el servidor (ver
+            `raiz_inventario`). Default: se deduce de las rutas, con un aviso.
 
     Returns:
         None
@@ -179,51 +450,63 @@ def procesar_diferencias(json_servidor, carpeta_local, ruta_html, accion, creden
         - Las acciones y errores se registran mediante el logger global del proyecto.
     """
     # 1. Comparar carpetas
-    diferencias = comparar_carpetas(json_servidor, carpeta_local)
+    with metricas.fase("comparacion"):
+        resultado = comparar_carpetas(json_servidor, carpeta_local, raiz_servidor, ruta_cache=ruta_cache,
+                                      workers=workers, escaneo=escaneo, algoritmo=algoritmo)
+    resumen = {categoria: len(resultado[categoria]) for categoria in CATEGORIAS}
+    logger.info("Comparación: " + ", ".join(f"{n} {categoria}" for categoria, n in resumen.items()))
+    for categoria, n in resumen.items():
+        metricas.fijar("diferencias", n, categoria=categoria)
+    diferencias = [d for categoria in CATEGORIAS if categoria != "identico" for d in resultado[categoria]]
     if not diferencias:
         logger.info("No hay diferencias. No se enviará ningún HTML ni se subirá a SFTP.")
         return  # Salir de la función si no hay diferencias
 
     # 2. Generar HTML pasando nombre del servidor
-    archivo_html = generar_html(
-        diferencias,
-        ruta_html,
-        servidor_nombre=nombre_servidor,
-        ruta_local_servidor=carpeta_local
-    )
+    with metricas.fase("informe"):
+        archivo_html = generar_html(
+            diferencias,
+            ruta_html,
+            servidor_nombre=nombre_servidor,
+            ruta_local_servidor=carpeta_local,
+            resumen=resumen
+        )
 
     accion_upper = accion.upper()
 
     # 3. Enviar HTML según la acción configurada
-    if accion_upper in ("SFTP", "TODOS"):
-        ruta = credenciales["ruta_remota_salida"]
-        ok = ssh.SubirFicheroSFTP(
-            credenciales["SFTP"],
-            ruta,
-            archivo_html,
-            os.path.basename(archivo_html)
-        )
-        if ok:
-            logger.info(f"HTML subido a {ruta} correctamente")
-        else:
-            logger.error(f"Error subiendo HTML a {ruta}")
-
-    if accion_upper in ("EMAIL", "TODOS"):
-        destinatario = credenciales["email"]["para"]
-        asunto = credenciales["email"]["asunto"]
-        #mensaje = f"Se adjunta el informe de diferencias de imágenes entre el cliente {nombre_servidor} y el servidor."
-        # Leer el HTML generado para ponerlo como cuerpo del correo
-        with open(archivo_html, "r", encoding="utf-8") as f:
-            cuerpo_html = f.read()
-        ok, errores = EnviarCorreoSSL(
-            credenciales["CORREO"],
-            destinatario,
-            asunto,
-            cuerpo_html,
-            archivo_html,
-            CopiaOculta=True
-        )
-        if ok:
-            logger.info(f"Correo enviado correctamente a {destinatario}")
-        else:
-            logger.error(f"Error enviando correo: {errores}")
+    with metricas.fase("envio"):
+        if accion_upper in ("SFTP", "TODOS"):
+            ruta = credenciales["ruta_remota_salida"]
+            ok = ssh.SubirFicheroSFTP(
+                credenciales["SFTP"],
+                ruta,
+                archivo_html,
+                os.path.basename(archivo_html)
+            )
+            metricas.fijar("informe_enviado", int(bool(ok)), canal="sftp")
+            if ok:
+                logger.info(f"HTML subido a {ruta} correctamente")
+            else:
+                logger.error(f"Error subiendo HTML a {ruta}")
+
+        if accion_upper in ("EMAIL", "TODOS"):
+            destinatario = credenciales["email"]["para"]
+            asunto = credenciales["email"]["asunto"]
+            #mensaje = f"Se adjunta el informe de diferencias de imágenes entre el cliente {nombre_servidor} y el servidor."
+            # Leer el HTML generado para ponerlo como cuerpo del correo
+            with open(archivo_html, "r", encoding="utf-8") as f:
+                cuerpo_html = f.read()
+            ok, errores = EnviarCorreoSSL(
+                credenciales["CORREO"],
+                destinatario,
+                asunto,
+                cuerpo_html,
+                archivo_html,
+                CopiaOculta=True
+            )
+            metricas.fijar("informe_enviado", int(bool(ok)), canal="email")
+            if ok:
+                logger.info(f"Correo enviado correctamente a {destinatario}")
+            else:
+                logger.error(f"Error enviando correo: {errores}")
@@ -2,11 +2,16 @@ CREATE TABLE IF NOT EXISTS imagenes (
     id INT AUTO_INCREMENT PRIMARY KEY COMMENT 'Identificador único',
     nombre VARCHAR(255) NOT NULL COMMENT 'Nombre del archivo',
     ruta TEXT NOT NULL COMMENT 'Ruta absoluta en el sistema',
-    hash_md5 CHAR(32) NOT NULL COMMENT 'Hash MD5 del contenido',
+    hash_md5 VARCHAR(64) NOT NULL COMMENT 'Hash del contenido (MD5 u otro, ver algoritmo_hash)',
     tamano BIGINT NOT NULL COMMENT 'Tamaño en bytes',
     fecha_creacion DATETIME NOT NULL COMMENT 'Fecha de creación del fichero en el sistema',
     extension VARCHAR(20) COMMENT 'Extensión del archivo',
     mime_type VARCHAR(100) COMMENT 'Tipo MIME detectado',
+    dispositivo BIGINT UNSIGNED NULL COMMENT 'Dispositivo del fichero (st_dev)',
+    inodo BIGINT UNSIGNED NULL COMMENT 'Inodo del fichero (st_ino)',
+    mtime_ns BIGINT NULL COMMENT 'Fecha de modificación en nanosegundos (st_mtime_ns)',
+    algoritmo_hash VARCHAR(16) NOT NULL DEFAULT 'md5' COMMENT 'Algoritmo con el que se calculó hash_md5',
+    nivel_huella VARCHAR(8) NOT NULL DEFAULT 'completo' COMMENT 'completo: hash de todo el fichero; rapido: tamaño y muestras',
     ultima_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'Fecha de la última actualización en la BD',
     UNIQUE KEY (ruta(255))
 ) COMMENT='Inventario de imagenes locales';